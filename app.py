@@ -1,7 +1,7 @@
 import streamlit as st
 from src.ui.sidebar import render_sidebar
 from src.ui.main_content import render_main_content
-from src.utils.config import init_session_state
+from src.ui.session import init_session_state
 
 def main():
     st.set_page_config(
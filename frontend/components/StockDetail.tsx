@@ -48,7 +48,9 @@ const StockDetail: React.FC<StockDetailProps> = ({ stock, width = 400 }) => {
     if (!stock) return
     setIsLoadingKline(true)
     try {
-      const response = await fetch(`${API_BASE_URL}/stock/${stock.ts_code}/kline`)
+      // 每根K线约占 4 像素，区间再长也只取图表宽度能显示的点数，由服务端归并
+      const points = Math.max(10, Math.round(width / 4))
+      const response = await fetch(`${API_BASE_URL}/stock/${stock.ts_code}/kline?points=${points}`)
       const data = await response.json()
       setKlineData(data.data)
     } catch (error) {
@@ -0,0 +1,145 @@
+from functools import lru_cache
+from typing import Callable, Dict, Optional
+import asyncio
+import logging
+import math
+import threading
+import time
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from src.api.config import get_settings
+from src.utils import cancellation
+from src.utils.metrics import ADMISSION_REJECTED, REQUESTS_CANCELLED
+from src.utils.profiling import profile_request
+
+logger = logging.getLogger(__name__)
+
+# 需要准入控制的路由；性能分析中间件对这些路由改为在工作线程中分析
+HEAVY_ROUTES = ('/api/filter', '/api/filter/explain')
+# 客户端用于缩短截止时间的请求头（秒）
+TIMEOUT_HEADER = 'X-Request-Timeout'
+# 等待工作线程时检查客户端是否断开的间隔（秒）
+DISCONNECT_POLL_INTERVAL = 0.25
+# 客户端已断开时记录的状态码（沿用 nginx 的 499），响应不会被任何人收到
+CLIENT_CLOSED = 499
+
+class AdmissionController:
+    """重请求的准入控制
+
+    同时执行的重请求达到上限时立即拒绝，而不是排队占用工作线程和上游配额：
+    总数超限返回 503，单个客户端超限返回 429，都带有按最近请求平均耗时估算的 Retry-After。
+    """
+
+    def __init__(self, max_concurrent: int, max_per_client: int):
+        self.max_concurrent = max_concurrent
+        self.max_per_client = max_per_client
+        self.active = 0
+        self._clients: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # 最近重请求耗时的指数平均（秒）
+        self._average_seconds: Optional[float] = None
+
+    def try_acquire(self, client: str) -> Optional[int]:
+        """占用一个名额，成功时返回 None，否则返回应答的状态码"""
+        with self._lock:
+            if self.active >= self.max_concurrent:
+                return 503
+            if self._clients.get(client, 0) >= self.max_per_client:
+                return 429
+            self.active += 1
+            self._clients[client] = self._clients.get(client, 0) + 1
+            return None
+
+    def release(self, client: str, seconds: float):
+        with self._lock:
+            self.active -= 1
+            count = self._clients.get(client, 0) - 1
+            if count > 0:
+                self._clients[client] = count
+            else:
+                self._clients.pop(client, None)
+            if self._average_seconds is None:
+                self._average_seconds = seconds
+            else:
+                self._average_seconds += 0.2 * (seconds - self._average_seconds)
+
+    def retry_after(self) -> int:
+        """建议客户端等待的秒数：正在执行的请求陆续结束时大约多久空出一个名额"""
+        with self._lock:
+            if self._average_seconds is None:
+                return 5
+            return max(1, min(60, math.ceil(self._average_seconds / max(self.active, 1))))
+
+@lru_cache()
+def get_admission() -> AdmissionController:
+    """获取按配置创建的准入控制器单例"""
+    settings = get_settings()
+    return AdmissionController(settings.HEAVY_MAX_CONCURRENT, settings.HEAVY_MAX_PER_CLIENT)
+
+def request_deadline(request: Request) -> float:
+    """本次请求的截止秒数，请求头只能缩短服务端配置的上限"""
+    deadline = get_settings().REQUEST_DEADLINE
+    try:
+        requested = float(request.headers.get(TIMEOUT_HEADER, ''))
+    except ValueError:
+        return deadline
+    return min(deadline, requested) if requested > 0 else deadline
+
+async def run_heavy(request: Request, func: Callable, *args, **kwargs):
+    """在线程池中执行重请求，负责准入、截止时间和客户端断开时的取消
+
+    func 在工作线程中以本次请求的取消令牌为当前令牌执行，筛选循环和上游调用处会检查令牌，
+    因此客户端断开或超过截止时间后一秒内停止；名额在工作线程真正结束后才释放。
+    """
+    route = request.url.path
+    client = request.client.host if request.client else ''
+    admission = get_admission()
+    status = admission.try_acquire(client)
+    if status is not None:
+        ADMISSION_REJECTED.labels(route, str(status)).inc()
+        retry_after = admission.retry_after()
+        logger.warning(f"拒绝请求 {route}（{status}），正在执行 {admission.active} 个，"
+                       f"建议 {retry_after} 秒后重试")
+        detail = "服务繁忙，请稍后重试" if status == 503 else "同时执行的请求过多，请稍后重试"
+        raise HTTPException(status_code=status, detail=detail,
+                            headers={'Retry-After': str(retry_after)})
+
+    token = cancellation.CancelToken(timeout=request_deadline(request))
+    # 由性能分析中间件设置：(请求ID, 是否强制, 慢请求阈值)
+    profile = getattr(request.state, 'profile', None)
+    started_at = time.monotonic()
+
+    def work():
+        try:
+            with cancellation.scope(token):
+                if profile is None:
+                    return func(*args, **kwargs)
+                request_id, force, threshold = profile
+                with profile_request(request_id, get_settings().PROFILE_DIR, force=force,
+                                     slow_threshold=threshold):
+                    return func(*args, **kwargs)
+        finally:
+            admission.release(client, time.monotonic() - started_at)
+
+    task = asyncio.ensure_future(run_in_threadpool(work))
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                break
+            if not token.is_set() and await request.is_disconnected():
+                logger.info(f"客户端已断开，停止 {route}")
+                token.cancel(cancellation.DISCONNECTED)
+        return task.result()
+    except cancellation.Cancelled as e:
+        REQUESTS_CANCELLED.labels(route, e.reason).inc()
+        elapsed = time.monotonic() - started_at
+        if e.reason == cancellation.DEADLINE:
+            logger.warning(f"{route} 超过截止时间，已执行 {elapsed:.1f}秒")
+            raise HTTPException(status_code=504, detail="请求超过截止时间")
+        logger.info(f"{route} 已停止，执行了 {elapsed:.1f}秒")
+        raise HTTPException(status_code=CLIENT_CLOSED, detail="客户端已断开")
+    finally:
+        # 等待本身被取消（如服务关闭）时也通知工作线程停止
+        if not task.done():
+            token.cancel(cancellation.DISCONNECTED)
@@ -27,7 +27,83 @@ class Settings(BaseSettings):
     TUSHARE_TOKEN: str = os.getenv('TUSHARE_TOKEN', '')
     DEEPSEEK_API_KEY: str = os.getenv('DEEPSEEK_API_KEY', '')
     DEEPSEEK_API_BASE: str = os.getenv('DEEPSEEK_API_BASE', 'https://ark.cn-beijing.volces.com/api/v3/bots')
-    
+
+    # Tushare 调用限速：默认每分钟调用次数，以及单独设置的接口（接口:次数，逗号分隔）。
+    # 超限时会从错误信息中学习真实上限并自动降速
+    TUSHARE_RATE: float = float(os.getenv('TUSHARE_RATE', '480'))
+    TUSHARE_ENDPOINT_RATES: str = os.getenv('TUSHARE_ENDPOINT_RATES', 'moneyflow:290')
+    # 单次调用最多尝试次数（超限和网络错误会重试），以及连续网络错误后熔断的秒数
+    TUSHARE_MAX_ATTEMPTS: int = int(os.getenv('TUSHARE_MAX_ATTEMPTS', '5'))
+    TUSHARE_CIRCUIT_COOLDOWN: float = float(os.getenv('TUSHARE_CIRCUIT_COOLDOWN', '30'))
+
+    # 数据提供者配置：tushare / local / synthetic
+    DATA_PROVIDER: str = os.getenv('DATA_PROVIDER', 'tushare')
+    # 本地存储目录及其上游数据源（为空时只读本地数据）
+    DATA_STORE_DIR: str = os.getenv('DATA_STORE_DIR', 'data/store')
+    DATA_STORE_UPSTREAM: str = os.getenv('DATA_STORE_UPSTREAM', 'tushare')
+    # 共享行情面板目录：发布后各进程以内存映射方式读取K线（python -m src.data.shared_panel）
+    SHARED_PANEL_DIR: str = os.getenv('SHARED_PANEL_DIR', 'data/panel')
+    # 形态筛选、回测和K线图默认使用的复权方式：qfq（前复权）/ hfq（后复权）/ none（不复权）/
+    # auto（本地存储和合成数据前复权；直连 Tushare 时逐只股票复权每只股票多一次调用，默认不复权，回测仍前复权）
+    PRICE_ADJUST: str = os.getenv('PRICE_ADJUST', 'auto')
+    # 进程内缓存的复权日线视图数量（按股票和截止日期）
+    ADJUST_CACHE_SIZE: int = int(os.getenv('ADJUST_CACHE_SIZE', '2000'))
+    # 合成数据配置
+    SYNTHETIC_STOCK_COUNT: int = int(os.getenv('SYNTHETIC_STOCK_COUNT', '200'))
+    SYNTHETIC_SEED: int = int(os.getenv('SYNTHETIC_SEED', '42'))
+
+    # 缓存配置：memory（进程内）/ sqlite（本机多个工作进程共享）/ redis（多台主机共享）
+    CACHE_BACKEND: str = os.getenv('CACHE_BACKEND', 'memory')
+    # sqlite 为数据库文件路径，redis 为 redis://[:password@]host:port/db
+    CACHE_URL: str = os.getenv('CACHE_URL', '')
+    # 筛选结果和股票详情的缓存秒数
+    CACHE_TTL: int = int(os.getenv('CACHE_TTL', '600'))
+    # DeepSeek 分析结果的缓存秒数
+    CACHE_ANALYSIS_TTL: int = int(os.getenv('CACHE_ANALYSIS_TTL', '86400'))
+
+    # 准入控制：筛选等重请求同时执行的上限，以及单个客户端同时执行的上限，超出时立即返回 503 / 429
+    HEAVY_MAX_CONCURRENT: int = int(os.getenv('HEAVY_MAX_CONCURRENT', '4'))
+    HEAVY_MAX_PER_CLIENT: int = int(os.getenv('HEAVY_MAX_PER_CLIENT', '2'))
+    # 重请求的截止秒数，客户端可以用 X-Request-Timeout 请求头缩短，超时后停止筛选并返回 504
+    REQUEST_DEADLINE: float = float(os.getenv('REQUEST_DEADLINE', '600'))
+
+    # 性能分析配置
+    # 是否对所有请求做性能分析；也可以只对带 X-Profile: 1 请求头的请求开启
+    PROFILE_ENABLED: bool = os.getenv('PROFILE_ENABLED', 'false').lower() == 'true'
+    PROFILE_HEADER: str = os.getenv('PROFILE_HEADER', 'X-Profile')
+    # 请求耗时超过该秒数时自动保存分析结果，0 表示关闭（开启后每个请求都会挂分析器）
+    PROFILE_SLOW_THRESHOLD: float = float(os.getenv('PROFILE_SLOW_THRESHOLD', '0'))
+    PROFILE_DIR: str = os.getenv('PROFILE_DIR', 'data/profiles')
+
+    # 头肩底、W底、V型底向量化检测（回测、盘中实时筛选）的内核：auto（安装了 numba 时编译）/ numpy（总是使用 NumPy 实现）
+    KLINE_KERNELS: str = os.getenv('KLINE_KERNELS', 'auto')
+
+    # 相似形态搜索：窗口长度（K线数）、PAA 分段数、SAX 字母表大小、DTW 带宽（0 为欧氏距离）和索引文件路径
+    SIMILARITY_WINDOW: int = int(os.getenv('SIMILARITY_WINDOW', '60'))
+    SIMILARITY_SEGMENTS: int = int(os.getenv('SIMILARITY_SEGMENTS', '12'))
+    SIMILARITY_ALPHABET: int = int(os.getenv('SIMILARITY_ALPHABET', '8'))
+    SIMILARITY_BAND: int = int(os.getenv('SIMILARITY_BAND', '6'))
+    SIMILARITY_INDEX_PATH: str = os.getenv('SIMILARITY_INDEX_PATH', 'data/similarity_index.npz')
+
+    # 筛选执行计划：各筛选器成本与通过率统计的保存路径
+    PLANNER_STATS_PATH: str = os.getenv('PLANNER_STATS_PATH', 'data/planner_stats.json')
+    # 逐只股票筛选的进度检查点目录，留空则不保存检查点
+    CHECKPOINT_DIR: str = os.getenv('CHECKPOINT_DIR', 'data/checkpoints')
+    # 筛选过程中保存检查点的间隔（秒）
+    CHECKPOINT_INTERVAL: float = float(os.getenv('CHECKPOINT_INTERVAL', '30'))
+    # 超过该天数未更新的检查点会被删除
+    CHECKPOINT_MAX_AGE_DAYS: float = float(os.getenv('CHECKPOINT_MAX_AGE_DAYS', '7'))
+
+    # 盘中实时筛选配置
+    # 行情快照来源：http / file
+    LIVE_QUOTE_SOURCE: str = os.getenv('LIVE_QUOTE_SOURCE', 'http')
+    LIVE_QUOTE_URL: str = os.getenv('LIVE_QUOTE_URL', 'http://127.0.0.1:8765/quotes')
+    LIVE_QUOTE_PATH: str = os.getenv('LIVE_QUOTE_PATH', 'data/quotes.csv')
+    # 轮询间隔（秒）
+    LIVE_INTERVAL: float = float(os.getenv('LIVE_INTERVAL', '3'))
+    # 实时判断的形态，逗号分隔
+    LIVE_PATTERNS: str = os.getenv('LIVE_PATTERNS', '锤头线,看涨吞没,旭日东升,涨停')
+
     class Config:
         env_file = ".env"
 
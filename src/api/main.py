@@ -1,18 +1,29 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
-import pandas as pd
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+import asyncio
+import json
 from src.services.stock_service import (
     get_market_types,
     get_industries,
     get_index_components,
     filter_stocks,
+    explain_screen,
     get_stock_basic_info,
+    get_stock_kline,
+    find_similar_stocks,
+    PRIORITIES,
+    CursorError,
     get_deepseek_analysis
 )
 from src.api.config import Settings, get_settings
-from src.utils.config import ts_api
+from src.api.admission import run_heavy
+from src.api.middleware import ProfilingMiddleware, RequestLatencyMiddleware
+from src.live.screener import get_live_screener
+from src.utils.metrics import render_metrics
 
 def create_app(settings: Settings) -> FastAPI:
     """创建 FastAPI 应用"""
@@ -30,17 +41,58 @@ def create_app(settings: Settings) -> FastAPI:
         allow_methods=settings.CORS_ALLOW_METHODS,
         allow_headers=settings.CORS_ALLOW_HEADERS,
     )
+
+    app.add_middleware(RequestLatencyMiddleware)
+    app.add_middleware(ProfilingMiddleware, settings=settings)
     
     return app
 
 app = create_app(get_settings())
 
+# 复权方式：qfq 前复权、hfq 后复权、none 不复权
+AdjustType = Literal['qfq', 'hfq', 'none']
+
 class FilterRequest(BaseModel):
     market_types: Optional[List[str]] = None
     industries: Optional[List[str]] = None
     index_components: Optional[List[str]] = None
     kline_pattern: Optional[str] = None
     price_prediction: Optional[str] = None
+    # 只接受在最近 N 根K线内结束的形态
+    recent_bars: Optional[int] = Field(default=None, ge=1)
+    # K线形态的周期：D 日线、W 周线、M 月线
+    timeframe: str = Field(default='D', pattern='^(D|W|M)$')
+    # K线形态的复权方式：qfq 前复权、hfq 后复权、none 不复权，默认取配置 PRICE_ADJUST
+    adjust: Optional[AdjustType] = None
+    # 形态相似的参照K线：股票代码和起止日期（日期为空时取参照股票最近一个窗口）
+    reference_code: Optional[str] = None
+    reference_start: Optional[str] = Field(default=None, pattern=r'^\d{8}$')
+    reference_end: Optional[str] = Field(default=None, pattern=r'^\d{8}$')
+    # 评估日期（YYYYMMDD），默认为当天
+    as_of: Optional[str] = Field(default=None, pattern=r'^\d{8}$')
+    # 分页（limit 为空时生效）
+    page: int = Field(default=1, ge=1)
+    page_size: int = Field(default=20, ge=1, le=500)
+    # 只需要前 limit 只股票时按需筛选，找够即停止；用返回的 next_cursor 续取
+    limit: Optional[int] = Field(default=None, ge=1, le=500)
+    cursor: Optional[str] = None
+    # 只返回形态强度评分最高的 top_k 只股票（需要判断全部候选，忽略 limit）
+    top_k: Optional[int] = Field(default=None, ge=1, le=1000)
+    # 候选股票的筛选顺序，如 total_mv（总市值从大到小）
+    priority: Optional[str] = Field(default=None, pattern='^(' + '|'.join(PRIORITIES) + ')$')
+
+    def reference(self) -> Optional[dict]:
+        """形态相似的参照K线"""
+        if not self.reference_code:
+            return None
+        return {'ts_code': self.reference_code, 'start_date': self.reference_start,
+                'end_date': self.reference_end}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_api():
+    """Prometheus 指标"""
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
 
 @app.get("/api/market-types")
 async def get_market_types_api(settings: Settings = Depends(get_settings)):
@@ -69,25 +121,139 @@ async def get_index_components_api(settings: Settings = Depends(get_settings)):
 @app.post("/api/filter")
 async def filter_stocks_api(
     filter_request: FilterRequest,
+    request: Request,
     settings: Settings = Depends(get_settings)
 ):
     """筛选股票"""
     try:
-        result = filter_stocks(
+        result = await run_heavy(
+            request,
+            filter_stocks,
             market_types=filter_request.market_types,
             industries=filter_request.industries,
             index_components=filter_request.index_components,
             kline_pattern=filter_request.kline_pattern,
-            price_prediction=filter_request.price_prediction
+            price_prediction=filter_request.price_prediction,
+            recent_bars=filter_request.recent_bars,
+            as_of=filter_request.as_of,
+            timeframe=filter_request.timeframe,
+            adjust=filter_request.adjust,
+            reference=filter_request.reference(),
+            page=filter_request.page,
+            page_size=filter_request.page_size,
+            limit=filter_request.limit,
+            priority=filter_request.priority,
+            cursor=filter_request.cursor,
+            top_k=filter_request.top_k
         )
         
         if result is None:
             return {"data": [], "total": 0}
             
         return result
+    except HTTPException:
+        raise
+    except CursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/filter/explain")
+async def explain_filter_api(
+    filter_request: FilterRequest,
+    request: Request,
+    settings: Settings = Depends(get_settings)
+):
+    """估算筛选执行计划（不执行形态筛选）"""
+    try:
+        return {"data": await run_heavy(
+            request,
+            explain_screen,
+            market_types=filter_request.market_types,
+            industries=filter_request.industries,
+            index_components=filter_request.index_components,
+            kline_pattern=filter_request.kline_pattern,
+            price_prediction=filter_request.price_prediction,
+            recent_bars=filter_request.recent_bars,
+            as_of=filter_request.as_of,
+            timeframe=filter_request.timeframe,
+            adjust=filter_request.adjust,
+            reference=filter_request.reference()
+        )}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/stock/{stock_code}/similar")
+async def get_similar_stocks_api(
+    stock_code: str,
+    request: Request,
+    start_date: Optional[str] = Query(default=None, pattern=r'^\d{8}$'),
+    end_date: Optional[str] = Query(default=None, pattern=r'^\d{8}$'),
+    top_n: int = Query(default=20, ge=1, le=200),
+    band: Optional[int] = Query(default=None, ge=0, le=30),
+    market_types: Optional[List[str]] = Query(default=None),
+    industries: Optional[List[str]] = Query(default=None),
+    index_components: Optional[List[str]] = Query(default=None),
+    settings: Settings = Depends(get_settings)
+):
+    """查找最近一个窗口与参照K线形态最相似的股票
+
+    参照K线为该股票在 [start_date, end_date] 内的日线，都为空时取其最近一个窗口（SIMILARITY_WINDOW 根）。
+    band 为 DTW 带宽（0 为欧氏距离），score 为相似度（0-100）。首次查询需要生成索引，按重请求准入。
+    """
+    try:
+        return await run_heavy(request, find_similar_stocks, stock_code, start_date, end_date, top_n, band,
+                               market_types, industries, index_components)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/live/matches")
+async def live_matches_api(settings: Settings = Depends(get_settings)):
+    """获取盘中实时筛选当前满足条件的股票"""
+    try:
+        return {"data": get_live_screener().current_matches()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/live/stream")
+async def live_stream_api(request: Request, settings: Settings = Depends(get_settings)):
+    """订阅盘中实时筛选（Server-Sent Events）
+
+    连接后先推送一次 snapshot 事件（当前全部匹配），之后只推送新满足和不再满足条件的股票（diff 事件）。
+    """
+    try:
+        screener = get_live_screener()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    unsubscribe = screener.subscribe(lambda event: loop.call_soon_threadsafe(queue.put_nowait, event))
+
+    def format_event(event_type: str, data: dict) -> str:
+        return f"event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    async def events():
+        try:
+            yield format_event('snapshot', screener.current_matches())
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # 保持连接
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_event(event['type'], event)
+        finally:
+            unsubscribe()
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
 @app.get("/api/stock/{stock_code}")
 async def get_stock_info_api(
     stock_code: str,
@@ -116,35 +282,25 @@ async def get_stock_analysis_api(
 @app.get("/api/stock/{stock_code}/kline")
 async def get_stock_kline_api(
     stock_code: str,
+    start_date: Optional[str] = Query(default=None, pattern=r'^\d{8}$'),
+    end_date: Optional[str] = Query(default=None, pattern=r'^\d{8}$'),
+    points: Optional[int] = Query(default=None, ge=10, le=5000),
+    style: str = Query(default='candle', pattern='^(candle|line)$'),
+    period: str = Query(default='auto', pattern='^(auto|D|W|M)$'),
+    adjust: AdjustType = Query(default='none'),
     settings: Settings = Depends(get_settings)
 ):
-    """获取股票K线数据"""
+    """获取股票K线数据
+
+    默认返回最近 120 天的日线。指定 points 时服务端降采样到不超过 points 个点：
+    K线图（style=candle）按周期归并开高低收，折线图（style=line）对收盘价做 LTTB；
+    长区间优先读取预先归并的周线、月线，返回的数据量与区间长短无关。
+    adjust 指定复权方式（qfq/hfq/none），默认不复权（不随配置 PRICE_ADJUST 变化）。
+    """
     try:
-        # 获取最近60个交易日的K线数据
-        df = ts_api.daily(
-            ts_code=stock_code,
-            start_date=(pd.Timestamp.now() - pd.Timedelta(days=120)).strftime('%Y%m%d')
-        )
-        
-        if df is None or df.empty:
-            return {"data": []}
-            
-        # 按日期排序
-        df = df.sort_values('trade_date')
-        
-        # 转换为前端需要的格式
-        kline_data = []
-        for _, row in df.iterrows():
-            kline_data.append({
-                'trade_date': row['trade_date'],
-                'open': float(row['open']),
-                'close': float(row['close']),
-                'high': float(row['high']),
-                'low': float(row['low']),
-                'volume': float(row['vol']),
-                'amount': float(row['amount'])
-            })
-            
-        return {"data": kline_data}
+        return await run_in_threadpool(get_stock_kline, stock_code, start_date, end_date,
+                                        points, style, period, adjust)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
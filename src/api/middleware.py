@@ -0,0 +1,75 @@
+import time
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from src.api.admission import HEAVY_ROUTES
+from src.api.config import Settings
+from src.utils.metrics import REQUEST_LATENCY
+from src.utils.profiling import new_request_id, profile_request
+
+# 这里的中间件都直接实现 ASGI 接口而不使用 @app.middleware("http")：
+# 后者把下游应用放在单独的任务里转发 receive，路由中 request.is_disconnected() 永远为 False，
+# 重请求就无法在客户端断开时停止。
+
+class RequestLatencyMiddleware:
+    """按路由记录请求耗时"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # 使用路由模板而不是实际路径，避免股票代码造成标签爆炸
+            route = scope.get('route')
+            path = getattr(route, 'path', 'unmatched')
+            REQUEST_LATENCY.labels(scope['method'], path, str(status)).observe(time.perf_counter() - start)
+
+class ProfilingMiddleware:
+    """按请求头或配置对请求做性能分析，慢请求自动保存分析结果"""
+
+    def __init__(self, app: ASGIApp, settings: Settings):
+        self.app = app
+        self.settings = settings
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        settings = self.settings
+        headers = Headers(scope=scope)
+        request_id = headers.get('X-Request-ID') or new_request_id()
+        force = settings.PROFILE_ENABLED or headers.get(settings.PROFILE_HEADER, '') in ('1', 'true')
+        threshold = settings.PROFILE_SLOW_THRESHOLD
+        path = scope['path']
+        if path == '/metrics':
+            force, threshold = False, 0
+
+        async def send_with_request_id(message: Message):
+            if message['type'] == 'http.response.start':
+                MutableHeaders(scope=message)['X-Request-ID'] = request_id
+            await send(message)
+
+        if path in HEAVY_ROUTES:
+            # 重请求在线程池中执行，由 run_heavy 在工作线程里分析
+            scope.setdefault('state', {})['profile'] = (request_id, force, threshold)
+            await self.app(scope, receive, send_with_request_id)
+            return
+
+        with profile_request(request_id, settings.PROFILE_DIR, force=force,
+                             slow_threshold=threshold):
+            await self.app(scope, receive, send_with_request_id)
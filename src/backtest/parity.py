@@ -0,0 +1,122 @@
+"""核对K线形态的向量化检测与逐只股票检测
+
+回测和盘中实时筛选用 signals 在整个面板上检测形态，筛选用 detect 逐只股票判断。
+两者对同一只股票、同一交易日应当给出相同的结论：signals 在第 t 个交易日为 True，
+当且仅当以 recent_bars=1、as_of=该交易日筛选时 detect 判断通过。
+这里在合成数据上抽取若干交易日，对每个实现了 signals 的K线形态逐只股票核对：
+    python -m src.backtest.parity --stocks 200 --dates 10
+有编译内核的形态（头肩底、W底、V型底）分别核对 NumPy 实现和内核（安装了 numba 且 KLINE_KERNELS 未设为 numpy 时）。
+
+价格不复权（前复权以评估日期为基准，不同 as_of 的价格相差一个比例，比较相等的条件会受舍入影响）。
+窗口内有缺失K线的股票跳过：面板中停牌处为 NaN，detect 获取的K线则直接缺少这一天。
+可能涨停的 signals 在面板上没有每日指标，用成交量均值代替量比、不判断换手率，本来就是近似，不在核对范围内。
+"""
+import argparse
+import logging
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+from src.data.base_provider import DataProvider
+from src.data.panel import Panel, load_panel
+from src.filters.filter_factory import FilterFactory
+from src.filters.kline_patterns import kernels
+from src.filters.kline_patterns.base_kline_filter import BaseKlineFilter
+from .engine import BacktestEngine
+
+logger = logging.getLogger(__name__)
+
+def vectorized_patterns() -> List[str]:
+    """实现了 signals 的K线形态"""
+    return [name for name in BacktestEngine.available_patterns()
+            if FilterFactory.get_filter_class(name).signals is not BaseKlineFilter.signals]
+
+def signal_variants(name: str, provider: DataProvider, panel: Panel) -> dict:
+    """形态的各个向量化实现：有 NumPy 实现和编译内核时分别给出，否则只有 signals"""
+    filter_instance = FilterFactory.create_filter(name, provider=provider, adjust=None)
+    if not hasattr(filter_instance, 'numpy_signals'):
+        return {'signals': filter_instance.signals(panel.bars)}
+    variants = {'NumPy': filter_instance.numpy_signals(panel.bars)}
+    if kernels.enabled():
+        # 启用内核时 signals 即调用内核
+        variants['内核'] = filter_instance.signals(panel.bars)
+    return variants
+
+def check_pattern(name: str, provider: DataProvider, panel: Panel, stocks: pd.DataFrame,
+                  rows: List[int], signals: Optional[np.ndarray] = None) -> dict:
+    """在面板的若干行上比较 signals 与 detect 的结论
+
+    Args:
+        name: 形态名称
+        provider: 数据提供者，须与面板来自同一份数据
+        panel: 不复权的行情面板
+        stocks: 股票列表（stock_basic 格式）
+        rows: 核对的面板行
+        signals: 要核对的信号，默认调用筛选器的 signals
+
+    Returns:
+        dict: 核对的（股票, 交易日）数、两边的命中数、不一致数和前几处不一致
+    """
+    if signals is None:
+        signals = FilterFactory.create_filter(name, provider=provider, adjust=None).signals(panel.bars)
+    stocks = stocks.set_index('ts_code', drop=False)
+    complete = ~np.isnan(panel.bars['close'])
+    result = {'pattern': name, 'checked': 0, 'signals': 0, 'detect': 0, 'mismatches': 0, 'examples': []}
+    for row in rows:
+        as_of = panel.trade_dates[row]
+        filter_instance = FilterFactory.create_filter(name, provider=provider, recent_bars=1,
+                                                      as_of=as_of, adjust=None)
+        first = row - filter_instance.required_bars() + 1
+        if first < 0:
+            continue
+        for column, ts_code in enumerate(panel.ts_codes):
+            if ts_code not in stocks.index or not complete[first:row + 1, column].all():
+                continue
+            stock = stocks.loc[ts_code]
+            data = filter_instance.fetch_data(stock)
+            detected = data is not None and filter_instance.detect(stock, data) is not None
+            expected = bool(signals[row, column])
+            result['checked'] += 1
+            result['signals'] += expected
+            result['detect'] += detected
+            if detected != expected:
+                result['mismatches'] += 1
+                if len(result['examples']) < 5:
+                    result['examples'].append((as_of, ts_code, expected, detected))
+    return result
+
+def main():
+    """命令行：在合成面板上逐个交易日核对 signals 与 detect"""
+    from src.data.synthetic_provider import SyntheticProvider
+
+    parser = argparse.ArgumentParser(description="核对K线形态的向量化检测与逐只股票检测")
+    parser.add_argument('--stocks', type=int, default=200)
+    parser.add_argument('--days', type=int, default=250, help="面板的交易日数")
+    parser.add_argument('--dates', type=int, default=10, help="在面板最后一段中均匀抽取的核对交易日数")
+    parser.add_argument('--patterns', nargs='*', default=None, help="形态名称，默认为全部实现了 signals 的形态")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    provider = SyntheticProvider(stock_count=args.stocks, seed=args.seed)
+    patterns = args.patterns or vectorized_patterns()
+    warmup = max(FilterFactory.get_filter_class(name).pattern_bars for name in patterns) - 1
+    trade_dates = provider.recent_trade_dates(max(args.days, warmup + args.dates))
+    panel = load_panel(provider, trade_dates)
+    stocks = provider.stock_basic()
+    rows = sorted(set(np.linspace(warmup, len(trade_dates) - 1, args.dates).astype(int)))
+    print(f"面板: {len(trade_dates)} 个交易日 × {len(panel.ts_codes)} 只股票，核对 {len(rows)} 个交易日，"
+          f"编译内核: {kernels.enabled()}")
+
+    failed = False
+    for name in patterns:
+        for variant, signals in signal_variants(name, provider, panel).items():
+            result = check_pattern(name, provider, panel, stocks, rows, signals)
+            failed = failed or result['mismatches'] > 0
+            print(f"{name}（{variant}）: 核对 {result['checked']} 个，向量化命中 {result['signals']}，"
+                  f"detect 命中 {result['detect']}，不一致 {result['mismatches']}")
+            for as_of, ts_code, expected, detected in result['examples']:
+                print(f"    {as_of} {ts_code}: signals={expected} detect={detected}")
+    raise SystemExit(1 if failed else 0)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
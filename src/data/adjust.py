@@ -0,0 +1,187 @@
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from .base_provider import DataProvider, record_failure, track_usage
+from src.utils.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# 复权方式：前复权、后复权
+ADJUST_TYPES = ('qfq', 'hfq')
+ADJUST_NAMES = {'qfq': '前复权', 'hfq': '后复权'}
+# 需要乘以复权乘数的价格列（daily 列名与面板字段名相同）
+PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'pre_close', 'change')
+# 面板中保存复权因子的字段
+FACTOR_FIELD = 'adj_factor'
+# 复权因子已按交易日批量保存（或在内存中）的数据提供者，逐只股票复权不产生额外的上游调用
+BULK_FACTOR_PROVIDERS = ('local', 'synthetic')
+
+def resolve_adjust(adjust: Optional[str], bulk: bool = False) -> Optional[str]:
+    """规范化复权方式：None 取配置 PRICE_ADJUST，'none' 或空串表示不复权
+
+    auto（默认配置）在数据提供者为本地存储或合成数据时前复权，直连 Tushare 时不复权：
+    逐只股票复权需要为每只股票额外调用一次 adj_factor，筛选的上游调用次数翻倍。
+    bulk 为 True 表示复权因子按交易日批量获取（如回测面板，每个交易日一次调用），auto 总是前复权。
+    """
+    from src.api.config import get_settings
+    if adjust is None:
+        adjust = get_settings().PRICE_ADJUST
+    adjust = (adjust or '').lower()
+    if adjust == 'auto':
+        adjust = 'qfq' if bulk or get_settings().DATA_PROVIDER in BULK_FACTOR_PROVIDERS else ''
+    if adjust in ('', 'none'):
+        return None
+    if adjust not in ADJUST_TYPES:
+        raise ValueError(f"未知的复权方式: {adjust}")
+    return adjust
+
+def fill_factors(factor: np.ndarray, first: np.ndarray) -> np.ndarray:
+    """在每只股票的行内向前填充缺失的复权因子（如停牌日），开头仍缺失的按 1 计
+
+    factor 按 (股票, 交易日) 排序，first 标记每只股票的第一行。
+    """
+    factor = np.asarray(factor, dtype=np.float64)
+    index = np.where(~np.isnan(factor) | first, np.arange(len(factor)), 0)
+    np.maximum.accumulate(index, out=index)
+    filled = factor[index]
+    return np.where(np.isnan(filled), 1.0, filled)
+
+def multipliers(factor: np.ndarray, first: np.ndarray, adjust: str) -> np.ndarray:
+    """每行价格的复权乘数
+
+    后复权为当日复权因子；前复权为当日复权因子除以该股票最后一行的复权因子，
+    最后一个交易日的价格与不复权相同。
+    """
+    factor = fill_factors(factor, first)
+    if adjust == 'hfq' or len(factor) == 0:
+        return factor
+    starts = np.flatnonzero(first)
+    ends = np.append(starts[1:], len(factor)) - 1
+    return factor / np.repeat(factor[ends], ends - starts + 1)
+
+def adjust_frame(bars: pd.DataFrame, factors: Optional[pd.DataFrame], adjust: Optional[str]) -> pd.DataFrame:
+    """对 daily 格式的长表复权，结果按 (ts_code, trade_date) 升序
+
+    factors 为 adj_factor 格式的长表，按 (ts_code, trade_date) 对齐后整列相乘。
+    前复权以每只股票在 bars 中最后一个交易日为基准，成交量和涨跌幅不变。
+    完全没有复权因子的股票价格保持不复权，代码记录在结果的 attrs['unadjusted'] 中并记录警告。
+    """
+    if not adjust or bars is None or bars.empty:
+        return bars
+    bars = bars.sort_values(['ts_code', 'trade_date']).reset_index(drop=True)
+    keys = pd.MultiIndex.from_arrays([bars['ts_code'].astype(str), bars['trade_date'].astype(str)])
+    if factors is None or factors.empty:
+        factor = np.full(len(bars), np.nan)
+    else:
+        table = pd.Series(factors['adj_factor'].to_numpy(dtype=np.float64),
+                          index=pd.MultiIndex.from_arrays([factors['ts_code'].astype(str),
+                                                           factors['trade_date'].astype(str)]))
+        table = table[~table.index.duplicated(keep='last')]
+        factor = table.reindex(keys).to_numpy()
+    codes = bars['ts_code'].to_numpy(dtype=str)
+    first = np.ones(len(bars), dtype=bool)
+    first[1:] = codes[1:] != codes[:-1]
+    has_factor = pd.Series(~np.isnan(factor)).groupby(codes).any()
+    unadjusted = list(has_factor.index[~has_factor.to_numpy()])
+    if unadjusted:
+        logger.warning(f"{len(unadjusted)} 只股票缺少复权因子，价格未复权: {', '.join(unadjusted[:10])}")
+    scale = multipliers(factor, first, adjust)
+    for column in PRICE_COLUMNS:
+        if column in bars.columns:
+            bars[column] = (bars[column].to_numpy(dtype=np.float64) * scale).round(4)
+    bars.attrs['unadjusted'] = unadjusted
+    return bars
+
+def adjust_wide(bars: Dict[str, np.ndarray], factor: np.ndarray, adjust: str) -> Dict[str, np.ndarray]:
+    """对 (交易日, 股票) 宽表复权，factor 为同形状的复权因子（缺失处为 NaN）
+
+    前复权以每只股票在宽表中最后一个有复权因子的交易日为基准，完全没有复权因子的股票不复权并记录警告。
+    """
+    traded = next((~np.isnan(values) for field, values in bars.items() if field in PRICE_COLUMNS), None)
+    missing = int((np.isnan(factor).all(axis=0) & traded.any(axis=0)).sum()) if traded is not None and factor.size else 0
+    if missing:
+        logger.warning(f"{missing} 只股票缺少复权因子，价格未复权")
+    filled = pd.DataFrame(factor).ffill().fillna(1.0).to_numpy()
+    scale = filled if adjust == 'hfq' else filled / filled[-1]
+    return {field: values * scale if field in PRICE_COLUMNS else values for field, values in bars.items()}
+
+class AdjustedViews:
+    """复权日线视图缓存
+
+    单只股票的复权日线由日线和复权因子（本地存储中按交易日批量同步，一个交易日一次调用覆盖全市场）
+    相乘得到。前复权只取决于截止日期的复权因子，因此按 (股票, 截止日期, 复权方式, 字段) 缓存
+    已计算的最长区间，回看更短的筛选器直接截取，不重复读取和计算。
+    超过 max_entries 时淘汰最久未使用的视图，超过 ttl 秒的视图重新计算（当日数据可能稍后才发布）。
+    """
+
+    def __init__(self, provider: DataProvider, max_entries: int = 2000, ttl: float = 600):
+        self.provider = provider
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._views: 'OrderedDict[Tuple, Tuple[float, str, pd.DataFrame]]' = OrderedDict()
+
+    def daily(self, ts_code: str, start_date: str, end_date: str, adjust: str,
+              fields: Optional[str] = None) -> pd.DataFrame:
+        """区间内的复权日线（daily 格式，按交易日升序），fields 需要包含 ts_code 和 trade_date"""
+        key = (ts_code, end_date, adjust, fields)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._views.get(key)
+            if cached is not None and now - cached[0] < self.ttl and cached[1] <= start_date:
+                self._views.move_to_end(key)
+                CACHE_REQUESTS.labels('adjusted_daily', 'hit').inc()
+                view = cached[2]
+                return view[view['trade_date'].astype(str) >= start_date].reset_index(drop=True)
+        CACHE_REQUESTS.labels('adjusted_daily', 'miss').inc()
+
+        bars = self.provider.daily(ts_code=ts_code, start_date=start_date, end_date=end_date, fields=fields)
+        if bars is None or bars.empty:
+            return pd.DataFrame(columns=fields.split(',') if fields else None)
+        with track_usage() as usage:
+            try:
+                factors = self.provider.adj_factor(ts_code=ts_code, start_date=start_date, end_date=end_date)
+            except Exception:
+                # 不退回不复权价格（除权缺口会产生虚假形态）；权限不足等错误提供者不计为失败，
+                # 这里补记，执行计划把这只股票记为未能判断并稍后重试
+                if not usage.failures:
+                    record_failure()
+                raise
+        view = adjust_frame(bars, factors, adjust)
+        if view.attrs.get('unadjusted'):
+            record_failure()
+            raise ValueError(f"股票 {ts_code} 在 {start_date}-{end_date} 没有复权因子，无法{ADJUST_NAMES[adjust]}")
+        with self._lock:
+            self._views[key] = (now, start_date, view)
+            self._views.move_to_end(key)
+            while len(self._views) > self.max_entries:
+                self._views.popitem(last=False)
+        return view.copy()
+
+_views: 'weakref.WeakKeyDictionary[DataProvider, AdjustedViews]' = weakref.WeakKeyDictionary()
+_views_lock = threading.Lock()
+
+def views_for(provider: DataProvider) -> AdjustedViews:
+    """获取数据提供者对应的复权视图缓存"""
+    with _views_lock:
+        views = _views.get(provider)
+        if views is None:
+            from src.api.config import get_settings
+            settings = get_settings()
+            views = _views[provider] = AdjustedViews(provider, settings.ADJUST_CACHE_SIZE, settings.CACHE_TTL)
+        return views
+
+def adjusted_daily(provider: DataProvider, ts_code: str, start_date: str, end_date: str,
+                   adjust: Optional[str], fields: Optional[str] = None) -> pd.DataFrame:
+    """获取单只股票区间内的日线（按交易日升序），adjust 为空时不复权"""
+    if not adjust:
+        daily = provider.daily(ts_code=ts_code, start_date=start_date, end_date=end_date, fields=fields)
+        if daily is None or daily.empty:
+            return pd.DataFrame(columns=fields.split(',') if fields else None)
+        return daily.sort_values('trade_date').reset_index(drop=True)
+    return views_for(provider).daily(ts_code, start_date, end_date, adjust, fields)
@@ -0,0 +1,235 @@
+import argparse
+import logging
+import threading
+import time
+import weakref
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from .adjust import adjust_frame, adjusted_daily
+from .base_provider import DataProvider
+from .local_store_provider import LocalStoreProvider
+from src.utils.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# 周期 -> 存储表名
+PERIOD_TABLES: Dict[str, str] = {'W': 'bars_weekly', 'M': 'bars_monthly'}
+PERIOD_NAMES: Dict[str, str] = {'D': '日线', 'W': '周线', 'M': '月线'}
+# 周线、月线中另外保存的后复权价格列
+HFQ_COLUMNS = ('open', 'high', 'low', 'close', 'pre_close')
+
+def period_keys(trade_dates: Sequence[str], period: str) -> np.ndarray:
+    """把升序交易日映射到所属周期的键：该自然周（或自然月）的最后一个交易日
+
+    trade_dates 传入交易日历时，尚未结束的周期的键是日历上该周期的最后一个交易日，
+    新增交易日后键不变，增量更新会覆盖同一行。
+    """
+    dates = np.asarray(trade_dates, dtype=str)
+    if len(dates) == 0:
+        return dates
+    stamps = pd.to_datetime(dates, format='%Y%m%d')
+    if period == 'W':
+        # 同一周的交易日对应同一个周一
+        group = (stamps - pd.to_timedelta(stamps.weekday, unit='D')).to_numpy()
+    elif period == 'M':
+        group = (stamps.year * 100 + stamps.month).to_numpy()
+    else:
+        raise ValueError(f"未知的K线周期: {period}")
+    last = np.ones(len(dates), dtype=bool)
+    last[:-1] = group[1:] != group[:-1]
+    ends = np.flatnonzero(last)
+    # 每个交易日所在分段的最后一个下标
+    return dates[ends[np.searchsorted(ends, np.arange(len(dates)))]]
+
+def aggregate_bars(bars: pd.DataFrame, keys: np.ndarray) -> pd.DataFrame:
+    """按分段归并日线：开盘取首日、收盘取末日、最高/最低取极值、成交量和成交额求和
+
+    bars 为 daily 格式的长表，keys 与 bars 逐行对应，同一股票相同键的行归为一根K线。
+    整个长表一次排序后用 reduceat 计算，不逐只股票循环。
+    结果的 trade_date 为键，bar_end 为该K线实际包含的最后一个交易日，days 为包含的交易日数。
+    """
+    if bars is None or bars.empty:
+        return pd.DataFrame(columns=['ts_code', 'trade_date', 'bar_end', 'open', 'high', 'low',
+                                     'close', 'pre_close', 'vol', 'amount', 'pct_chg', 'days'])
+    codes = bars['ts_code'].to_numpy(dtype=str)
+    dates = bars['trade_date'].astype(str).to_numpy()
+    keys = np.asarray(keys, dtype=str)
+    order = np.lexsort((dates, keys, codes))
+    codes, dates, keys = codes[order], dates[order], keys[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (codes[1:] != codes[:-1]) | (keys[1:] != keys[:-1])
+    starts = np.flatnonzero(first)
+    ends = np.append(starts[1:], len(order)) - 1
+
+    def column(name: str) -> np.ndarray:
+        return bars[name].to_numpy(dtype=np.float64)[order]
+
+    result = pd.DataFrame({
+        'ts_code': codes[starts],
+        'trade_date': keys[starts],
+        'bar_end': dates[ends],
+        'open': column('open')[starts],
+        'high': np.maximum.reduceat(column('high'), starts),
+        'low': np.minimum.reduceat(column('low'), starts),
+        'close': column('close')[ends],
+    })
+    if 'pre_close' in bars.columns:
+        result['pre_close'] = column('pre_close')[starts]
+    for name in ('vol', 'amount'):
+        if name in bars.columns:
+            # 停牌日的成交量可能缺失，按 0 计
+            result[name] = np.add.reduceat(np.nan_to_num(column(name)), starts)
+    if 'pre_close' in result.columns:
+        result['pct_chg'] = (result['close'] / result['pre_close'] - 1) * 100
+    result['days'] = ends - starts + 1
+    return result
+
+class BarPyramid:
+    """周线、月线K线金字塔
+
+    由本地存储中的日线按交易日历的自然周、自然月归并而成，保存在 bars_weekly、bars_monthly 表中
+    （与日线一样按月分区，每根K线的 trade_date 为所在周期的最后一个交易日），
+    并用同步清单记录已归并的日线交易日。新同步的交易日只重新归并它们所在的周期，
+    长区间的图表和形态读取周线、月线时不需要读取多年的日线。
+    除不复权价格外还保存由后复权日线归并的 hfq_open 等列和截至 bar_end 的复权因子 adj_factor：
+    后复权价格不随之后的除权变化，前复权只需再除以区间内最后一根K线的复权因子。
+    """
+
+    def __init__(self, store: LocalStoreProvider):
+        self.store = store
+        self._lock = threading.Lock()
+
+    def ensure(self, period: str, trade_dates: List[str]) -> int:
+        """归并尚未归并的交易日，返回新归并的交易日数"""
+        table = PERIOD_TABLES[period]
+        built = self.store.synced_dates(table)
+        missing = [d for d in trade_dates if d not in built]
+        CACHE_REQUESTS.labels(table, 'hit').inc(len(trade_dates) - len(missing))
+        if not missing:
+            return 0
+        CACHE_REQUESTS.labels(table, 'miss').inc(len(missing))
+        with self._lock:
+            # 等锁期间可能已被其他线程归并
+            built = self.store.synced_dates(table)
+            bar_dates = self.store.synced_dates('daily')
+            missing = sorted(d for d in missing if d not in built and d in bar_dates)
+            if not missing:
+                return 0
+            return self._build(period, missing)
+
+    def _build(self, period: str, trade_dates: List[str]) -> int:
+        """重新归并这些交易日所在的完整周期并写入存储"""
+        start_time = time.time()
+        # 向前后各多取一个月的日历，覆盖首尾两个周期的全部交易日
+        calendar = self.store.trade_dates(
+            (pd.Timestamp(trade_dates[0]) - pd.Timedelta(days=31)).strftime('%Y%m%d'),
+            (pd.Timestamp(trade_dates[-1]) + pd.Timedelta(days=31)).strftime('%Y%m%d'))
+        keys = pd.Series(period_keys(calendar, period), index=calendar)
+        affected = set(keys.reindex(trade_dates).dropna())
+        in_affected = keys.isin(affected)
+        start, end = keys.index[in_affected.argmax()], str(max(affected))
+
+        bars = self.store.read_range('daily', start, end)
+        table = PERIOD_TABLES[period]
+        if not bars.empty:
+            bars = bars[bars['trade_date'].isin(keys.index[in_affected])]
+            bars = bars.assign(period_key=keys.reindex(bars['trade_date']).to_numpy())
+            result = aggregate_bars(bars, bars['period_key'].to_numpy())
+            # 两次归并的分组和顺序相同，后复权K线与不复权K线逐行对应
+            hfq = adjust_frame(bars, self.store.read_range('adj_factor', start, end), 'hfq')
+            hfq = aggregate_bars(hfq, hfq['period_key'].to_numpy())
+            for column in HFQ_COLUMNS:
+                result[f"hfq_{column}"] = hfq[column].to_numpy()
+            result['adj_factor'] = hfq['close'].to_numpy() / result['close'].to_numpy()
+            self.store.write_rows(table, result)
+        self.store.mark_synced(table, trade_dates)
+        logger.info(f"{PERIOD_NAMES[period]}归并 {len(trade_dates)} 个交易日（{len(affected)} 个周期），"
+                    f"耗时 {time.time() - start_time:.1f}秒")
+        return len(trade_dates)
+
+    def read(self, period: str, ts_code: str, start_date: str, end_date: str,
+             adjust: Optional[str] = None) -> pd.DataFrame:
+        """读取单只股票区间内的周线或月线（升序），包含 end_date 所在的未结束周期
+
+        adjust 为 qfq/hfq 时价格列替换为复权价格，前复权以最后一根K线为基准。
+        尚未保存复权价格（在支持复权之前生成）的周期抛出 ValueError。
+        """
+        calendar = self.store.trade_dates(
+            start_date, (pd.Timestamp(end_date) + pd.Timedelta(days=31)).strftime('%Y%m%d'))
+        dates = [d for d in calendar if d <= end_date]
+        if not dates:
+            return pd.DataFrame()
+        # 先按交易日批量同步日线和复权因子，再归并
+        self.store.sync_dates('daily', dates)
+        self.store.sync_dates('adj_factor', dates)
+        self.ensure(period, dates)
+        last_key = str(period_keys(calendar, period)[len(dates) - 1])
+        df = self.store.read_range(PERIOD_TABLES[period], start_date, last_key, ts_code=ts_code)
+        if adjust and not df.empty:
+            if 'adj_factor' not in df.columns or df['adj_factor'].isna().any():
+                raise ValueError(f"{PERIOD_NAMES[period]}缺少复权价格")
+            scale = 1.0 if adjust == 'hfq' else 1.0 / df['adj_factor'].iloc[-1]
+            for column in HFQ_COLUMNS:
+                df[column] = (df[f"hfq_{column}"] * scale).round(4)
+        return df
+
+_pyramids: 'weakref.WeakKeyDictionary[DataProvider, BarPyramid]' = weakref.WeakKeyDictionary()
+_pyramids_lock = threading.Lock()
+
+def pyramid_for(provider: DataProvider) -> Optional[BarPyramid]:
+    """获取数据提供者对应的K线金字塔，只有本地存储提供者才有"""
+    if not isinstance(provider, LocalStoreProvider):
+        return None
+    with _pyramids_lock:
+        pyramid = _pyramids.get(provider)
+        if pyramid is None:
+            pyramid = _pyramids[provider] = BarPyramid(provider)
+        return pyramid
+
+def period_bars(provider: DataProvider, ts_code: str, period: str, start_date: str,
+                end_date: str, adjust: Optional[str] = None) -> pd.DataFrame:
+    """获取单只股票指定周期的K线（升序），adjust 为 qfq/hfq 时为复权价格
+
+    本地存储提供者读取预先归并的周线、月线；其他提供者获取区间内的（复权）日线后当场归并。
+    """
+    pyramid = pyramid_for(provider) if period != 'D' else None
+    if pyramid is not None:
+        try:
+            return pyramid.read(period, ts_code, start_date, end_date, adjust)
+        except Exception as e:
+            logger.error(f"读取{PERIOD_NAMES[period]}失败，改为由日线归并: {str(e)}")
+
+    daily = adjusted_daily(provider, ts_code, start_date, end_date, adjust)
+    if daily is None or daily.empty:
+        return pd.DataFrame()
+    if period == 'D':
+        return daily
+    # 没有日历时以数据中的交易日为准，最后一根K线的日期是其实际的最后一个交易日
+    keys = pd.Series(period_keys(daily['trade_date'].astype(str).to_numpy(), period),
+                     index=daily['trade_date'].astype(str))
+    return aggregate_bars(daily, keys.to_numpy()).sort_values('trade_date').reset_index(drop=True)
+
+def main():
+    """命令行：为本地存储中的日线生成周线和月线（通常在每日同步行情之后执行）"""
+    from src.api.config import get_settings
+    from .provider_factory import ProviderFactory
+
+    parser = argparse.ArgumentParser(description="生成周线、月线K线金字塔")
+    parser.add_argument('--start', required=True, help="起始日期，如 20200101")
+    parser.add_argument('--end', default=None, help="结束日期，默认为当天")
+    parser.add_argument('--periods', nargs='*', default=list(PERIOD_TABLES), help="周期（W、M）")
+    args = parser.parse_args()
+
+    provider = ProviderFactory.create_provider('local', get_settings())
+    end = args.end or pd.Timestamp.now().strftime('%Y%m%d')
+    dates = provider.trade_dates(args.start, end)
+    provider.sync_dates('daily', dates)
+    provider.sync_dates('adj_factor', dates)
+    pyramid = pyramid_for(provider)
+    for period in args.periods:
+        print(f"{PERIOD_NAMES[period]}: 归并 {pyramid.ensure(period, dates)} 个交易日")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
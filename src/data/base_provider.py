@@ -0,0 +1,163 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
+import pandas as pd
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class UpstreamUsage:
+    """一段代码内（当前线程的上下文中）发出的上游调用和失败次数
+
+    提供者的 upstream_calls、upstream_failures 是整个进程的累计值，多个请求并发筛选时
+    无法用差值判断某只股票的数据是否取到；执行计划用 track_usage 只统计自己发出的调用。
+    """
+
+    def __init__(self, parent: Optional['UpstreamUsage'] = None):
+        self.calls = 0
+        self.failures = 0
+        self.parent = parent
+
+_usage: ContextVar[Optional[UpstreamUsage]] = ContextVar('upstream_usage', default=None)
+
+@contextmanager
+def track_usage() -> Iterator[UpstreamUsage]:
+    """统计代码块内的上游调用，嵌套时外层同样计入"""
+    usage = UpstreamUsage(_usage.get())
+    reset = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(reset)
+
+def record_failure():
+    """在当前上下文的 track_usage 中记一次失败
+
+    数据取到了却不能使用（如缺少复权因子），或者提供者不计为失败的错误（如接口权限不足）
+    导致无法判断时调用，执行计划据此把股票记为未能判断，而不是当作不满足条件。
+    """
+    usage = _usage.get()
+    while usage is not None:
+        usage.failures += 1
+        usage = usage.parent
+
+class DataProvider(ABC):
+    """行情数据提供者基类
+
+    统一封装日线、每日指标、资金流向、复权因子、股票列表、指数成分和交易日历的访问。
+    所有接口的参数与返回的 DataFrame 列名都与 Tushare 保持一致，
+    日期均为 YYYYMMDD 格式字符串，按交易日期倒序返回。
+    """
+
+    name = 'base'
+
+    # 累计上游调用次数，用于估算筛选成本
+    upstream_calls = 0
+    # 累计重试后仍失败（或熔断）的上游调用次数，执行计划据此稍后重试受影响的股票
+    upstream_failures = 0
+    _counter_lock = threading.Lock()
+
+    def _record_upstream(self, calls: int = 0, failures: int = 0):
+        """累计上游调用和失败次数，同时计入当前上下文中的 track_usage"""
+        with DataProvider._counter_lock:
+            self.upstream_calls += calls
+            self.upstream_failures += failures
+        usage = _usage.get()
+        while usage is not None:
+            usage.calls += calls
+            usage.failures += failures
+            usage = usage.parent
+
+    @abstractmethod
+    def daily(self, ts_code: Optional[str] = None, trade_date: Optional[str] = None,
+              start_date: Optional[str] = None, end_date: Optional[str] = None,
+              fields: Optional[str] = None) -> pd.DataFrame:
+        """获取日线行情，ts_code 支持逗号分隔的多个代码"""
+        pass
+
+    @abstractmethod
+    def daily_basic(self, ts_code: Optional[str] = None, trade_date: Optional[str] = None,
+                    start_date: Optional[str] = None, end_date: Optional[str] = None,
+                    fields: Optional[str] = None) -> pd.DataFrame:
+        """获取每日指标（换手率、量比、市盈率、市值等）"""
+        pass
+
+    @abstractmethod
+    def moneyflow(self, ts_code: Optional[str] = None, trade_date: Optional[str] = None,
+                  start_date: Optional[str] = None, end_date: Optional[str] = None,
+                  fields: Optional[str] = None) -> pd.DataFrame:
+        """获取个股资金流向"""
+        pass
+
+    @abstractmethod
+    def adj_factor(self, ts_code: Optional[str] = None, trade_date: Optional[str] = None,
+                   start_date: Optional[str] = None, end_date: Optional[str] = None,
+                   fields: Optional[str] = None) -> pd.DataFrame:
+        """获取复权因子（ts_code、trade_date、adj_factor），按 trade_date 查询时一次返回全市场"""
+        pass
+
+    @abstractmethod
+    def stock_basic(self, ts_code: Optional[str] = None, exchange: str = '',
+                    list_status: str = 'L', fields: Optional[str] = None) -> pd.DataFrame:
+        """获取股票列表"""
+        pass
+
+    @abstractmethod
+    def index_weight(self, index_code: str, start_date: Optional[str] = None,
+                     end_date: Optional[str] = None) -> pd.DataFrame:
+        """获取指数成分和权重"""
+        pass
+
+    @abstractmethod
+    def trade_cal(self, exchange: str = 'SSE', start_date: Optional[str] = None,
+                  end_date: Optional[str] = None, is_open: Optional[str] = None) -> pd.DataFrame:
+        """获取交易日历"""
+        pass
+
+    def retry_after(self) -> float:
+        """上游暂时不可用（如熔断）时建议等待的秒数，可用时为 0"""
+        return 0.0
+
+    def trade_dates(self, start_date: str, end_date: str) -> List[str]:
+        """获取区间内的交易日列表（升序）"""
+        cal = self.trade_cal(start_date=start_date, end_date=end_date, is_open='1')
+        if cal is None or cal.empty:
+            return []
+        return sorted(cal['cal_date'].astype(str).tolist())
+
+    def recent_trade_dates(self, count: int, end_date: Optional[str] = None) -> List[str]:
+        """获取截至 end_date（含）的最近 count 个交易日（升序）"""
+        end = pd.Timestamp(end_date) if end_date else pd.Timestamp.now().normalize()
+        # 按每年约 245 个交易日估算日历跨度，并留出节假日余量
+        span_days = int(count * 1.6) + 15
+        while True:
+            start = (end - pd.Timedelta(days=span_days)).strftime('%Y%m%d')
+            dates = self.trade_dates(start, end.strftime('%Y%m%d'))
+            if len(dates) >= count or span_days > 365 * 30:
+                return dates[-count:]
+            span_days *= 2
+
+    @staticmethod
+    def _slice_frame(df: pd.DataFrame, ts_code: Optional[str] = None, trade_date: Optional[str] = None,
+                     start_date: Optional[str] = None, end_date: Optional[str] = None,
+                     fields: Optional[str] = None, date_col: str = 'trade_date') -> pd.DataFrame:
+        """按代码、日期和字段截取数据，结果按日期倒序"""
+        if df is None or df.empty:
+            return pd.DataFrame(columns=fields.split(',') if fields else None)
+
+        mask = pd.Series(True, index=df.index)
+        if ts_code:
+            mask &= df['ts_code'].isin(ts_code.split(','))
+        if trade_date:
+            mask &= df[date_col] == trade_date
+        if start_date:
+            mask &= df[date_col] >= start_date
+        if end_date:
+            mask &= df[date_col] <= end_date
+
+        result = df[mask].sort_values([date_col, 'ts_code'], ascending=[False, True])
+        if fields:
+            result = result[[col for col in fields.split(',') if col in result.columns]]
+        return result.reset_index(drop=True)
@@ -0,0 +1,67 @@
+from typing import Optional
+import numpy as np
+import pandas as pd
+from .bar_pyramid import aggregate_bars
+
+def lttb(y: np.ndarray, threshold: int, x: Optional[np.ndarray] = None) -> np.ndarray:
+    """最大三角形三桶（Largest-Triangle-Three-Buckets）降采样，返回保留的点的下标
+
+    首尾两点总是保留，中间的点均分为 threshold - 2 个桶，每个桶保留与
+    上一个保留点、下一个桶均值构成的三角形面积最大的点，折线的峰谷和转折得以保留。
+    x 缺省为等间距（K线按交易日等距绘制）。
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    y = np.asarray(y, dtype=np.float64)
+    x = np.arange(n, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+    # 第 i 个桶为 [edges[i], edges[i + 1])，不含首尾两点
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        if i < threshold - 3:
+            next_lo, next_hi = hi, max(edges[i + 2], hi + 1)
+            next_x, next_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        # 三角形面积的两倍，比较大小时不需要除以 2
+        area = np.abs((x[previous] - next_x) * (y[lo:hi] - y[previous]) -
+                      (x[previous] - x[lo:hi]) * (next_y - y[previous]))
+        previous = lo + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+def bucket_ohlc(bars: pd.DataFrame, threshold: int) -> pd.DataFrame:
+    """把单只股票按日期升序的K线按行数均分为 threshold 组，每组归并为一根K线
+
+    开盘取组内第一根、收盘取最后一根、最高/最低取极值、成交量和成交额求和，
+    降采样后仍能看到每段时间的完整价格区间。结果的 trade_date 为组内最后一根K线的日期。
+    """
+    n = len(bars)
+    if threshold >= n or threshold < 1:
+        return bars
+    group = np.arange(n) * threshold // n
+    last = np.ones(n, dtype=bool)
+    last[:-1] = group[1:] != group[:-1]
+    dates = bars['trade_date'].astype(str).to_numpy()
+    keys = dates[np.flatnonzero(last)][group]
+    daily = bars.drop(columns=[c for c in ('trade_date', 'bar_end') if c in bars.columns])
+    daily = daily.assign(trade_date=bars.get('bar_end', bars['trade_date']).astype(str).to_numpy())
+    result = aggregate_bars(daily, keys)
+    if 'days' in bars.columns:
+        result['days'] = np.add.reduceat(bars['days'].to_numpy(), np.flatnonzero(np.r_[True, last[:-1]]))
+    return result.sort_values('trade_date').reset_index(drop=True)
+
+def downsample_bars(bars: pd.DataFrame, points: int, style: str = 'candle') -> pd.DataFrame:
+    """把K线降到不超过 points 个点
+
+    style 为 'line' 时对收盘价做 LTTB，保留原始的K线行；为 'candle' 时按组归并开高低收。
+    """
+    if points is None or len(bars) <= points:
+        return bars
+    if style == 'line':
+        return bars.iloc[lttb(bars['close'].to_numpy(), points)].reset_index(drop=True)
+    return bucket_ohlc(bars, points)
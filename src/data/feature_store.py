@@ -0,0 +1,183 @@
+import argparse
+import logging
+import threading
+import time
+import weakref
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+from .adjust import adjust_frame
+from .base_provider import DataProvider
+from .local_store_provider import LocalStoreProvider
+from src.utils.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# 特征库保存的均线周期：圆弧底在日线上使用 MA20、MA60，以 MA200 判断突破
+MA_PERIODS = (20, 60, 200)
+# 特征列：后复权收盘价和后复权价格上的均线
+FEATURE_COLUMNS = ['hfq_close'] + [f'ma{period}' for period in MA_PERIODS]
+
+def compute_kline_features(df: pd.DataFrame) -> pd.DataFrame:
+    """计算K线形态使用的均线（ma20、ma60、ma200）
+
+    df 为单只股票按日期升序的K线，需要 close 列，结果直接添加到 df 中。
+    """
+    for period in MA_PERIODS:
+        df[f'ma{period}'] = df['close'].rolling(window=period).mean()
+    return df
+
+class FeatureStore:
+    """均线特征库
+
+    圆弧底等K线形态在日线上需要 MA200，每只股票都要取 200 根以上的K线逐只计算。
+    特征库把 compute_kline_features 的结果保存在本地存储中（features_kline 表，与日线一样按月分区），
+    并用同步清单记录已生成的交易日；筛选器通过 calculate_features 读取，不再逐只股票计算。
+
+    均线按后复权价格计算。前复权、后复权价格都与后复权价格只差一个常数倍（前复权为除以截止日的复权因子），
+    读取时按K线收盘价与后复权收盘价之比换算，任意截止日期的前复权K线都可以共用；
+    不复权价格在除权日前后的比例不同，不能换算，不复权时直接计算。
+
+    查询的交易日尚未生成时，按交易日对全市场批量计算：取这些交易日之前 WARMUP_BARS 根本地已有的K线作为预热，
+    逐只股票计算后只写入新交易日的行，已有的交易日不会重复计算。
+    预热只使用本地已有的日线和复权因子，不会为此向上游补数据；历史不足时长周期均线为 NaN，
+    与直接在短区间上计算的结果一致。补齐历史后可以用 rebuild 重新生成。
+    """
+
+    TABLE = 'features_kline'
+    # 预热K线数：覆盖最长的 MA200
+    WARMUP_BARS = 250
+
+    def __init__(self, store: LocalStoreProvider):
+        self.store = store
+        self._lock = threading.Lock()
+
+    def _source_dates(self) -> set:
+        """日线和复权因子都已同步的交易日"""
+        return self.store.synced_dates('daily') & self.store.synced_dates('adj_factor')
+
+    def ensure(self, trade_dates: List[str]) -> int:
+        """生成尚未生成的交易日的特征，返回新生成的交易日数"""
+        generated = self.store.synced_dates(self.TABLE)
+        missing = [d for d in trade_dates if d not in generated]
+        CACHE_REQUESTS.labels(self.TABLE, 'hit').inc(len(trade_dates) - len(missing))
+        if not missing:
+            return 0
+        CACHE_REQUESTS.labels(self.TABLE, 'miss').inc(len(missing))
+        with self._lock:
+            # 等锁期间可能已被其他线程生成
+            generated = self.store.synced_dates(self.TABLE)
+            source_dates = self._source_dates()
+            missing = sorted(d for d in missing if d not in generated and d in source_dates)
+            if not missing:
+                return 0
+            return self._build(missing)
+
+    def rebuild(self, start_date: str, end_date: str) -> int:
+        """重新生成区间内的特征（例如补齐更早的历史之后）"""
+        with self._lock:
+            dates = sorted(d for d in self._source_dates() if start_date <= d <= end_date)
+            return self._build(dates) if dates else 0
+
+    def _build(self, trade_dates: List[str]) -> int:
+        """对全市场计算指定交易日的特征并写入存储"""
+        start_time = time.time()
+        bar_dates = sorted(self.store.synced_dates('daily'))
+        first = bar_dates.index(trade_dates[0])
+        warmup_start = bar_dates[max(0, first - self.WARMUP_BARS)]
+
+        bars = self.store.read_range('daily', warmup_start, trade_dates[-1])
+        if bars.empty:
+            return 0
+        factors = self.store.read_range('adj_factor', warmup_start, trade_dates[-1])
+        # 结果按 (ts_code, trade_date) 升序
+        bars = adjust_frame(bars[['ts_code', 'trade_date', 'close']], factors, 'hfq')
+        targets = set(trade_dates)
+        frames = []
+        for _, group in bars.groupby('ts_code', sort=False):
+            if not group['trade_date'].isin(targets).any():
+                continue
+            group = compute_kline_features(group.reset_index(drop=True)).rename(columns={'close': 'hfq_close'})
+            frames.append(group.loc[group['trade_date'].isin(targets), ['ts_code', 'trade_date'] + FEATURE_COLUMNS])
+
+        if frames:
+            self.store.write_rows(self.TABLE, pd.concat(frames, ignore_index=True))
+        self.store.mark_synced(self.TABLE, trade_dates)
+        logger.info(f"均线特征生成 {len(trade_dates)} 个交易日，"
+                    f"{len(frames)} 只股票，耗时 {time.time() - start_time:.1f}秒")
+        return len(trade_dates)
+
+    def read(self, ts_code: str, start_date: str, end_date: str) -> pd.DataFrame:
+        """读取单只股票的特征"""
+        return self.store.read_range(self.TABLE, start_date, end_date, ts_code=ts_code)
+
+    def attach(self, df: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """把预计算的均线按复权价格换算后加到单只股票的K线上
+
+        df 为 get_kline_data 返回的日期索引复权K线（含 ts_code 列）。
+        存储中缺少其中任一交易日的特征时返回 None，由调用方直接计算。
+        """
+        dates = df.index.strftime('%Y%m%d')
+        self.ensure(list(dates))
+        features = self.read(df['ts_code'].iloc[0], dates[0], dates[-1])
+        if features.empty or not dates.isin(features['trade_date']).all():
+            return None
+        features = features.set_index('trade_date').reindex(dates)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = df['close'].to_numpy(dtype=float) / features['hfq_close'].to_numpy(dtype=float)
+        for period in MA_PERIODS:
+            df[f'ma{period}'] = features[f'ma{period}'].to_numpy() * scale
+        return df
+
+_stores: 'weakref.WeakKeyDictionary[DataProvider, FeatureStore]' = weakref.WeakKeyDictionary()
+_stores_lock = threading.Lock()
+
+def feature_store_for(provider: DataProvider) -> Optional[FeatureStore]:
+    """获取数据提供者对应的特征库，只有本地存储提供者才有特征库"""
+    if not isinstance(provider, LocalStoreProvider):
+        return None
+    with _stores_lock:
+        store = _stores.get(provider)
+        if store is None:
+            store = _stores[provider] = FeatureStore(provider)
+        return store
+
+def calculate_features(df: pd.DataFrame, provider: Optional[DataProvider]) -> pd.DataFrame:
+    """优先读取特征库中的预计算均线，特征库不可用（或 provider 为 None）时直接计算
+
+    provider 只应在 df 为复权日线时传入（见 FeatureStore）。
+    """
+    store = feature_store_for(provider)
+    if store is not None and 'ts_code' in df.columns:
+        try:
+            attached = store.attach(df)
+            if attached is not None:
+                return attached
+        except Exception as e:
+            logger.error(f"读取均线特征失败，改为直接计算: {str(e)}")
+    return compute_kline_features(df)
+
+def main():
+    """命令行：为本地存储中已同步的交易日生成特征（通常在每日同步行情之后执行）"""
+    from src.api.config import get_settings
+    from .provider_factory import ProviderFactory
+
+    parser = argparse.ArgumentParser(description="生成均线特征库")
+    parser.add_argument('--start', required=True, help="起始日期，如 20200101")
+    parser.add_argument('--end', default=None, help="结束日期，默认为当天")
+    parser.add_argument('--rebuild', action='store_true', help="重新生成已有的交易日")
+    args = parser.parse_args()
+
+    provider = ProviderFactory.create_provider('local', get_settings())
+    end = args.end or pd.Timestamp.now().strftime('%Y%m%d')
+    # 先同步行情和复权因子，再生成特征
+    trade_dates = provider.trade_dates(args.start, end)
+    provider.sync_dates('daily', trade_dates)
+    provider.sync_dates('adj_factor', trade_dates)
+    store = feature_store_for(provider)
+    count = store.rebuild(args.start, end) if args.rebuild else store.ensure(trade_dates)
+    print(f"均线特征: 生成 {count} 个交易日")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
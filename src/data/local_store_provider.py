@@ -0,0 +1,335 @@
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import logging
+import json
+import os
+import threading
+from .base_provider import DataProvider
+from src.utils.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+class _Partition:
+    """内存中的月度分区及按代码的行索引
+
+    分区按 (trade_date, ts_code) 排序保存，逐只股票查询只需要其中几十行。
+    索引把行号按代码稳定排序（同一代码的行仍按日期升序），用二分查找定位一只股票的行，
+    不必在全市场的行上逐行比较代码。索引在第一次按代码查询时建立，分区文件更新后随分区一起重建。
+    """
+
+    def __init__(self, mtime: float, df: pd.DataFrame):
+        self.mtime = mtime
+        self.df = df
+        self._index: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def rows(self, codes: List[str]) -> pd.DataFrame:
+        """取出若干股票的行"""
+        index = self._index
+        if index is None:
+            # 多个线程同时建立时结果相同，整体赋值即可
+            all_codes = self.df['ts_code'].to_numpy(dtype=str)
+            order = np.argsort(all_codes, kind='stable')
+            index = self._index = (all_codes[order], order)
+        sorted_codes, order = index
+        left = np.searchsorted(sorted_codes, codes, side='left')
+        right = np.searchsorted(sorted_codes, codes, side='right')
+        positions = [order[lo:hi] for lo, hi in zip(left, right) if hi > lo]
+        if not positions:
+            return self.df.iloc[:0]
+        return self.df.iloc[np.concatenate(positions)]
+
+class LocalStoreProvider(DataProvider):
+    """本地磁盘存储数据提供者
+
+    按交易日同步的行情表（daily、daily_basic、moneyflow、adj_factor）按月分区保存为 parquet，
+    股票列表、指数成分和交易日历保存为快照表。
+
+    配置了上游提供者时，查询区间内尚未同步的交易日会按日批量从上游拉取：
+    一个交易日一次调用即可覆盖全市场，因此逐只股票的历史查询不再产生逐只股票的上游调用。
+    快照表每个自然日最多刷新一次。未配置上游时只读取已有数据，适合离线运行。
+    """
+
+    name = 'local'
+
+    DATED_TABLES = ('daily', 'daily_basic', 'moneyflow', 'adj_factor')
+
+    def __init__(self, root: str, upstream: Optional[DataProvider] = None):
+        self.root = root
+        self.upstream = upstream
+        self._lock = threading.RLock()
+        self._partitions: Dict[Tuple[str, str], _Partition] = {}
+        self._snapshots: Dict[str, Tuple[float, pd.DataFrame]] = {}
+        self._synced: Dict[str, set] = {}
+        os.makedirs(root, exist_ok=True)
+
+    @property
+    def upstream_calls(self) -> int:
+        return self.upstream.upstream_calls if self.upstream is not None else 0
+
+    @property
+    def upstream_failures(self) -> int:
+        return self.upstream.upstream_failures if self.upstream is not None else 0
+
+    def retry_after(self) -> float:
+        return self.upstream.retry_after() if self.upstream is not None else 0.0
+
+    # ------------------------------------------------------------------
+    # 存储布局
+    # ------------------------------------------------------------------
+    def _table_dir(self, table: str) -> str:
+        path = os.path.join(self.root, table)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _partition_path(self, table: str, month: str) -> str:
+        return os.path.join(self._table_dir(table), f"{month}.parquet")
+
+    def _manifest_path(self, table: str) -> str:
+        return os.path.join(self._table_dir(table), '_synced.json')
+
+    def _snapshot_path(self, name: str) -> str:
+        return os.path.join(self.root, f"{name}.parquet")
+
+    @staticmethod
+    def _atomic_write(df: pd.DataFrame, path: str):
+        """先写临时文件再替换，避免读到写了一半的分区"""
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    def _synced_dates(self, table: str) -> set:
+        if table not in self._synced:
+            path = self._manifest_path(table)
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._synced[table] = set(json.load(f))
+            else:
+                self._synced[table] = set()
+        return self._synced[table]
+
+    def _save_synced_dates(self, table: str):
+        path = self._manifest_path(table)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(sorted(self._synced_dates(table)), f)
+        os.replace(tmp_path, path)
+
+    def synced_dates(self, table: str) -> set:
+        """已同步（或已生成）的交易日"""
+        with self._lock:
+            return set(self._synced_dates(table))
+
+    def mark_synced(self, table: str, trade_dates: List[str]):
+        """把交易日记为已同步，供在本地存储中派生数据的表使用"""
+        with self._lock:
+            self._synced_dates(table).update(trade_dates)
+            self._save_synced_dates(table)
+
+    def read_range(self, table: str, start_date: str, end_date: str,
+                   ts_code: Optional[str] = None) -> pd.DataFrame:
+        """读取本地已有的区间数据，不触发上游同步
+
+        指定 ts_code（可用逗号分隔多只）时只取这些股票的行，结果按 (ts_code, trade_date) 升序。
+        """
+        months = pd.period_range(pd.Timestamp(start_date), pd.Timestamp(end_date), freq='M').strftime('%Y%m')
+        frames = self._month_frames(table, months, ts_code)
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        df = df[(df['trade_date'] >= start_date) & (df['trade_date'] <= end_date)]
+        if ts_code:
+            df = df.sort_values(['ts_code', 'trade_date'])
+        return df.reset_index(drop=True)
+
+    def _month_frames(self, table: str, months, ts_code: Optional[str] = None) -> List[pd.DataFrame]:
+        """各月度分区中的数据，指定 ts_code 时按分区索引只取这些股票的行"""
+        codes = sorted(set(ts_code.split(','))) if ts_code else None
+        frames = []
+        for month in months:
+            partition = self._partition(table, month)
+            if partition is None:
+                continue
+            df = partition.rows(codes) if codes else partition.df
+            if not df.empty:
+                frames.append(df)
+        return frames
+
+    def _partition(self, table: str, month: str) -> Optional[_Partition]:
+        path = self._partition_path(table, month)
+        if not os.path.exists(path):
+            return None
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._partitions.get((table, month))
+            if cached is not None and cached.mtime == mtime:
+                CACHE_REQUESTS.labels('store_partition', 'hit').inc()
+                return cached
+        CACHE_REQUESTS.labels('store_partition', 'miss').inc()
+        partition = _Partition(mtime, pd.read_parquet(path))
+        with self._lock:
+            self._partitions[(table, month)] = partition
+        return partition
+
+    def read_partition(self, table: str, month: str) -> pd.DataFrame:
+        """读取一个月度分区，按文件修改时间缓存在内存中"""
+        partition = self._partition(table, month)
+        return partition.df if partition is not None else pd.DataFrame()
+
+    def write_rows(self, table: str, rows: pd.DataFrame):
+        """把按交易日的数据写入对应月度分区，同一 (ts_code, trade_date) 以新数据为准"""
+        if rows is None or rows.empty:
+            return
+        rows = rows.copy()
+        rows['trade_date'] = rows['trade_date'].astype(str)
+        with self._lock:
+            for month, month_rows in rows.groupby(rows['trade_date'].str[:6]):
+                existing = self.read_partition(table, month)
+                merged = pd.concat([existing, month_rows], ignore_index=True)
+                merged = merged.drop_duplicates(['ts_code', 'trade_date'], keep='last')
+                merged = merged.sort_values(['trade_date', 'ts_code']).reset_index(drop=True)
+                self._atomic_write(merged, self._partition_path(table, month))
+
+    # ------------------------------------------------------------------
+    # 同步
+    # ------------------------------------------------------------------
+    def sync_dates(self, table: str, trade_dates: List[str]) -> int:
+        """从上游按交易日批量同步缺失的数据，返回新同步的交易日数"""
+        if self.upstream is None:
+            return 0
+        synced = self._synced_dates(table)
+        missing = [d for d in trade_dates if d not in synced]
+        CACHE_REQUESTS.labels(f"store_{table}", 'hit').inc(len(trade_dates) - len(missing))
+        CACHE_REQUESTS.labels(f"store_{table}", 'miss').inc(len(missing))
+        today = pd.Timestamp.now().strftime('%Y%m%d')
+        count = 0
+        for trade_date in missing:
+            if trade_date > today:
+                continue
+            try:
+                rows = getattr(self.upstream, table)(trade_date=trade_date)
+            except Exception as e:
+                logger.error(f"同步 {table} {trade_date} 失败: {str(e)}")
+                continue
+            if rows is None or rows.empty:
+                # 当日数据尚未发布，不记为已同步
+                logger.info(f"上游 {table} {trade_date} 暂无数据")
+                continue
+            self.write_rows(table, rows)
+            synced.add(trade_date)
+            count += 1
+        if count:
+            self._save_synced_dates(table)
+            logger.info(f"{table} 新同步 {count} 个交易日")
+        return count
+
+    def _read_dated(self, table: str, ts_code=None, trade_date=None, start_date=None,
+                    end_date=None, fields=None) -> pd.DataFrame:
+        if trade_date:
+            start_date = end_date = trade_date
+        if start_date or end_date:
+            start = start_date or '19900101'
+            end = end_date or pd.Timestamp.now().strftime('%Y%m%d')
+            self.sync_dates(table, self.trade_dates(start, end))
+            months = pd.period_range(pd.Timestamp(start), pd.Timestamp(end), freq='M').strftime('%Y%m')
+        else:
+            months = sorted(name[:6] for name in os.listdir(self._table_dir(table))
+                            if name.endswith('.parquet'))
+
+        # 逐只股票查询只取出这些股票的行再截取，不拼接全市场的分区
+        frames = self._month_frames(table, months, ts_code)
+        if not frames:
+            return pd.DataFrame(columns=fields.split(',') if fields else None)
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        return self._slice_frame(df, ts_code, trade_date, start_date, end_date, fields)
+
+    def _read_snapshot(self, name: str, loader) -> pd.DataFrame:
+        """读取快照表，过期（非当日写入）且有上游时刷新"""
+        path = self._snapshot_path(name)
+        fresh = (os.path.exists(path) and
+                 pd.Timestamp(os.path.getmtime(path), unit='s').date() == pd.Timestamp.now().date())
+        if self.upstream is not None and not fresh:
+            try:
+                df = loader(self.upstream)
+                if df is not None and not df.empty:
+                    self._atomic_write(df, path)
+                    return df
+            except Exception as e:
+                logger.error(f"刷新快照 {name} 失败: {str(e)}")
+        if not os.path.exists(path):
+            return pd.DataFrame()
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._snapshots.get(name)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+        df = pd.read_parquet(path)
+        with self._lock:
+            self._snapshots[name] = (mtime, df)
+        return df
+
+    # ------------------------------------------------------------------
+    # DataProvider 接口
+    # ------------------------------------------------------------------
+    def daily(self, ts_code=None, trade_date=None, start_date=None, end_date=None, fields=None):
+        return self._read_dated('daily', ts_code, trade_date, start_date, end_date, fields)
+
+    def daily_basic(self, ts_code=None, trade_date=None, start_date=None, end_date=None, fields=None):
+        return self._read_dated('daily_basic', ts_code, trade_date, start_date, end_date, fields)
+
+    def moneyflow(self, ts_code=None, trade_date=None, start_date=None, end_date=None, fields=None):
+        return self._read_dated('moneyflow', ts_code, trade_date, start_date, end_date, fields)
+
+    def adj_factor(self, ts_code=None, trade_date=None, start_date=None, end_date=None, fields=None):
+        return self._read_dated('adj_factor', ts_code, trade_date, start_date, end_date, fields)
+
+    def stock_basic(self, ts_code=None, exchange='', list_status='L', fields=None):
+        df = self._read_snapshot(
+            f"stock_basic_{list_status}",
+            lambda upstream: upstream.stock_basic(
+                exchange='', list_status=list_status,
+                fields='ts_code,symbol,name,area,industry,market,list_date'
+            )
+        )
+        if df.empty:
+            return df
+        if ts_code:
+            df = df[df['ts_code'].isin(ts_code.split(','))]
+        if exchange:
+            df = df[df['ts_code'].str.endswith(exchange[:2])]
+        if fields:
+            df = df[[col for col in fields.split(',') if col in df.columns]]
+        return df.reset_index(drop=True)
+
+    def index_weight(self, index_code, start_date=None, end_date=None):
+        df = self._read_snapshot(
+            f"index_weight_{index_code}",
+            lambda upstream: upstream.index_weight(index_code=index_code)
+        )
+        if df.empty:
+            return df
+        if start_date:
+            df = df[df['trade_date'] >= start_date]
+        if end_date:
+            df = df[df['trade_date'] <= end_date]
+        return df.reset_index(drop=True)
+
+    def trade_cal(self, exchange='SSE', start_date=None, end_date=None, is_open=None):
+        cal = self._read_snapshot(
+            f"trade_cal_{exchange}",
+            lambda upstream: upstream.trade_cal(
+                exchange=exchange, start_date='19900101',
+                end_date=f"{pd.Timestamp.now().year + 1}1231"
+            )
+        )
+        if cal.empty:
+            return cal
+        cal = cal.copy()
+        cal['cal_date'] = cal['cal_date'].astype(str)
+        if start_date:
+            cal = cal[cal['cal_date'] >= start_date]
+        if end_date:
+            cal = cal[cal['cal_date'] <= end_date]
+        if is_open is not None:
+            cal = cal[cal['is_open'].astype(int) == int(is_open)]
+        return cal.sort_values('cal_date', ascending=False).reset_index(drop=True)
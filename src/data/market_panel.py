@@ -0,0 +1,256 @@
+import argparse
+import logging
+import time
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from .adjust import FACTOR_FIELD, PRICE_COLUMNS, adjust_wide, fill_factors, multipliers
+from .base_provider import DataProvider
+from .panel import DAILY_COLUMNS, PANEL_FIELDS, Panel
+
+logger = logging.getLogger(__name__)
+
+class MarketPanel:
+    """紧凑的全市场日线面板
+
+    所有股票的K线按 (股票, 交易日) 排序后首尾相接保存在连续的 float32 数组中：
+    股票代码只在 ts_codes 中出现一次，行上保存的是 int32 的交易日序号（交易日历中的下标），
+    第 i 只股票的K线位于 offsets[i]:offsets[i + 1]。
+    按股票取数据只是数组切片（视图），不复制数据。
+    10 年、5000 只股票约 1200 万行，五个行情字段加交易日序号约占 300MB。
+    行情保存为不复权价格，加载时带上复权因子（adj_factor 字段，多约 50MB）后，
+    frame、dense 取数据时按需乘以前复权或后复权乘数。
+    """
+
+    def __init__(self, calendar: Sequence[str], ts_codes: Sequence[str], offsets: np.ndarray,
+                 day: np.ndarray, values: Dict[str, np.ndarray]):
+        self.calendar = np.asarray([int(d) for d in calendar], dtype=np.int32)  # 升序交易日，YYYYMMDD
+        self.ts_codes = list(ts_codes)
+        self.offsets = offsets    # (股票数 + 1,) int64
+        self.day = day            # (行数,) int32，交易日序号
+        self.values = values      # 字段名 -> (行数,) float32
+        self._code_index = {code: i for i, code in enumerate(self.ts_codes)}
+        # 从共享目录映射时记录所属的代和数据来源
+        self.generation: Optional[str] = None
+        self.provider_name = ''
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    def __contains__(self, ts_code: str) -> bool:
+        return ts_code in self._code_index
+
+    @property
+    def fields(self) -> List[str]:
+        return list(self.values)
+
+    @property
+    def price_fields(self) -> List[str]:
+        """行情字段（不含复权因子）"""
+        return [field for field in self.values if field != FACTOR_FIELD]
+
+    @property
+    def trade_dates(self) -> List[str]:
+        return [str(d) for d in self.calendar]
+
+    @property
+    def nbytes(self) -> int:
+        """数组占用的内存（字节）"""
+        return (self.calendar.nbytes + self.offsets.nbytes + self.day.nbytes +
+                sum(values.nbytes for values in self.values.values()))
+
+    # ------------------------------------------------------------------
+    # 构建
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_frame(cls, data: pd.DataFrame, calendar: Optional[Sequence[str]] = None,
+                   fields: Sequence[str] = PANEL_FIELDS) -> 'MarketPanel':
+        """由 daily 格式的长表构建，calendar 缺省为数据中出现的交易日"""
+        if data is None or data.empty:
+            return cls(calendar or [], [], np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32),
+                       {field: np.empty(0, dtype=np.float32) for field in fields})
+        trade_date = data['trade_date'].astype(str)
+        calendar = sorted(set(trade_date)) if calendar is None else sorted(calendar)
+        day = pd.Index(calendar).get_indexer(trade_date).astype(np.int32)
+        codes = pd.Categorical(data['ts_code'])
+        code = codes.codes.astype(np.int32)
+        columns = {field: data[DAILY_COLUMNS[field]].to_numpy(dtype=np.float32) for field in fields}
+        return cls._assemble(calendar, list(codes.categories), code, day, columns)
+
+    @classmethod
+    def load(cls, provider: DataProvider, start_date: str, end_date: str,
+             fields: Sequence[str] = PANEL_FIELDS, with_factors: bool = False) -> 'MarketPanel':
+        """按交易日逐日获取全市场日线（每个交易日一次调用）构建
+
+        每天的数据取回后立即转为整数代码和 float32，不在内存中保留整段区间的 DataFrame。
+        with_factors 为 True 时同样按交易日获取全市场复权因子，保存为 adj_factor 字段。
+        """
+        calendar = provider.trade_dates(start_date, end_date)
+        columns = ','.join(['ts_code', 'trade_date'] + [DAILY_COLUMNS[field] for field in fields])
+        code_ids: Dict[str, int] = {}
+        codes, days, chunks = [], [], {field: [] for field in fields}
+        if with_factors:
+            chunks[FACTOR_FIELD] = []
+        start_time = time.time()
+        for ordinal, trade_date in enumerate(calendar):
+            df = provider.daily(trade_date=trade_date, fields=columns)
+            if df is not None and not df.empty:
+                for ts_code in df['ts_code'].unique():
+                    code_ids.setdefault(ts_code, len(code_ids))
+                codes.append(df['ts_code'].map(code_ids).to_numpy(dtype=np.int32))
+                days.append(np.full(len(df), ordinal, dtype=np.int32))
+                for field in fields:
+                    chunks[field].append(df[DAILY_COLUMNS[field]].to_numpy(dtype=np.float32))
+                if with_factors:
+                    factors = provider.adj_factor(trade_date=trade_date)
+                    factor = (factors.drop_duplicates('ts_code').set_index('ts_code')['adj_factor']
+                              .reindex(df['ts_code']) if factors is not None and not factors.empty
+                              else pd.Series(np.nan, index=df.index))
+                    chunks[FACTOR_FIELD].append(factor.to_numpy(dtype=np.float32))
+            if (ordinal + 1) % 100 == 0:
+                logger.info(f"加载行情进度: {ordinal + 1}/{len(calendar)}，耗时 {time.time() - start_time:.1f}秒")
+
+        if not codes:
+            return cls.from_frame(None, calendar, list(chunks))
+        # 按代码排序后重新编号
+        names = np.array(list(code_ids), dtype=object)
+        order = np.argsort(names)
+        rank = np.empty(len(order), dtype=np.int32)
+        rank[order] = np.arange(len(order), dtype=np.int32)
+        panel = cls._assemble(calendar, list(names[order]), rank[np.concatenate(codes)], np.concatenate(days),
+                              {field: np.concatenate(values) for field, values in chunks.items()})
+        if with_factors:
+            # 停牌等缺少复权因子的交易日沿用之前的复权因子
+            panel.values[FACTOR_FIELD] = fill_factors(panel.values[FACTOR_FIELD], panel._first_rows()).astype(np.float32)
+        logger.info(f"紧凑行情面板加载完成: {len(calendar)} 个交易日 × {len(panel.ts_codes)} 只股票，"
+                    f"{len(panel)} 行，{panel.nbytes / 2 ** 20:.1f}MB，耗时 {time.time() - start_time:.1f}秒")
+        return panel
+
+    @classmethod
+    def _assemble(cls, calendar: Sequence[str], ts_codes: List[str], code: np.ndarray, day: np.ndarray,
+                  columns: Dict[str, np.ndarray]) -> 'MarketPanel':
+        """按 (股票, 交易日) 排序，去掉不在交易日历中的行和重复行（保留最后一行）"""
+        keep = np.flatnonzero(day >= 0)
+        code, day = code[keep], day[keep]
+        # 稳定排序，同一 (股票, 交易日) 的重复行中原来靠后的排在后面
+        order = np.lexsort((day, code))
+        code, day = code[order], day[order]
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = (code[1:] != code[:-1]) | (day[1:] != day[:-1])
+        rows = keep[order][last]
+        offsets = np.searchsorted(code[last], np.arange(len(ts_codes) + 1)).astype(np.int64)
+        values = {field: np.ascontiguousarray(values[rows]) for field, values in columns.items()}
+        return cls(calendar, ts_codes, offsets, np.ascontiguousarray(day[last]), values)
+
+    def _first_rows(self) -> np.ndarray:
+        """标记每只股票第一行的布尔数组"""
+        first = np.zeros(len(self.day), dtype=bool)
+        starts = self.offsets[:-1][np.diff(self.offsets) > 0]
+        first[starts] = True
+        return first
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def ordinal(self, trade_date: str, side: str = 'left') -> int:
+        """交易日在日历中的位置；不是交易日时 side='left' 返回之后第一个交易日的位置，
+        side='right' 返回之前最后一个交易日的位置加一"""
+        return int(np.searchsorted(self.calendar, int(trade_date), side=side))
+
+    def rows(self, ts_code: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> slice:
+        """股票在区间内（含两端）的行范围，不在面板中时为空"""
+        index = self._code_index.get(ts_code)
+        if index is None:
+            return slice(0, 0)
+        begin, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        days = self.day[begin:end]
+        if start_date:
+            begin += int(np.searchsorted(days, self.ordinal(start_date, 'left')))
+        if end_date:
+            end = int(self.offsets[index]) + int(np.searchsorted(days, self.ordinal(end_date, 'right')))
+        return slice(begin, max(begin, end))
+
+    def stock(self, ts_code: str, start_date: Optional[str] = None,
+              end_date: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """股票在区间内的K线，字段名 -> 数组视图（按交易日升序，另含交易日序号 day）"""
+        rows = self.rows(ts_code, start_date, end_date)
+        bars = {field: values[rows] for field, values in self.values.items()}
+        bars['day'] = self.day[rows]
+        return bars
+
+    def window(self, ts_code: str, count: int, end_date: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """截至 end_date（含）的最近 count 根K线，数组视图"""
+        rows = self.rows(ts_code, end_date=end_date)
+        rows = slice(max(rows.start, rows.stop - count), rows.stop)
+        bars = {field: values[rows] for field, values in self.values.items()}
+        bars['day'] = self.day[rows]
+        return bars
+
+    def frame(self, ts_code: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+              fields: Optional[Sequence[str]] = None, adjust: Optional[str] = None) -> pd.DataFrame:
+        """与筛选器 get_kline_data 相同格式的 DataFrame（按日期升序、以日期为索引）
+
+        指标计算需要 float64，这里会复制数据；只读取数值时应使用 stock 返回的视图。
+        float32 转回 float64 时保留 4 位小数，使 47.12 这样的价格与原始数据相等。
+        adjust 为 qfq/hfq 时价格乘以复权乘数，前复权以区间内最后一个交易日为基准。
+        """
+        bars = self.stock(ts_code, start_date, end_date)
+        dates = pd.to_datetime(self.calendar[bars.pop('day')].astype(str), format='%Y%m%d')
+        scale = None
+        if adjust:
+            if FACTOR_FIELD not in bars:
+                raise ValueError("面板中没有复权因子")
+            first = np.zeros(len(dates), dtype=bool)
+            first[:1] = True
+            scale = multipliers(bars[FACTOR_FIELD], first, adjust)
+        columns = {}
+        for field in (fields or self.price_fields):
+            values = bars[field].astype(float).round(4)
+            columns[field] = (values * scale).round(4) if scale is not None and field in PRICE_COLUMNS else values
+        df = pd.DataFrame(columns, index=pd.Index(dates, name='date'))
+        df.insert(0, 'ts_code', ts_code)
+        return df
+
+    def dense(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+              fields: Optional[Sequence[str]] = None, adjust: Optional[str] = None) -> Panel:
+        """转为回测使用的 (交易日, 股票) 宽表，缺失处为 NaN
+
+        adjust 为 qfq/hfq 时整个宽表乘以复权乘数，前复权以区间内最后一个交易日为基准。
+        """
+        first = self.ordinal(start_date, 'left') if start_date else 0
+        last = self.ordinal(end_date, 'right') if end_date else len(self.calendar)
+        fields = list(fields or self.price_fields)
+        if adjust and FACTOR_FIELD not in self.values:
+            raise ValueError("面板中没有复权因子")
+        code = np.repeat(np.arange(len(self.ts_codes)), np.diff(self.offsets))
+        keep = (self.day >= first) & (self.day < last)
+        bars = {}
+        for field in fields:
+            values = np.full((last - first, len(self.ts_codes)), np.nan)
+            values[self.day[keep] - first, code[keep]] = self.values[field][keep]
+            bars[field] = values
+        if adjust:
+            factor = np.full((last - first, len(self.ts_codes)), np.nan)
+            factor[self.day[keep] - first, code[keep]] = self.values[FACTOR_FIELD][keep]
+            bars = adjust_wide(bars, factor, adjust)
+        return Panel(self.trade_dates[first:last], self.ts_codes, bars)
+
+def main():
+    """命令行：构建紧凑行情面板并报告内存占用"""
+    from .provider_factory import get_provider
+
+    parser = argparse.ArgumentParser(description="构建紧凑行情面板")
+    parser.add_argument('--start', required=True, help="起始日期，如 20150101")
+    parser.add_argument('--end', required=True, help="结束日期，如 20241231")
+    args = parser.parse_args()
+
+    panel = MarketPanel.load(get_provider(), args.start, args.end)
+    print(f"{len(panel.calendar)} 个交易日 × {len(panel.ts_codes)} 只股票，{len(panel)} 行")
+    for field, values in panel.values.items():
+        print(f"  {field}: {values.nbytes / 2 ** 20:.1f}MB")
+    print(f"  day: {panel.day.nbytes / 2 ** 20:.1f}MB")
+    print(f"合计 {panel.nbytes / 2 ** 20:.1f}MB")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,91 @@
+import logging
+import time
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from .adjust import ADJUST_NAMES, adjust_wide
+from .base_provider import DataProvider
+
+logger = logging.getLogger(__name__)
+
+# 面板中默认保留的行情字段（daily 的 vol 在面板中命名为 volume，与 K线筛选器一致）
+PANEL_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+# 面板字段与 daily 接口列名的对应关系
+DAILY_COLUMNS = {'open': 'open', 'high': 'high', 'low': 'low', 'close': 'close',
+                 'volume': 'vol', 'amount': 'amount', 'pre_close': 'pre_close'}
+
+class Panel:
+    """按 (交易日, 股票) 排列的宽表行情"""
+
+    def __init__(self, trade_dates: List[str], ts_codes: List[str], bars: Dict[str, np.ndarray]):
+        self.trade_dates = trade_dates  # 升序交易日
+        self.ts_codes = ts_codes
+        self.bars = bars                # 字段名 -> (交易日, 股票) 数组
+
+    def forward_returns(self, horizon: int) -> np.ndarray:
+        """以当天收盘价买入、持有 horizon 个交易日后的收益率，数据不足处为 NaN"""
+        close = self.bars['close']
+        result = np.full(close.shape, np.nan)
+        if horizon < len(close):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result[:-horizon] = close[horizon:] / close[:-horizon] - 1
+        return result
+
+    def select(self, ts_codes: Sequence[str]) -> 'Panel':
+        """只保留部分股票"""
+        wanted = set(ts_codes)
+        columns = [i for i, code in enumerate(self.ts_codes) if code in wanted]
+        return Panel(self.trade_dates, [self.ts_codes[i] for i in columns],
+                     {field: values[:, columns] for field, values in self.bars.items()})
+
+def frame_to_panel(data: pd.DataFrame, trade_dates: List[str],
+                   fields: Sequence[str] = PANEL_FIELDS) -> Panel:
+    """把 daily 格式的长表转为宽表，缺失处为 NaN"""
+    if data is None or data.empty:
+        return Panel(trade_dates, [], {field: np.empty((len(trade_dates), 0)) for field in fields})
+    ts_codes = sorted(data['ts_code'].unique())
+    rows = pd.Index(trade_dates).get_indexer(data['trade_date'].astype(str))
+    columns = pd.Index(ts_codes).get_indexer(data['ts_code'])
+    keep = rows >= 0
+    bars = {}
+    for field in fields:
+        values = np.full((len(trade_dates), len(ts_codes)), np.nan)
+        values[rows[keep], columns[keep]] = data[DAILY_COLUMNS[field]].to_numpy(dtype=float)[keep]
+        bars[field] = values
+    return Panel(trade_dates, ts_codes, bars)
+
+def load_panel(provider: DataProvider, trade_dates: List[str],
+               fields: Sequence[str] = PANEL_FIELDS, adjust: Optional[str] = None) -> Panel:
+    """按交易日逐日获取全市场日线（每个交易日一次调用）并转为宽表
+
+    adjust 为 qfq/hfq 时同样按交易日获取全市场复权因子，整个宽表与复权因子相乘；
+    前复权以最后一个交易日为基准。
+    """
+    columns = ','.join(['ts_code', 'trade_date'] + [DAILY_COLUMNS[field] for field in fields])
+    frames, factor_frames = [], []
+    start_time = time.time()
+    for count, trade_date in enumerate(trade_dates, start=1):
+        df = provider.daily(trade_date=trade_date, fields=columns)
+        if df is not None and not df.empty:
+            frames.append(df)
+        if adjust:
+            factors = provider.adj_factor(trade_date=trade_date)
+            if factors is not None and not factors.empty:
+                factor_frames.append(factors)
+        if count % 100 == 0:
+            logger.info(f"加载行情进度: {count}/{len(trade_dates)}，耗时 {time.time() - start_time:.1f}秒")
+
+    panel = frame_to_panel(pd.concat(frames, ignore_index=True) if frames else None, trade_dates, fields)
+    if adjust:
+        factor = np.full((len(trade_dates), len(panel.ts_codes)), np.nan)
+        if factor_frames:
+            factors = pd.concat(factor_frames, ignore_index=True)
+            rows = pd.Index(trade_dates).get_indexer(factors['trade_date'].astype(str))
+            columns = pd.Index(panel.ts_codes).get_indexer(factors['ts_code'])
+            keep = (rows >= 0) & (columns >= 0)
+            factor[rows[keep], columns[keep]] = factors['adj_factor'].to_numpy(dtype=float)[keep]
+        panel.bars = adjust_wide(panel.bars, factor, adjust)
+    logger.info(f"行情面板加载完成: {len(trade_dates)} 个交易日 × {len(panel.ts_codes)} 只股票"
+                f"{'（' + ADJUST_NAMES[adjust] + '）' if adjust else ''}，耗时 {time.time() - start_time:.1f}秒")
+    return panel
@@ -0,0 +1,43 @@
+from typing import Dict, Optional, Type
+from functools import lru_cache
+from .base_provider import DataProvider
+from src.api.config import Settings, get_settings
+
+class ProviderFactory:
+    """数据提供者工厂类"""
+
+    @classmethod
+    def create_provider(cls, provider_type: str, settings: Optional[Settings] = None) -> DataProvider:
+        """创建数据提供者实例"""
+        settings = settings or get_settings()
+
+        if provider_type == 'tushare':
+            from .throttle import AdaptiveThrottle, parse_rates
+            from .tushare_provider import TushareProvider
+            throttle = AdaptiveThrottle(default_rate=settings.TUSHARE_RATE,
+                                        rates=parse_rates(settings.TUSHARE_ENDPOINT_RATES),
+                                        max_attempts=settings.TUSHARE_MAX_ATTEMPTS,
+                                        cooldown=settings.TUSHARE_CIRCUIT_COOLDOWN)
+            return TushareProvider(settings.TUSHARE_TOKEN, throttle=throttle)
+
+        if provider_type == 'synthetic':
+            from .synthetic_provider import SyntheticProvider
+            return SyntheticProvider(
+                stock_count=settings.SYNTHETIC_STOCK_COUNT,
+                seed=settings.SYNTHETIC_SEED
+            )
+
+        if provider_type == 'local':
+            from .local_store_provider import LocalStoreProvider
+            upstream = None
+            if settings.DATA_STORE_UPSTREAM:
+                upstream = cls.create_provider(settings.DATA_STORE_UPSTREAM, settings)
+            return LocalStoreProvider(settings.DATA_STORE_DIR, upstream=upstream)
+
+        raise ValueError(f"未知的数据提供者类型: {provider_type}")
+
+@lru_cache()
+def get_provider() -> DataProvider:
+    """获取按配置创建的数据提供者单例"""
+    settings = get_settings()
+    return ProviderFactory.create_provider(settings.DATA_PROVIDER, settings)
@@ -0,0 +1,196 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Optional, Sequence
+import numpy as np
+import pandas as pd
+from .adjust import FACTOR_FIELD
+from .base_provider import DataProvider
+from .market_panel import MarketPanel
+from .panel import PANEL_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# 共享面板保存的字段（K线形态筛选器使用的行情字段）
+SHARED_FIELDS = PANEL_FIELDS
+# 指向当前代的文件名，内容为代的目录名
+CURRENT_FILE = 'CURRENT'
+MANIFEST_FILE = 'manifest.json'
+
+def publish(panel: MarketPanel, root: str, provider_name: str = '', keep: int = 2) -> str:
+    """把面板发布为新的一代并原子地切换 CURRENT
+
+    每一代是 root 下的一个目录，每个数组一个 .npy 文件，另有记录股票代码和字段的清单。
+    写完全部文件后才替换 CURRENT，读取方不会看到写了一半的代。
+    只保留最近 keep 代，更早的代删除；已经映射旧代的进程在 Linux 上不受影响。
+
+    Returns:
+        str: 新一代的目录名
+    """
+    os.makedirs(root, exist_ok=True)
+    generation = f"gen-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}"
+    path = os.path.join(root, generation)
+    os.makedirs(path)
+    arrays = {'calendar': panel.calendar, 'offsets': panel.offsets, 'day': panel.day}
+    arrays.update({f"field_{field}": values for field, values in panel.values.items()})
+    for name, values in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(values))
+    manifest = {
+        'provider': provider_name,
+        'created_at': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'fields': panel.fields,
+        'ts_codes': panel.ts_codes,
+        'rows': len(panel),
+        'first_date': panel.trade_dates[0] if len(panel.calendar) else None,
+        'last_date': panel.trade_dates[-1] if len(panel.calendar) else None
+    }
+    with open(os.path.join(path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+    current = os.path.join(root, CURRENT_FILE)
+    tmp_path = f"{current}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(generation)
+    os.replace(tmp_path, current)
+    logger.info(f"共享行情面板发布为 {generation}: {len(panel.ts_codes)} 只股票，{len(panel)} 行，"
+                f"{panel.nbytes / 2 ** 20:.1f}MB")
+
+    generations = sorted(name for name in os.listdir(root) if name.startswith('gen-'))
+    for old in generations[:-keep] if keep > 0 else []:
+        if old != generation:
+            shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return generation
+
+def current_generation(root: str) -> Optional[str]:
+    """当前代的目录名，尚未发布时为 None"""
+    try:
+        with open(os.path.join(root, CURRENT_FILE), 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def attach(root: str, generation: Optional[str] = None) -> Optional[MarketPanel]:
+    """以只读内存映射方式打开一代面板，数据页由操作系统在各进程间共享"""
+    generation = generation or current_generation(root)
+    if generation is None:
+        return None
+    path = os.path.join(root, generation)
+    with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    def load(name: str) -> np.ndarray:
+        return np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+
+    panel = MarketPanel(load('calendar'), manifest['ts_codes'], load('offsets'), load('day'),
+                        {field: load(f"field_{field}") for field in manifest['fields']})
+    panel.generation = generation
+    panel.provider_name = manifest.get('provider', '')
+    return panel
+
+class SharedPanel:
+    """进程内对共享面板的引用
+
+    最多每 check_interval 秒检查一次 CURRENT，发现新的一代时重新映射，
+    因此每日收盘后发布新一代时，各 API 进程和 Streamlit 进程无需重启即可切换。
+    """
+
+    def __init__(self, root: str, check_interval: float = 5.0):
+        self.root = root
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._panel: Optional[MarketPanel] = None
+        self._checked_at = 0.0
+        self._latest_dates: Dict[str, Optional[str]] = {}
+
+    def get(self) -> Optional[MarketPanel]:
+        """当前代的面板，尚未发布时为 None"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return self._panel
+            self._checked_at = now
+            generation = current_generation(self.root)
+            if generation is None:
+                self._panel = None
+            elif self._panel is None or self._panel.generation != generation:
+                try:
+                    start_time = time.time()
+                    self._panel = attach(self.root, generation)
+                    self._latest_dates = {}
+                    logger.info(f"映射共享行情面板 {generation}，耗时 {(time.time() - start_time) * 1000:.1f}毫秒")
+                except (OSError, ValueError, KeyError) as e:
+                    logger.error(f"映射共享行情面板 {generation} 失败: {str(e)}")
+            return self._panel
+
+    def _covers(self, panel: MarketPanel, provider: DataProvider, start_date: str, end_date: str) -> bool:
+        """面板是否包含区间内全部交易日"""
+        if not len(panel.calendar) or int(start_date) < panel.calendar[0]:
+            return False
+        last_date = str(panel.calendar[-1])
+        if end_date <= last_date:
+            return True
+        # 面板之后还有交易日时（例如当天收盘后尚未发布新一代）不能使用面板
+        with self._lock:
+            if end_date not in self._latest_dates:
+                next_day = (pd.Timestamp(last_date) + pd.Timedelta(days=1)).strftime('%Y%m%d')
+                later = provider.trade_dates(next_day, end_date)
+                self._latest_dates[end_date] = later[-1] if later else last_date
+            return self._latest_dates[end_date] == last_date
+
+    def kline_frame(self, provider: DataProvider, ts_code: str, start_date: str, end_date: str,
+                    fields: Sequence[str], adjust: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """从面板取出与 get_kline_data 格式相同的K线，面板不可用或不覆盖该区间时返回 None
+
+        adjust 为 qfq/hfq 时需要面板带有复权因子，否则同样返回 None。
+        """
+        panel = self.get()
+        if (panel is None or panel.provider_name != provider.name or
+                any(field not in panel.values for field in fields) or
+                (adjust and FACTOR_FIELD not in panel.values) or
+                not self._covers(panel, provider, start_date, end_date)):
+            return None
+        df = panel.frame(ts_code, start_date, end_date, fields=fields, adjust=adjust)
+        return df if not df.empty else None
+
+@lru_cache()
+def get_shared_panel() -> SharedPanel:
+    """获取按配置创建的共享面板引用"""
+    from src.api.config import get_settings
+    return SharedPanel(get_settings().SHARED_PANEL_DIR)
+
+def shared_kline_frame(provider: DataProvider, ts_code: str, start_date: str, end_date: str,
+                       fields: Sequence[str] = PANEL_FIELDS, adjust: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """筛选器获取K线时优先使用共享面板，不可用时返回 None"""
+    try:
+        return get_shared_panel().kline_frame(provider, ts_code, start_date, end_date, fields, adjust)
+    except Exception as e:
+        logger.error(f"读取共享行情面板失败: {str(e)}")
+        return None
+
+def main():
+    """命令行：构建最近若干年的面板（带复权因子）并发布为新的一代（通常在每日同步行情之后执行）"""
+    from src.api.config import get_settings
+    from .provider_factory import get_provider
+
+    parser = argparse.ArgumentParser(description="发布共享行情面板")
+    parser.add_argument('--start', default=None, help="起始日期，默认为 --years 年前")
+    parser.add_argument('--end', default=None, help="结束日期，默认为当天")
+    parser.add_argument('--years', type=int, default=3, help="未指定起始日期时包含的年数")
+    parser.add_argument('--keep', type=int, default=2, help="保留的代数")
+    args = parser.parse_args()
+
+    end = args.end or pd.Timestamp.now().strftime('%Y%m%d')
+    start = args.start or (pd.Timestamp(end) - pd.DateOffset(years=args.years)).strftime('%Y%m%d')
+    provider = get_provider()
+    panel = MarketPanel.load(provider, start, end, fields=SHARED_FIELDS, with_factors=True)
+    generation = publish(panel, get_settings().SHARED_PANEL_DIR, provider_name=provider.name, keep=args.keep)
+    print(f"已发布 {generation}: {start} 至 {end}，{len(panel.ts_codes)} 只股票，{panel.nbytes / 2 ** 20:.1f}MB")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,477 @@
+import argparse
+import heapq
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from statistics import NormalDist
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from .adjust import adjusted_daily
+from .base_provider import DataProvider
+
+logger = logging.getLogger(__name__)
+
+# 按 SAX 下界每次取出、计算 LB_Keogh 的候选数
+CHUNK_SIZE = 1024
+# 精确距离第一批的候选数，之后逐批加倍
+EXACT_BATCH = 32
+# 两次检查新交易日的最短间隔（秒），当天数据发布之前不会每次查询都请求上游
+REFRESH_INTERVAL = 300
+# 参照K线至少需要的K线数
+MIN_REFERENCE_BARS = 10
+# 重建索引时多取的交易日数，最近一个交易日尚未发布时窗口仍然完整
+REBUILD_EXTRA_DAYS = 2
+# 每个数据提供者缓存的历史索引数（as_of 早于当前索引时生成）
+HISTORICAL_INDEXES = 8
+
+def znorm(values: np.ndarray) -> np.ndarray:
+    """沿最后一维 z 标准化（减均值、除以标准差），没有波动或含缺失值的序列为 NaN"""
+    values = np.asarray(values, dtype=np.float64)
+    mean = values.mean(axis=-1, keepdims=True)
+    std = values.std(axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(std > 1e-9 * np.maximum(np.abs(mean), 1.0), (values - mean) / std, np.nan)
+
+def resample(values: np.ndarray, length: int) -> np.ndarray:
+    """把序列线性插值为 length 个点，参照K线的根数与窗口长度不同时使用"""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == length:
+        return values
+    return np.interp(np.linspace(0, len(values) - 1, length), np.arange(len(values)), values)
+
+def paa(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """分段聚合近似（PAA）：沿最后一维求各段均值，starts 为各段的起始下标"""
+    lengths = np.diff(np.append(starts, values.shape[-1]))
+    return np.add.reduceat(values, starts, axis=-1) / lengths
+
+def envelope(query: np.ndarray, band: int) -> Tuple[np.ndarray, np.ndarray]:
+    """查询序列在 Sakoe-Chiba 带宽 band 内的上、下包络（LB_Keogh 下界使用）"""
+    if band <= 0:
+        return query, query
+    windows = np.lib.stride_tricks.sliding_window_view(np.pad(query, band, mode='edge'), 2 * band + 1)
+    return windows.max(axis=1), windows.min(axis=1)
+
+def dtw_distance(query: np.ndarray, candidates: np.ndarray, band: int) -> np.ndarray:
+    """查询序列与一批候选窗口的 DTW 距离（路径上平方误差之和再开方），对整批向量化计算
+
+    band 为 Sakoe-Chiba 约束的半径，第 i 点只能与 [i - band, i + band] 内的点对齐；为 0 时即欧氏距离。
+    """
+    candidates = np.asarray(candidates, dtype=np.float64)
+    if band <= 0 or len(candidates) == 0:
+        return np.sqrt(((candidates - query) ** 2).sum(axis=-1))
+    n = len(query)
+    previous = np.full((len(candidates), n + 1), np.inf)
+    previous[:, 0] = 0.0
+    for i in range(1, n + 1):
+        current = np.full_like(previous, np.inf)
+        lo, hi = max(1, i - band), min(n, i + band)
+        cost = (query[i - 1] - candidates[:, lo - 1:hi]) ** 2
+        # 来自上一行的两个方向（对角、正上方）可以整段计算，同一行的左侧只能依次累加
+        above = np.minimum(previous[:, lo - 1:hi], previous[:, lo:hi + 1])
+        for k, j in enumerate(range(lo, hi + 1)):
+            current[:, j] = cost[:, k] + np.minimum(above[:, k], current[:, j - 1])
+        previous = current
+    return np.sqrt(previous[:, n])
+
+def similarity_score(distance: np.ndarray, window: int) -> np.ndarray:
+    """相似度评分（0-100）
+
+    z 标准化窗口的欧氏距离平方等于 2 * window * (1 - 相关系数)，评分即相关系数（负相关按 0 计）；
+    DTW 距离不大于欧氏距离，评分相应更高。
+    """
+    return (np.clip(1 - np.asarray(distance) ** 2 / (2 * window), 0, 1) * 100).round(1)
+
+class SimilarityIndex:
+    """相似形态索引
+
+    为每只股票保存最近 window 根K线的后复权收盘价（复权后形态不受除权缺口影响），
+    z 标准化后按 PAA 分为 segments 段，再按标准正态分位数把各段均值离散为 alphabet 个符号（SAX），
+    每只股票的索引只有 segments 个字节。每日只按交易日批量获取新增的行情和复权因子，
+    窗口整体左移一格后重新编码有变化的股票，不重新读取整个窗口。
+
+    查询时先用 SAX 符号区间对全部股票向量化计算下界，按下界从小到大分块取候选，
+    块内计算 LB_Keogh 下界后按其从小到大逐批计算精确的 DTW 距离；
+    下界不小于当前第 top_n 名的距离时即停止，其余候选不再计算。
+    """
+
+    def __init__(self, window: int = 60, segments: int = 12, alphabet: int = 8, band: int = 6,
+                 path: Optional[str] = None, source: str = ''):
+        """
+        Args:
+            window: 窗口长度（K线数）
+            segments: PAA 分段数
+            alphabet: SAX 字母表大小
+            band: DTW 的 Sakoe-Chiba 带宽，0 表示欧氏距离
+            path: 索引文件路径，为空时不保存
+            source: 数据提供者名称，与索引文件中记录的不同时不加载
+        """
+        self.window = window
+        self.segments = min(segments, window)
+        self.alphabet = alphabet
+        self.band = band
+        self.path = path
+        self.source = source
+        self.trade_date: Optional[str] = None
+        self.codes: List[str] = []
+        self._rows: Dict[str, int] = {}
+        # 后复权收盘价（closes，按时间升序，上市不足 window 根K线时左侧为 NaN）、
+        # 窗口最后一根K线的日期（停牌的股票停留在停牌前）、最近一个复权因子（当日缺失时沿用），
+        # 以及由收盘价计算的 z 标准化窗口、SAX 符号和窗口是否完整
+        self._reset()
+        self._starts = np.linspace(0, window, self.segments + 1).round().astype(np.int64)[:-1]
+        self._lengths = np.diff(np.append(self._starts, window))
+        breakpoints = np.array([NormalDist().inv_cdf(k / alphabet) for k in range(1, alphabet)])
+        self._breakpoints = breakpoints
+        # 每个符号对应的 PAA 取值区间
+        self._lo = np.append(-np.inf, breakpoints)
+        self._hi = np.append(breakpoints, np.inf)
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._checked_at = 0.0
+
+    def __len__(self) -> int:
+        return int(self.valid.sum())
+
+    def _reset(self):
+        self.trade_date = None
+        self.codes, self._rows = [], {}
+        self.closes = np.full((0, self.window), np.nan)
+        self.last_dates = np.zeros(0, dtype=np.int64)
+        self.factors = np.zeros(0)
+        self.z = np.zeros((0, self.window), dtype=np.float32)
+        self.sax = np.zeros((0, self.segments), dtype=np.uint8)
+        self.valid = np.zeros(0, dtype=bool)
+
+    def _grow(self, size: int):
+        """扩充到 size 行，新行为空窗口"""
+        extra = size - len(self.closes)
+        self.closes = np.vstack([self.closes, np.full((extra, self.window), np.nan)])
+        self.last_dates = np.append(self.last_dates, np.zeros(extra, dtype=np.int64))
+        self.factors = np.append(self.factors, np.full(extra, np.nan))
+        self.z = np.vstack([self.z, np.full((extra, self.window), np.nan, dtype=np.float32)])
+        self.sax = np.vstack([self.sax, np.zeros((extra, self.segments), dtype=np.uint8)])
+        self.valid = np.append(self.valid, np.zeros(extra, dtype=bool))
+
+    def _append(self, trade_date: str, bars: pd.DataFrame, factors: Optional[pd.DataFrame]) -> np.ndarray:
+        """把一个交易日的收盘价追加到各股票的窗口末尾，返回有变化的行"""
+        bars = bars.dropna(subset=['close']).drop_duplicates('ts_code', keep='last')
+        codes = bars['ts_code'].astype(str).to_numpy()
+        new = [code for code in codes if code not in self._rows]
+        if new:
+            self._rows.update((code, len(self.codes) + i) for i, code in enumerate(new))
+            self.codes.extend(new)
+            self._grow(len(self.codes))
+        rows = np.fromiter((self._rows[code] for code in codes), dtype=np.int64, count=len(codes))
+
+        if factors is not None and not factors.empty:
+            table = pd.Series(factors['adj_factor'].to_numpy(dtype=np.float64), index=factors['ts_code'].astype(str))
+            factor = table[~table.index.duplicated(keep='last')].reindex(codes).to_numpy()
+        else:
+            factor = np.full(len(codes), np.nan)
+        factor = np.where(np.isnan(factor), self.factors[rows], factor)
+        self.factors[rows] = factor
+
+        self.closes[rows, :-1] = self.closes[rows, 1:]
+        self.closes[rows, -1] = bars['close'].to_numpy(dtype=np.float64) * np.nan_to_num(factor, nan=1.0)
+        self.last_dates[rows] = int(trade_date)
+        self.trade_date = trade_date
+        return rows
+
+    def _encode(self, rows: np.ndarray):
+        """重新计算这些行的 z 标准化窗口和 SAX 符号"""
+        z = znorm(self.closes[rows])
+        valid = ~np.isnan(z).any(axis=1)
+        self.valid[rows] = valid
+        self.z[rows] = z
+        self.sax[rows] = np.searchsorted(self._breakpoints, paa(np.nan_to_num(z), self._starts), side='right')
+
+    def refresh(self, provider: DataProvider, end_date: Optional[str] = None, rebuild: bool = False) -> int:
+        """把索引更新到 end_date（默认当天）之前最近一个有行情的交易日，返回新加入的交易日数
+
+        落后超过一个窗口或 rebuild 时重新读取整个窗口，否则只获取新增的交易日。
+        先在索引锁外获取全部新交易日的行情和复权因子，再在锁内一次更新，查询不必等待上游；
+        同时只有一个线程更新同一个索引。
+        """
+        end_date = end_date or pd.Timestamp.now().strftime('%Y%m%d')
+        with self._refresh_lock:
+            self._checked_at = time.monotonic()
+            current = self.trade_date
+            if not rebuild and current and current >= end_date:
+                return 0
+            dates = []
+            if current and not rebuild:
+                dates = [d for d in provider.trade_dates(current, end_date) if d > current]
+            full = rebuild or not current or len(dates) >= self.window
+            if full:
+                dates = provider.recent_trade_dates(self.window + REBUILD_EXTRA_DAYS, end_date)
+
+            start_time = time.time()
+            fetched = []
+            for trade_date in dates:
+                bars = provider.daily(trade_date=trade_date, fields='ts_code,trade_date,close')
+                if bars is None or bars.empty:
+                    # 当天收盘数据可能尚未发布，下次再取
+                    break
+                fetched.append((trade_date, bars, provider.adj_factor(trade_date=trade_date)))
+            if not fetched:
+                return 0
+
+            with self._lock:
+                if full:
+                    self._reset()
+                changed = np.zeros(len(self.codes), dtype=bool)
+                for trade_date, bars, factors in fetched:
+                    rows = self._append(trade_date, bars, factors)
+                    changed = np.append(changed, np.zeros(len(self.codes) - len(changed), dtype=bool))
+                    changed[rows] = True
+                self._encode(np.flatnonzero(changed))
+            logger.info(f"相似形态索引更新到 {self.trade_date}，新增 {len(fetched)} 个交易日，"
+                        f"重新编码 {int(changed.sum())} 只股票，耗时 {time.time() - start_time:.1f}秒")
+            self.save()
+            return len(fetched)
+
+    def window_of(self, ts_code: str) -> Optional[np.ndarray]:
+        """股票当前窗口的后复权收盘价，不在索引中或K线不足时返回 None"""
+        with self._lock:
+            row = self._rows.get(ts_code)
+            if row is None or not self.valid[row]:
+                return None
+            return self.closes[row].copy()
+
+    def search(self, query: np.ndarray, top_n: int = 20, band: Optional[int] = None,
+               codes: Optional[Iterable[str]] = None, exclude: Iterable[str] = ()) -> Tuple[pd.DataFrame, dict]:
+        """查找窗口形态与 query 最相似的 top_n 只股票
+
+        Args:
+            query: 参照K线的收盘价序列，根数与窗口不同时线性插值为窗口长度
+            top_n: 返回的股票数
+            band: DTW 带宽，默认取索引的 band，0 表示欧氏距离
+            codes: 只在这些股票中查找
+            exclude: 不参与比较的股票
+
+        Returns:
+            (按距离升序的 ts_code/distance/score/window_end 表,
+             各阶段的候选数统计：candidates 参与比较、keogh 计算了 LB_Keogh、exact 计算了精确距离)
+        """
+        band = self.band if band is None else min(max(int(band), 0), self.window - 1)
+        q = znorm(resample(query, self.window))
+        if np.isnan(q).any():
+            raise ValueError("参照K线没有波动，无法比较形态")
+        upper, lower = envelope(q, band)
+        upper_paa, lower_paa = paa(upper, self._starts), paa(lower, self._starts)
+
+        with self._lock:
+            mask = self.valid.copy()
+            if codes is not None:
+                mask &= np.isin(np.asarray(self.codes, dtype=str), np.asarray(list(codes), dtype=str))
+            for code in exclude:
+                row = self._rows.get(code)
+                if row is not None:
+                    mask[row] = False
+            rows = np.flatnonzero(mask)
+
+            # 候选的 PAA 均值一定落在其 SAX 符号的区间内，按区间到包络 PAA 的距离得到下界
+            symbols = self.sax[rows]
+            gap = (np.maximum(self._lo[symbols] - upper_paa, 0) ** 2 +
+                   np.maximum(lower_paa - self._hi[symbols], 0) ** 2)
+            bound = np.sqrt((gap * self._lengths).sum(axis=1))
+            order = np.argsort(bound, kind='stable')
+
+            best: List[Tuple[float, int]] = []
+            stats = {'candidates': len(rows), 'keogh': 0, 'exact': 0}
+
+            def threshold() -> float:
+                return -best[0][0] if len(best) >= top_n else np.inf
+
+            for start in range(0, len(order), CHUNK_SIZE):
+                chunk = order[start:start + CHUNK_SIZE]
+                chunk = chunk[bound[chunk] < threshold()]
+                if len(chunk) == 0:
+                    # 下界升序，之后的候选都不可能进入前 top_n
+                    break
+                windows = self.z[rows[chunk]].astype(np.float64)
+                keogh = np.sqrt((np.maximum(windows - upper, 0) ** 2 +
+                                 np.maximum(lower - windows, 0) ** 2).sum(axis=1))
+                stats['keogh'] += len(chunk)
+                # 按 LB_Keogh 从小到大计算精确距离，批大小逐批加倍，减少逐批计算的固定开销
+                ranked = np.argsort(keogh, kind='stable')
+                position, size = 0, EXACT_BATCH
+                while position < len(ranked):
+                    batch = ranked[position:position + size]
+                    batch = batch[keogh[batch] < threshold()]
+                    if len(batch) == 0:
+                        break
+                    stats['exact'] += len(batch)
+                    for distance, candidate in zip(dtw_distance(q, windows[batch], band), chunk[batch]):
+                        item = (-float(distance), -int(candidate))
+                        if len(best) < top_n:
+                            heapq.heappush(best, item)
+                        elif item > best[0]:
+                            heapq.heapreplace(best, item)
+                    position, size = position + size, size * 2
+
+            best.sort(reverse=True)
+            selected = rows[[-position for _, position in best]].astype(np.int64)
+            distances = np.array([-distance for distance, _ in best])
+            result = pd.DataFrame({
+                'ts_code': np.asarray(self.codes, dtype=object)[selected] if len(selected) else [],
+                'distance': distances.round(4),
+                'score': similarity_score(distances, self.window),
+                'window_end': self.last_dates[selected].astype(str),
+            })
+        return result, stats
+
+    def save(self):
+        """写入索引文件（先写临时文件再替换）"""
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp-{os.getpid()}"
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, codes=np.asarray(self.codes, dtype=str), closes=self.closes,
+                         last_dates=self.last_dates, factors=self.factors,
+                         trade_date=np.asarray(self.trade_date or ''), source=np.asarray(self.source),
+                         window=np.asarray(self.window))
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"保存相似形态索引失败: {str(e)}")
+
+    def load(self) -> bool:
+        """读取索引文件，文件不存在或与当前配置不符时返回 False
+
+        文件中只保存窗口的收盘价，z 标准化窗口和 SAX 符号在加载时重新计算。
+        """
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with np.load(self.path) as data:
+                if int(data['window']) != self.window or str(data['source']) != self.source:
+                    logger.info("相似形态索引文件的窗口或数据来源与配置不同，重新生成")
+                    return False
+                with self._lock:
+                    self._reset()
+                    self.codes = [str(code) for code in data['codes']]
+                    self._rows = {code: i for i, code in enumerate(self.codes)}
+                    self._grow(len(self.codes))
+                    self.closes[:] = data['closes']
+                    self.last_dates[:] = data['last_dates']
+                    self.factors[:] = data['factors']
+                    self.trade_date = str(data['trade_date']) or None
+                    self._encode(np.arange(len(self.codes)))
+            logger.info(f"加载相似形态索引：{len(self)} 只股票，截至 {self.trade_date}")
+            return True
+        except Exception as e:
+            logger.error(f"读取相似形态索引失败: {str(e)}")
+            return False
+
+_indexes: 'weakref.WeakKeyDictionary[DataProvider, SimilarityIndex]' = weakref.WeakKeyDictionary()
+_historical: 'weakref.WeakKeyDictionary[DataProvider, OrderedDict[str, SimilarityIndex]]' = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+def _new_index(provider: DataProvider, path: Optional[str] = None) -> SimilarityIndex:
+    from src.api.config import get_settings
+    settings = get_settings()
+    return SimilarityIndex(settings.SIMILARITY_WINDOW, settings.SIMILARITY_SEGMENTS,
+                           settings.SIMILARITY_ALPHABET, settings.SIMILARITY_BAND,
+                           path=path, source=provider.name)
+
+def index_for(provider: DataProvider, as_of: Optional[str] = None) -> SimilarityIndex:
+    """获取数据提供者的相似形态索引
+
+    当前索引首次使用时从 SIMILARITY_INDEX_PATH 加载，之后最多每 REFRESH_INTERVAL 秒检查一次新交易日。
+    as_of 早于当前索引的交易日时使用截至 as_of 的历史索引（不保存到文件），
+    每个数据提供者按 as_of 缓存最近使用的 HISTORICAL_INDEXES 个，同一 as_of 的查询不再重新生成。
+    """
+    with _indexes_lock:
+        index = _indexes.get(provider)
+        if index is None:
+            from src.api.config import get_settings
+            index = _indexes[provider] = _new_index(provider, get_settings().SIMILARITY_INDEX_PATH or None)
+            index.load()
+    if time.monotonic() - index._checked_at >= REFRESH_INTERVAL:
+        index.refresh(provider)
+    if as_of and index.trade_date and as_of < index.trade_date:
+        index = _historical_index(provider, as_of)
+    return index
+
+def _historical_index(provider: DataProvider, as_of: str) -> SimilarityIndex:
+    with _indexes_lock:
+        cache = _historical.get(provider)
+        if cache is None:
+            cache = _historical[provider] = OrderedDict()
+        index = cache.get(as_of)
+        if index is None:
+            index = cache[as_of] = _new_index(provider)
+            while len(cache) > HISTORICAL_INDEXES:
+                cache.popitem(last=False)
+        cache.move_to_end(as_of)
+    if index.trade_date is None:
+        # 并发的相同查询在 refresh 内等待第一个生成完成
+        index.refresh(provider, as_of)
+    return index
+
+def reference_closes(provider: DataProvider, ts_code: str, start_date: str, end_date: str) -> np.ndarray:
+    """参照K线区间内的后复权收盘价"""
+    bars = adjusted_daily(provider, ts_code, start_date, end_date, 'hfq', fields='ts_code,trade_date,close')
+    return bars['close'].to_numpy(dtype=np.float64) if not bars.empty else np.zeros(0)
+
+def find_similar(provider: DataProvider, ts_code: str, start_date: Optional[str] = None,
+                 end_date: Optional[str] = None, top_n: int = 20, band: Optional[int] = None,
+                 codes: Optional[Iterable[str]] = None, as_of: Optional[str] = None,
+                 include_self: bool = False) -> Tuple[pd.DataFrame, dict]:
+    """查找最近 window 根K线与参照K线形态最相似的股票
+
+    参照K线为 ts_code 在 [start_date, end_date] 内的日线；两个日期都为空时取该股票在索引中的当前窗口。
+    参照股票自身的窗口与参照K线重叠时相似度很高，默认不参与比较；include_self 为 True 时保留。
+
+    Returns:
+        (search 的结果表, 参照K线、索引日期和各阶段候选数等信息)
+    """
+    index = index_for(provider, as_of)
+    if start_date or end_date:
+        end_date = end_date or pd.Timestamp.now().strftime('%Y%m%d')
+        start_date = start_date or provider.recent_trade_dates(index.window, end_date)[0]
+        closes = reference_closes(provider, ts_code, start_date, end_date)
+    else:
+        closes = index.window_of(ts_code)
+        if closes is None:
+            raise ValueError(f"{ts_code} 不在相似形态索引中或K线不足 {index.window} 根")
+    if len(closes) < MIN_REFERENCE_BARS:
+        raise ValueError(f"参照K线不足 {MIN_REFERENCE_BARS} 根")
+
+    result, stats = index.search(closes, top_n, band, codes, () if include_self else (ts_code,))
+    info = {
+        'reference': {'ts_code': ts_code, 'start_date': start_date, 'end_date': end_date, 'bars': len(closes)},
+        'window': index.window,
+        'band': index.band if band is None else band,
+        'trade_date': index.trade_date,
+        'indexed': len(index),
+        'stats': stats,
+    }
+    return result, info
+
+def main():
+    """命令行：生成或增量更新相似形态索引（通常在每日同步行情之后执行）"""
+    from src.api.config import get_settings
+    from .provider_factory import get_provider
+
+    parser = argparse.ArgumentParser(description="生成或更新相似形态索引")
+    parser.add_argument('--end', default=None, help="截止日期，默认为当天")
+    parser.add_argument('--rebuild', action='store_true', help="重新读取整个窗口")
+    args = parser.parse_args()
+
+    provider = get_provider()
+    index = _new_index(provider, get_settings().SIMILARITY_INDEX_PATH or None)
+    if not args.rebuild:
+        index.load()
+    added = index.refresh(provider, args.end, rebuild=args.rebuild)
+    print(f"相似形态索引：新增 {added} 个交易日，共 {len(index)} 只股票，截至 {index.trade_date}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,240 @@
+from typing import Optional
+import pandas as pd
+import numpy as np
+import logging
+from .base_provider import DataProvider
+
+logger = logging.getLogger(__name__)
+
+class SyntheticProvider(DataProvider):
+    """内存合成数据提供者
+
+    按固定随机种子生成可复现的股票列表、交易日历和行情，用于离线开发和测试，
+    不访问任何外部服务。
+    """
+
+    name = 'synthetic'
+
+    MARKETS = [
+        ('主板', 600000, 'SH'),
+        ('主板', 1, 'SZ'),
+        ('创业板', 300001, 'SZ'),
+        ('科创板', 688001, 'SH'),
+    ]
+    INDUSTRIES = ['银行', '半导体', '医药', '白酒', '汽车', '软件服务', '电气设备', '化工']
+    INDICES = {
+        '000300.SH': 300,
+        '000016.SH': 50,
+        '000905.SH': 500,
+        '000852.SH': 1000,
+        '000922.CSI': 100,
+    }
+
+    def __init__(self, stock_count: int = 200, seed: int = 42,
+                 start_date: str = '20150101', end_date: Optional[str] = None):
+        self.stock_count = stock_count
+        self.seed = seed
+        self.start_date = start_date
+        self.end_date = end_date or pd.Timestamp.now().strftime('%Y%m%d')
+        self._stocks = None
+        self._calendar = None
+        self._bars = None
+        self._basic = None
+        self._flows = None
+        self._factors = None
+        self._by_code = {}
+        self._by_date = {}
+
+    def _build_stocks(self) -> pd.DataFrame:
+        if self._stocks is None:
+            rows = []
+            for i in range(self.stock_count):
+                market, base, exchange = self.MARKETS[i % len(self.MARKETS)]
+                code = f"{base + i // len(self.MARKETS):06d}.{exchange}"
+                name = f"合成{i:04d}"
+                if i % 37 == 36:
+                    name = f"ST{name}"
+                rows.append({
+                    'ts_code': code,
+                    'symbol': code[:6],
+                    'name': name,
+                    'area': '合成',
+                    'industry': self.INDUSTRIES[i % len(self.INDUSTRIES)],
+                    'market': market,
+                    'list_date': self.start_date,
+                })
+            self._stocks = pd.DataFrame(rows)
+        return self._stocks
+
+    def _build_calendar(self) -> pd.DataFrame:
+        if self._calendar is None:
+            days = pd.date_range(self.start_date, self.end_date, freq='D')
+            is_open = (days.dayofweek < 5).astype(int)
+            self._calendar = pd.DataFrame({
+                'exchange': 'SSE',
+                'cal_date': days.strftime('%Y%m%d'),
+                'is_open': is_open,
+            })
+            open_dates = self._calendar['cal_date'].where(self._calendar['is_open'] == 1)
+            self._calendar['pretrade_date'] = open_dates.ffill().shift(1)
+        return self._calendar
+
+    def _build_bars(self) -> pd.DataFrame:
+        """生成全部股票的日线，价格服从带涨跌停截断的几何随机游走
+
+        随机游走是后复权价格。每只股票平均每年除权除息一次（多为现金分红，少数为送转股），
+        日线中的价格为后复权价格除以复权因子，与真实行情一样在除权日出现缺口。
+        """
+        if self._bars is None:
+            stocks = self._build_stocks()
+            cal = self._build_calendar()
+            dates = cal.loc[cal['is_open'] == 1, 'cal_date'].to_numpy()
+            rng = np.random.default_rng(self.seed)
+            n_days, n_stocks = len(dates), len(stocks)
+
+            limits = np.where(stocks['market'].isin(['创业板', '科创板']), 0.2, 0.1)
+            limits = np.where(stocks['name'].str.startswith('ST'), 0.05, limits)
+            returns = rng.normal(0.0003, 0.022, size=(n_days, n_stocks))
+            returns = np.clip(returns, -limits, limits)
+            close = rng.uniform(5, 80, size=n_stocks) * np.exp(np.cumsum(np.log1p(returns), axis=0))
+            pre_close = np.vstack([close[:1] / (1 + returns[:1]), close[:-1]])
+            gap = np.clip(rng.normal(0, 0.006, size=(n_days, n_stocks)), -limits, limits)
+            open_ = pre_close * (1 + gap)
+            spread = np.abs(rng.normal(0, 0.012, size=(n_days, n_stocks)))
+            high = np.minimum(np.maximum(open_, close) * (1 + spread), pre_close * (1 + limits))
+            low = np.maximum(np.minimum(open_, close) * (1 - spread), pre_close * (1 - limits))
+            high = np.maximum(high, np.maximum(open_, close))
+            low = np.minimum(low, np.minimum(open_, close))
+            vol = rng.lognormal(11, 0.5, size=(n_days, n_stocks)) * (1 + 10 * np.abs(returns))
+
+            # 复权因子从 1 开始，在除权日乘以分红或送转的比例
+            adj_rng = np.random.default_rng(self.seed + 3)
+            events = adj_rng.random((n_days, n_stocks)) < 1 / 245
+            bonus = adj_rng.random((n_days, n_stocks)) < 0.1
+            ratio = np.where(bonus, adj_rng.choice([1.2, 1.3, 1.5], size=(n_days, n_stocks)),
+                             1 + adj_rng.uniform(0.005, 0.03, size=(n_days, n_stocks)))
+            factor = np.cumprod(np.where(events, ratio, 1.0), axis=0).round(4)
+            open_, high, low, close, pre_close = (values / factor for values in (open_, high, low, close, pre_close))
+            self._factors = pd.DataFrame({
+                'ts_code': np.tile(stocks['ts_code'].to_numpy(), n_days),
+                'trade_date': np.repeat(dates, n_stocks),
+                'adj_factor': factor.ravel(),
+            })
+
+            self._bars = pd.DataFrame({
+                'ts_code': np.tile(stocks['ts_code'].to_numpy(), n_days),
+                'trade_date': np.repeat(dates, n_stocks),
+                'open': open_.ravel().round(2),
+                'high': high.ravel().round(2),
+                'low': low.ravel().round(2),
+                'close': close.ravel().round(2),
+                'pre_close': pre_close.ravel().round(2),
+                'change': (close - pre_close).ravel().round(2),
+                'pct_chg': (returns * 100).ravel().round(4),
+                'vol': vol.ravel().round(0),
+                'amount': (vol * close / 10).ravel().round(3),
+            })
+        return self._bars
+
+    def _build_factors(self) -> pd.DataFrame:
+        self._build_bars()
+        return self._factors
+
+    def _build_basic(self) -> pd.DataFrame:
+        if self._basic is None:
+            bars = self._build_bars()
+            rng = np.random.default_rng(self.seed + 1)
+            vol = bars['vol'].to_numpy()
+            avg_vol = bars.groupby('ts_code')['vol'].transform(lambda s: s.rolling(5, min_periods=1).mean())
+            stocks = self._build_stocks()
+            share_capital = pd.Series(rng.uniform(1e4, 5e5, size=len(stocks)), index=stocks['ts_code'])
+            shares = bars['ts_code'].map(share_capital)
+            self._basic = pd.DataFrame({
+                'ts_code': bars['ts_code'],
+                'trade_date': bars['trade_date'],
+                'close': bars['close'],
+                'turnover_rate': (vol / shares.to_numpy()).round(4),
+                'volume_ratio': (vol / avg_vol.to_numpy()).round(2),
+                'pe': rng.uniform(5, 80, size=len(bars)).round(2),
+                'pb': rng.uniform(0.5, 10, size=len(bars)).round(2),
+                'total_mv': (bars['close'].to_numpy() * shares.to_numpy()).round(2),
+            })
+        return self._basic
+
+    def _build_flows(self) -> pd.DataFrame:
+        if self._flows is None:
+            bars = self._build_bars()
+            rng = np.random.default_rng(self.seed + 2)
+            amount = bars['amount'].to_numpy()
+            bias = np.sign(bars['pct_chg'].to_numpy()) * 0.05
+            flows = {'ts_code': bars['ts_code'], 'trade_date': bars['trade_date']}
+            net_amount = np.zeros(len(bars))
+            for size, share in [('sm', 0.4), ('md', 0.3), ('lg', 0.2), ('elg', 0.1)]:
+                buy_share = np.clip(0.5 + bias + rng.normal(0, 0.05, size=len(bars)), 0, 1)
+                flows[f'buy_{size}_amount'] = (amount * share * buy_share).round(2)
+                flows[f'sell_{size}_amount'] = (amount * share * (1 - buy_share)).round(2)
+                flows[f'buy_{size}_vol'] = (bars['vol'].to_numpy() * share * buy_share).round(0)
+                flows[f'sell_{size}_vol'] = (bars['vol'].to_numpy() * share * (1 - buy_share)).round(0)
+                net_amount += flows[f'buy_{size}_amount'] - flows[f'sell_{size}_amount']
+            flows['net_mf_amount'] = net_amount.round(2)
+            flows['net_mf_vol'] = (net_amount / bars['close'].to_numpy()).round(0)
+            self._flows = pd.DataFrame(flows)
+        return self._flows
+
+    def _select(self, table: str, df: pd.DataFrame, ts_code=None, trade_date=None,
+                start_date=None, end_date=None, fields=None) -> pd.DataFrame:
+        """按代码或交易日查询时先取对应的分组，避免每次扫描全表"""
+        if ts_code:
+            if table not in self._by_code:
+                self._by_code[table] = dict(tuple(df.groupby('ts_code', sort=False)))
+            groups = [self._by_code[table][code] for code in ts_code.split(',') if code in self._by_code[table]]
+            df = pd.concat(groups) if groups else df.iloc[:0]
+        elif trade_date:
+            if table not in self._by_date:
+                self._by_date[table] = dict(tuple(df.groupby('trade_date', sort=False)))
+            df = self._by_date[table].get(trade_date, df.iloc[:0])
+        return self._slice_frame(df, ts_code, trade_date, start_date, end_date, fields)
+
+    def daily(self, ts_code=None, trade_date=None, start_date=None, end_date=None, fields=None):
+        return self._select('daily', self._build_bars(), ts_code, trade_date, start_date, end_date, fields)
+
+    def daily_basic(self, ts_code=None, trade_date=None, start_date=None, end_date=None, fields=None):
+        return self._select('daily_basic', self._build_basic(), ts_code, trade_date, start_date, end_date, fields)
+
+    def moneyflow(self, ts_code=None, trade_date=None, start_date=None, end_date=None, fields=None):
+        return self._select('moneyflow', self._build_flows(), ts_code, trade_date, start_date, end_date, fields)
+
+    def adj_factor(self, ts_code=None, trade_date=None, start_date=None, end_date=None, fields=None):
+        return self._select('adj_factor', self._build_factors(), ts_code, trade_date, start_date, end_date, fields)
+
+    def stock_basic(self, ts_code=None, exchange='', list_status='L', fields=None):
+        df = self._build_stocks()
+        if ts_code:
+            df = df[df['ts_code'].isin(ts_code.split(','))]
+        if exchange:
+            df = df[df['ts_code'].str.endswith(exchange[:2])]
+        if fields:
+            df = df[[col for col in fields.split(',') if col in df.columns]]
+        return df.reset_index(drop=True)
+
+    def index_weight(self, index_code, start_date=None, end_date=None):
+        size = self.INDICES.get(index_code)
+        if size is None:
+            return pd.DataFrame(columns=['index_code', 'con_code', 'trade_date', 'weight'])
+        members = self._build_stocks()['ts_code'].iloc[:size]
+        return pd.DataFrame({
+            'index_code': index_code,
+            'con_code': members.to_numpy(),
+            'trade_date': end_date or self.end_date,
+            'weight': round(100 / len(members), 4),
+        })
+
+    def trade_cal(self, exchange='SSE', start_date=None, end_date=None, is_open=None):
+        cal = self._build_calendar()
+        if start_date:
+            cal = cal[cal['cal_date'] >= start_date]
+        if end_date:
+            cal = cal[cal['cal_date'] <= end_date]
+        if is_open is not None:
+            cal = cal[cal['is_open'] == int(is_open)]
+        return cal.sort_values('cal_date', ascending=False).reset_index(drop=True)
@@ -0,0 +1,210 @@
+"""上游接口调用的自适应限速、重试与熔断
+
+Tushare 按接口限制每分钟的调用次数（不同积分等级上限不同），超限时返回
+“抱歉，您每分钟最多访问该接口N次”之类的错误。这里对每个接口：
+
+- 按当前速率均匀安排调用，多个线程共享同一接口的配额；
+- 遇到超限错误时从错误信息中解析真实上限并降到其 95%，解析不出时按比例降速，
+  之后每分钟没有超限就逐步恢复（加性增、乘性减）；
+- 超限和网络错误按指数退避加随机抖动重试；
+- 连续多次网络错误时熔断一段时间，期间的调用立即失败，冷却后放行试探调用。
+"""
+from typing import Callable, Dict, Optional
+import logging
+import random
+import re
+import threading
+import time
+from src.utils import cancellation
+from src.utils.metrics import RATE_LIMIT_WAIT_SECONDS, UPSTREAM_RATE, UPSTREAM_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# 错误分类
+QUOTA = 'quota'          # 每分钟调用次数超限，稍后重试即可
+TRANSIENT = 'transient'  # 网络错误、超时、服务端错误
+FATAL = 'fatal'          # 参数错误、权限不足、每日额度用完等，重试无意义
+
+_MINUTE_LIMIT = re.compile(r'每分钟最多访问该接口\s*(\d+)\s*次')
+_QUOTA_MARKERS = ('每分钟最多访问', '访问频率', 'too many requests', 'rate limit')
+_TRANSIENT_MARKERS = ('timed out', 'timeout', 'connection', 'max retries', 'temporarily',
+                      'bad gateway', 'service unavailable', 'gateway timeout', '502', '503', '504')
+
+class CircuitOpenError(Exception):
+    """接口处于熔断状态，调用未发出"""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"接口 {endpoint} 暂时不可用，{retry_after:.0f}秒后重试")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+def classify(error: Exception) -> str:
+    """判断上游错误的类型"""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return TRANSIENT
+    message = str(error).lower()
+    if any(marker in message for marker in _QUOTA_MARKERS):
+        return QUOTA
+    if any(marker in message for marker in _TRANSIENT_MARKERS):
+        return TRANSIENT
+    return FATAL
+
+def parse_minute_limit(error: Exception) -> Optional[int]:
+    """从超限错误信息中解析每分钟上限"""
+    match = _MINUTE_LIMIT.search(str(error))
+    return int(match.group(1)) if match else None
+
+def parse_rates(spec: str) -> Dict[str, float]:
+    """解析 'moneyflow:290,daily:480' 形式的每接口每分钟调用上限"""
+    rates = {}
+    for item in (spec or '').split(','):
+        if ':' in item:
+            endpoint, rate = item.split(':', 1)
+            rates[endpoint.strip()] = float(rate)
+    return rates
+
+class _EndpointState:
+    """单个接口的速率与熔断状态"""
+
+    def __init__(self, rate: float):
+        self.rate = rate            # 当前每分钟调用次数
+        self.ceiling = rate         # 速率上限：配置值，或从错误信息中学到的真实上限
+        self.next_slot = 0.0        # 下一次调用可以发出的时间（monotonic）
+        self.window_start = time.monotonic()
+        self.window_quota_errors = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+class AdaptiveThrottle:
+    """按接口自适应限速的调用包装
+
+    Args:
+        default_rate: 未单独配置的接口初始每分钟调用次数
+        rates: 各接口的初始每分钟调用次数
+        max_attempts: 单次调用最多尝试的次数（含第一次）
+        base_delay: 网络错误重试的初始退避秒数
+        max_delay: 单次退避的最大秒数
+        failure_threshold: 连续网络错误达到该次数时熔断
+        cooldown: 熔断持续的秒数
+    """
+
+    # 速率下限，避免连续降速后几乎停止调用
+    MIN_RATE = 10.0
+    # 上游按分钟计数：超限后依次推迟约 1/4、1/2、1 个窗口，累计等待总能超过一个窗口
+    QUOTA_WINDOW = 60.0
+
+    def __init__(self, default_rate: float = 480, rates: Optional[Dict[str, float]] = None,
+                 max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 60.0,
+                 failure_threshold: int = 5, cooldown: float = 30.0):
+        self.default_rate = default_rate
+        self.rates = dict(rates or {})
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._states: Dict[str, _EndpointState] = {}
+
+    def _state(self, endpoint: str) -> _EndpointState:
+        state = self._states.get(endpoint)
+        if state is None:
+            state = self._states[endpoint] = _EndpointState(self.rates.get(endpoint, self.default_rate))
+            UPSTREAM_RATE.labels(endpoint).set(state.rate)
+        return state
+
+    def rate(self, endpoint: str) -> float:
+        """接口当前的每分钟调用次数"""
+        with self._lock:
+            return self._state(endpoint).rate
+
+    def retry_after(self) -> float:
+        """熔断中的接口最晚恢复的剩余秒数，没有熔断时为 0"""
+        now = time.monotonic()
+        with self._lock:
+            return max([state.open_until - now for state in self._states.values()] + [0.0])
+
+    def _acquire(self, endpoint: str):
+        """等待该接口的下一个调用时机，熔断时抛出 CircuitOpenError"""
+        with self._lock:
+            state = self._state(endpoint)
+            now = time.monotonic()
+            if state.open_until > now:
+                raise CircuitOpenError(endpoint, state.open_until - now)
+            self._adjust(endpoint, state, now)
+            slot = max(now, state.next_slot)
+            state.next_slot = slot + 60.0 / state.rate
+        wait = slot - now
+        if wait > 0:
+            RATE_LIMIT_WAIT_SECONDS.labels(endpoint).inc(wait)
+            cancellation.sleep(wait)
+
+    def _adjust(self, endpoint: str, state: _EndpointState, now: float):
+        """每分钟结算一次：整分钟没有超限时速率提高 10%，不超过上限"""
+        if now - state.window_start < 60:
+            return
+        if state.window_quota_errors == 0 and state.rate < state.ceiling:
+            state.rate = min(state.ceiling, state.rate * 1.1)
+            UPSTREAM_RATE.labels(endpoint).set(state.rate)
+        state.window_start = now
+        state.window_quota_errors = 0
+
+    def _on_success(self, state: _EndpointState):
+        with self._lock:
+            state.consecutive_failures = 0
+
+    def _on_quota(self, endpoint: str, state: _EndpointState, error: Exception, delay: float):
+        """超限：按真实上限或按比例降速，并让该接口的所有调用一起推迟"""
+        limit = parse_minute_limit(error)
+        with self._lock:
+            state.window_quota_errors += 1
+            if limit:
+                state.ceiling = max(self.MIN_RATE, limit * 0.95)
+                state.rate = min(state.rate, state.ceiling)
+            else:
+                state.rate = max(self.MIN_RATE, state.rate * 0.7)
+            state.next_slot = max(state.next_slot, time.monotonic() + delay)
+            UPSTREAM_RATE.labels(endpoint).set(state.rate)
+        logger.warning(f"接口 {endpoint} 调用超限，速率调整为每分钟 {state.rate:.0f} 次"
+                       f"{f'（上限 {limit} 次）' if limit else ''}")
+
+    def _on_transient(self, endpoint: str, state: _EndpointState):
+        """网络错误：连续失败达到阈值时熔断（冷却时间带抖动，避免多个进程同时恢复）"""
+        with self._lock:
+            state.consecutive_failures += 1
+            if state.consecutive_failures >= self.failure_threshold:
+                cooldown = self.cooldown * random.uniform(1.0, 1.5)
+                state.open_until = time.monotonic() + cooldown
+                logger.error(f"接口 {endpoint} 连续失败 {state.consecutive_failures} 次，熔断 {cooldown:.0f}秒")
+
+    def _backoff(self, attempt: int, base: float) -> float:
+        """指数退避加随机抖动"""
+        return random.uniform(0.5, 1.0) * min(self.max_delay, base * 2 ** attempt)
+
+    def call(self, endpoint: str, func: Callable):
+        """按限速调用 func，超限和网络错误时重试，重试用尽或熔断时抛出最后的错误"""
+        for attempt in range(self.max_attempts):
+            self._acquire(endpoint)
+            state = self._states[endpoint]
+            try:
+                result = func()
+            except Exception as e:
+                kind = classify(e)
+                if kind == FATAL or attempt == self.max_attempts - 1:
+                    if kind == TRANSIENT:
+                        self._on_transient(endpoint, state)
+                    raise
+                UPSTREAM_RETRIES.labels(endpoint, kind).inc()
+                if kind == QUOTA:
+                    delay = self._backoff(attempt, self.QUOTA_WINDOW / 4)
+                    self._on_quota(endpoint, state, e, delay)
+                else:
+                    delay = self._backoff(attempt, self.base_delay)
+                    self._on_transient(endpoint, state)
+                    logger.warning(f"接口 {endpoint} 调用失败（{str(e)}），{delay:.1f}秒后第 {attempt + 2} 次尝试")
+                # 超限时推迟的是整个接口，由 _acquire 等待；网络错误只推迟本次调用
+                if kind == TRANSIENT:
+                    cancellation.sleep(delay)
+                continue
+            self._on_success(state)
+            return result
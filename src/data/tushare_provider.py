@@ -0,0 +1,81 @@
+from typing import Optional
+import pandas as pd
+import tushare as ts
+import logging
+import time
+from .base_provider import DataProvider
+from .throttle import FATAL, AdaptiveThrottle, CircuitOpenError, classify
+from src.utils import cancellation
+from src.utils.metrics import UPSTREAM_CALLS, UPSTREAM_LATENCY
+
+logger = logging.getLogger(__name__)
+
+class TushareProvider(DataProvider):
+    """Tushare Pro 数据提供者"""
+
+    name = 'tushare'
+
+    def __init__(self, token: str, throttle: Optional[AdaptiveThrottle] = None):
+        self.pro = ts.pro_api(token)
+        self.throttle = throttle if throttle is not None else AdaptiveThrottle()
+
+    def _call(self, endpoint: str, **params) -> pd.DataFrame:
+        """调用 Tushare 接口，忽略值为 None 的参数；所在请求已取消时不再调用
+
+        调用经过自适应限速，超限和网络错误会自动重试。重试用尽或熔断时抛出错误并计入
+        upstream_failures（参数错误等重试无意义的错误不计入）。
+        """
+        params = {key: value for key, value in params.items() if value is not None}
+        cancellation.check()
+        try:
+            return self.throttle.call(endpoint, lambda: self._request(endpoint, params))
+        except Exception as e:
+            if isinstance(e, CircuitOpenError) or classify(e) != FATAL:
+                self._record_upstream(failures=1)
+            raise
+
+    def _request(self, endpoint: str, params: dict) -> pd.DataFrame:
+        """发出一次上游请求"""
+        logger.debug(f"调用Tushare接口 {endpoint}: {params}")
+        start = time.perf_counter()
+        self._record_upstream(calls=1)
+        try:
+            result = getattr(self.pro, endpoint)(**params)
+        except Exception:
+            UPSTREAM_CALLS.labels(self.name, endpoint, 'error').inc()
+            raise
+        finally:
+            UPSTREAM_LATENCY.labels(self.name, endpoint).observe(time.perf_counter() - start)
+        UPSTREAM_CALLS.labels(self.name, endpoint, 'ok').inc()
+        return result
+
+    def retry_after(self) -> float:
+        return self.throttle.retry_after()
+
+    def daily(self, ts_code=None, trade_date=None, start_date=None, end_date=None, fields=None):
+        return self._call('daily', ts_code=ts_code, trade_date=trade_date,
+                          start_date=start_date, end_date=end_date, fields=fields)
+
+    def daily_basic(self, ts_code=None, trade_date=None, start_date=None, end_date=None, fields=None):
+        return self._call('daily_basic', ts_code=ts_code, trade_date=trade_date,
+                          start_date=start_date, end_date=end_date, fields=fields)
+
+    def moneyflow(self, ts_code=None, trade_date=None, start_date=None, end_date=None, fields=None):
+        return self._call('moneyflow', ts_code=ts_code, trade_date=trade_date,
+                          start_date=start_date, end_date=end_date, fields=fields)
+
+    def adj_factor(self, ts_code=None, trade_date=None, start_date=None, end_date=None, fields=None):
+        return self._call('adj_factor', ts_code=ts_code, trade_date=trade_date,
+                          start_date=start_date, end_date=end_date, fields=fields)
+
+    def stock_basic(self, ts_code=None, exchange='', list_status='L', fields=None):
+        return self._call('stock_basic', ts_code=ts_code, exchange=exchange,
+                          list_status=list_status, fields=fields)
+
+    def index_weight(self, index_code, start_date=None, end_date=None):
+        return self._call('index_weight', index_code=index_code,
+                          start_date=start_date, end_date=end_date)
+
+    def trade_cal(self, exchange='SSE', start_date=None, end_date=None, is_open=None):
+        return self._call('trade_cal', exchange=exchange, start_date=start_date,
+                          end_date=end_date, is_open=is_open)
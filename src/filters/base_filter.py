@@ -1,10 +1,121 @@
 from abc import ABC, abstractmethod
+from typing import Any, Optional
+import numpy as np
 import pandas as pd
+import logging
+import time
+from src.utils import cancellation
+from src.utils.metrics import FILTER_STAGE_SECONDS, STOCKS_PROCESSED, observe_seconds
+
+logger = logging.getLogger(__name__)
+
+def ratio(numerator: float, denominator: float, cap: float = 100.0) -> float:
+    """numerator / denominator，分母为 0 时取 cap，结果不超过 cap（避免评分和结果中出现无穷大）"""
+    if denominator == 0:
+        return cap
+    return float(min(numerator / denominator, cap))
+
+def excess(value: float, threshold: float, full: float) -> float:
+    """指标超过判断阈值的程度，映射到 [0, 1]：等于 threshold 时为 0，达到 full 时为 1
+
+    full 小于 threshold 时表示指标越小越强（如影线越短越好）。指标缺失时为 0。
+    """
+    if value is None or np.isnan(value):
+        return 0.0
+    return float(np.clip((value - threshold) / (full - threshold), 0.0, 1.0))
+
+def strength(*components: float) -> float:
+    """形态强度评分（0-100）：各分项超过判断阈值程度的平均
+
+    刚好满足条件的形态接近 0，各项指标都远超阈值的形态接近 100。
+    """
+    if not components:
+        return 0.0
+    return round(float(np.mean(components)) * 100, 1)
 
 class BaseFilter(ABC):
     """基础筛选器类"""
-    
+
+    @abstractmethod
+    def filter(self, stocks_df: pd.DataFrame) -> pd.DataFrame:
+        """执行筛选"""
+        pass
+
+class PerStockFilter(BaseFilter):
+    """逐只股票扫描的筛选器基类
+
+    子类实现 fetch_data 获取单只股票的数据、detect 判断是否满足条件，
+    遍历、计时、进度日志和结果汇总统一在这里完成。
+    """
+
+    # 筛选器名称，用于日志
+    display_name = ''
+
+    # 是否整体处理候选列表：为 True 时执行计划在逐只股票筛选之前对整个候选列表调用 filter
+    cross_sectional = False
+
+    # 执行计划的先验估计：单只股票耗时（秒）、上游调用次数和通过率，实际运行后会被统计值替代
+    estimated_seconds = 0.15
+    estimated_calls = 1.0
+    estimated_pass_rate = 0.1
+
     @abstractmethod
+    def fetch_data(self, stock: pd.Series) -> Any:
+        """获取单只股票的数据，数据不足时返回 None"""
+        pass
+
+    @abstractmethod
+    def detect(self, stock: pd.Series, data: Any) -> Optional[dict]:
+        """判断单只股票是否满足条件
+
+        Returns:
+            满足条件时返回需要附加到结果中的字段，其中 score 为形态强度评分（0-100，见 strength），
+            否则返回 None
+        """
+        pass
+
+    def evaluate(self, stock: pd.Series) -> Optional[dict]:
+        """对单只股票执行获取数据和检测，满足条件时返回结果行"""
+        name = type(self).__name__
+        with observe_seconds(FILTER_STAGE_SECONDS, name, 'fetch'):
+            data = self.fetch_data(stock)
+        if data is None:
+            STOCKS_PROCESSED.labels(name, 'skipped').inc()
+            return None
+
+        with observe_seconds(FILTER_STAGE_SECONDS, name, 'compute'):
+            extra = self.detect(stock, data)
+        if extra is None:
+            STOCKS_PROCESSED.labels(name, 'rejected').inc()
+            return None
+
+        STOCKS_PROCESSED.labels(name, 'matched').inc()
+        return {**stock.to_dict(), **extra}
+
     def filter(self, stocks_df: pd.DataFrame) -> pd.DataFrame:
         """执行筛选"""
-        pass 
\ No newline at end of file
+        logger.info("开始执行%s筛选，传入的股票数量：%d", self.display_name, len(stocks_df))
+        result_stocks = []
+        total_stocks = len(stocks_df)
+        start_time = time.time()
+
+        for processed_stocks, (_, stock) in enumerate(stocks_df.iterrows(), start=1):
+            cancellation.check()
+            try:
+                result = self.evaluate(stock)
+                if result is not None:
+                    result_stocks.append(result)
+            except Exception as e:
+                STOCKS_PROCESSED.labels(type(self).__name__, 'error').inc()
+                logger.error("处理股票 %s 时出错: %s", stock['ts_code'], str(e))
+                continue
+
+            if processed_stocks % 50 == 0:
+                elapsed_time = time.time() - start_time
+                remaining_time = (total_stocks - processed_stocks) * elapsed_time / processed_stocks
+                logger.info(f"{self.display_name}进度: {processed_stocks}/{total_stocks} "
+                            f"({processed_stocks/total_stocks*100:.1f}%) 预计还需: {remaining_time/60:.1f}分钟")
+
+        total_time = time.time() - start_time
+        logger.info("%s筛选完成，耗时%.1f秒，找到的股票数量：%d", self.display_name, total_time, len(result_stocks))
+        return pd.DataFrame(result_stocks)
@@ -0,0 +1,189 @@
+from typing import Any, List, Optional
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from src.api.config import get_settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+def _json_default(value: Any):
+    """结果行中 numpy 标量和时间等类型的 JSON 表示"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return str(value)
+
+class ScreenCheckpoint:
+    """逐只股票筛选的进度检查点
+
+    记录已处理的股票代码和已找到的结果，保存在 目录/评估日期/任务键.json。
+    筛选过程中每隔 interval 秒保存一次，被停止、取消或出错时再保存一次，正常完成后删除；
+    相同条件在同一评估日重新执行时从检查点继续，已处理的股票不再调用上游接口。
+    指定 top_k 时只保留强度评分（score）最高的 top_k 个结果。
+    使用期间用 acquire 锁定，相同条件的两次筛选同时执行时只有一次读写检查点（见 acquire）。
+    """
+
+    def __init__(self, directory: str, job: str, trade_date: str, interval: float = 30.0,
+                 top_k: Optional[int] = None):
+        self.job = job
+        self.trade_date = trade_date
+        self.interval = interval
+        self.top_k = top_k
+        self.path = os.path.join(directory, trade_date, f"{job}.json")
+        self.processed: set = set()
+        self.matches: List[dict] = []
+        self._saved_at = time.monotonic()
+        self._dirty = False
+        self._lock_fd: Optional[int] = None
+
+    @classmethod
+    def for_screen(cls, job_key: Any, trade_date: Optional[str] = None,
+                   top_k: Optional[int] = None) -> Optional['ScreenCheckpoint']:
+        """按配置为一组筛选条件创建检查点，未配置 CHECKPOINT_DIR 时返回 None
+
+        Args:
+            job_key: 能唯一确定一次筛选的条件（可 JSON 序列化），如筛选参数和候选股票
+            trade_date: 评估日期（YYYYMMDD），默认为当天
+            top_k: 只保留评分最高的 top_k 个结果
+        """
+        settings = get_settings()
+        if not settings.CHECKPOINT_DIR:
+            return None
+        prune(settings.CHECKPOINT_DIR, settings.CHECKPOINT_MAX_AGE_DAYS)
+        job = hashlib.sha1(json.dumps(job_key, sort_keys=True, ensure_ascii=False, default=str)
+                           .encode('utf-8')).hexdigest()[:16]
+        return cls(settings.CHECKPOINT_DIR, job, trade_date or pd.Timestamp.now().strftime('%Y%m%d'),
+                   interval=settings.CHECKPOINT_INTERVAL, top_k=top_k)
+
+    def acquire(self) -> bool:
+        """锁定检查点，已被另一次筛选（本进程或其他进程）锁定时返回 False
+
+        锁为检查点旁边 .lock 文件上的操作系统文件锁，进程退出时自动释放，不会留下失效的锁。
+        """
+        if self._lock_fd is not None:
+            return True
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT)
+        except OSError as e:
+            logger.error(f"创建筛选检查点锁失败: {str(e)}")
+            return False
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    def release(self):
+        """释放 acquire 获得的锁"""
+        if self._lock_fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._lock_fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._lock_fd, msvcrt.LK_UNLCK, 1)
+        except OSError:
+            pass
+        os.close(self._lock_fd)
+        self._lock_fd = None
+
+    def load(self) -> bool:
+        """读取已保存的进度，没有检查点或读取失败时返回 False"""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.processed = set(data['processed'])
+            self.matches = list(data['matches'])
+        except Exception as e:
+            logger.error(f"读取筛选检查点 {self.path} 失败: {str(e)}")
+            self.processed, self.matches = set(), []
+            return False
+        logger.info(f"从检查点恢复筛选：已处理 {len(self.processed)} 只股票，已找到 {len(self.matches)} 只")
+        return True
+
+    def record(self, ts_code: str, match: Optional[dict]):
+        """记录一只股票的处理结果，距离上次保存超过 interval 秒时保存"""
+        self.processed.add(ts_code)
+        if match is not None:
+            self.matches.append(match)
+            if self.top_k and len(self.matches) > self.top_k:
+                # 去掉评分最低的结果（评分相同时去掉后找到的），没有评分的结果排在有评分的之后（见 top_matches）
+                self.matches.pop(min(range(len(self.matches)), key=lambda i: (
+                    self.matches[i].get('score') is not None, self.matches[i].get('score') or 0.0, -i)))
+        self._dirty = True
+        if time.monotonic() - self._saved_at >= self.interval:
+            self.save()
+
+    def save(self):
+        """写入检查点（先写临时文件再替换，中途退出不会留下不完整的文件）"""
+        if not self._dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'job': self.job, 'trade_date': self.trade_date,
+                           'saved_at': pd.Timestamp.now().isoformat(timespec='seconds'),
+                           'processed': sorted(self.processed), 'matches': self.matches},
+                          f, ensure_ascii=False, default=_json_default)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            logger.debug(f"保存筛选检查点：已处理 {len(self.processed)} 只股票")
+        except Exception as e:
+            logger.error(f"保存筛选检查点失败: {str(e)}")
+        self._saved_at = time.monotonic()
+
+    def clear(self):
+        """筛选完成后删除检查点（锁文件在持有锁时一并删除）"""
+        paths = [self.path] + ([f"{self.path}.lock"] if self._lock_fd is not None else [])
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"删除筛选检查点失败: {str(e)}")
+        self._dirty = False
+
+def prune(directory: str, max_age_days: float):
+    """删除超过 max_age_days 天未更新的检查点和空的日期目录"""
+    if not os.path.isdir(directory):
+        return
+    cutoff = time.time() - max_age_days * 86400
+    for date_dir in os.listdir(directory):
+        path = os.path.join(directory, date_dir)
+        if not os.path.isdir(path):
+            continue
+        for name in os.listdir(path):
+            file_path = os.path.join(path, name)
+            try:
+                if os.path.getmtime(file_path) < cutoff:
+                    os.remove(file_path)
+            except OSError:
+                pass
+        try:
+            if not os.listdir(path):
+                os.rmdir(path)
+        except OSError:
+            pass
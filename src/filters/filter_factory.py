@@ -1,45 +1,63 @@
-from typing import Optional, Dict, Type
+from typing import Optional, Dict, List, Type
+from importlib import import_module
+import threading
 from .base_filter import BaseFilter
-from .kline_patterns.v_bottom_filter import VBottomFilter
-from .kline_patterns.double_bottom_filter import DoubleBottomFilter
-from .kline_patterns.morning_star_filter import MorningStarFilter
-from .kline_patterns.rounding_bottom_filter import RoundingBottomFilter
-from .kline_patterns.head_shoulders_bottom_filter import HeadShouldersBottomFilter
-from .kline_patterns.flat_bottom_filter import FlatBottomFilter
-from .kline_patterns.rising_sun_filter import RisingSunFilter
-from .kline_patterns.bullish_engulfing_filter import BullishEngulfingFilter
-from .kline_patterns.three_white_soldiers_filter import ThreeWhiteSoldiersFilter
-from .kline_patterns.hammer_filter import HammerFilter
-from .price_patterns.limit_up_filter import LimitUpFilter
-from .price_patterns.money_flow_filter import MoneyFlowFilter
 
 class FilterFactory:
-    """筛选器工厂类"""
-    
-    # 注册筛选器
-    _filters: Dict[str, Type[BaseFilter]] = {
-        'V型底': VBottomFilter,
-        'W底': DoubleBottomFilter,
-        '启明之星': MorningStarFilter,
-        '圆弧底': RoundingBottomFilter,
-        '头肩底': HeadShouldersBottomFilter,
-        '平底': FlatBottomFilter,
-        '旭日东升': RisingSunFilter,
-        '看涨吞没': BullishEngulfingFilter,
-        '红三兵': ThreeWhiteSoldiersFilter,
-        '锤头线': HammerFilter,
-        '涨停': LimitUpFilter,
-        '资金持续流入': MoneyFlowFilter
+    """筛选器工厂类
+
+    注册表只记录筛选器所在的模块和类名，第一次创建某个筛选器时才导入对应模块。
+    圆弧底依赖 scipy 和 statsmodels、W底等依赖 numba，导入都较慢，
+    API 和 Streamlit 进程启动时不需要加载用不到的筛选器。
+    """
+
+    # 注册筛选器：名称 -> 模块（相对 src.filters）:类名
+    _filters: Dict[str, str] = {
+        'V型底': 'kline_patterns.v_bottom_filter:VBottomFilter',
+        'W底': 'kline_patterns.double_bottom_filter:DoubleBottomFilter',
+        '启明之星': 'kline_patterns.morning_star_filter:MorningStarFilter',
+        '圆弧底': 'kline_patterns.rounding_bottom_filter:RoundingBottomFilter',
+        '头肩底': 'kline_patterns.head_shoulders_bottom_filter:HeadShouldersBottomFilter',
+        '平底': 'kline_patterns.flat_bottom_filter:FlatBottomFilter',
+        '旭日东升': 'kline_patterns.rising_sun_filter:RisingSunFilter',
+        '看涨吞没': 'kline_patterns.bullish_engulfing_filter:BullishEngulfingFilter',
+        '红三兵': 'kline_patterns.three_white_soldiers_filter:ThreeWhiteSoldiersFilter',
+        '锤头线': 'kline_patterns.hammer_filter:HammerFilter',
+        '形态相似': 'kline_patterns.similarity_filter:SimilarityFilter',
+        '涨停': 'price_patterns.limit_up_filter:LimitUpFilter',
+        '资金持续流入': 'price_patterns.money_flow_filter:MoneyFlowFilter'
     }
-    
+
+    # 已导入的筛选器类
+    _classes: Dict[str, Type[BaseFilter]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def filter_types(cls) -> List[str]:
+        """全部已注册的筛选器名称（不导入筛选器模块）"""
+        return list(cls._filters)
+
+    @classmethod
+    def get_filter_class(cls, filter_type: str) -> Type[BaseFilter]:
+        """获取筛选器类，首次使用时导入所在模块"""
+        filter_class = cls._classes.get(filter_type)
+        if filter_class is not None:
+            return filter_class
+
+        target = cls._filters.get(filter_type)
+        if target is None:
+            raise ValueError(f"未知的筛选器类型: {filter_type}")
+        module_name, class_name = target.split(':')
+        with cls._lock:
+            if filter_type not in cls._classes:
+                module = import_module(f"{__package__}.{module_name}")
+                cls._classes[filter_type] = getattr(module, class_name)
+            return cls._classes[filter_type]
+
     @classmethod
     def create_filter(cls, filter_type: str, **kwargs) -> Optional[BaseFilter]:
         """创建筛选器实例"""
         if filter_type == '所有':
             return None
-            
-        filter_class = cls._filters.get(filter_type)
-        if filter_class is None:
-            raise ValueError(f"未知的筛选器类型: {filter_type}")
-            
-        return filter_class(**kwargs) 
\ No newline at end of file
+
+        return cls.get_filter_class(filter_type)(**kwargs)
@@ -1,25 +1,116 @@
 import pandas as pd
 import numpy as np
-from ...filters.base_filter import BaseFilter
-from src.utils.config import ts_api
-import talib
+from ...filters.base_filter import PerStockFilter
+from src.data.base_provider import DataProvider
+from src.data.provider_factory import get_provider
+from src.data.adjust import ADJUST_TYPES, adjusted_daily
+from src.data.bar_pyramid import PERIOD_NAMES, period_bars
+from src.data.feature_store import calculate_features
+from src.data.shared_panel import shared_kline_frame
 import logging
+from typing import Optional
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
-class BaseKlineFilter(BaseFilter):
+# 每根K线约对应的自然日数（含节假日余量），用于估算获取K线的起始日期
+CALENDAR_DAYS = {'D': 2, 'W': 8, 'M': 32}
+
+class BaseKlineFilter(PerStockFilter):
     """基础K线形态筛选器"""
     
-    def __init__(self, lookback_period: int = 20):
+    # 判断一个在某根K线结束的形态所需的K线数量（含形态之前用于比较的K线）
+    pattern_bars = 1
+    
+    def __init__(self, lookback_period: int = 20, provider: Optional[DataProvider] = None,
+                 recent_bars: Optional[int] = None, as_of: Optional[str] = None,
+                 timeframe: str = 'D', adjust: Optional[str] = None):
+        """
+        Args:
+            lookback_period: 回看的K线数
+            provider: 数据提供者，默认按配置创建
+            recent_bars: 只接受在最近 recent_bars 根K线内结束的形态，
+                同时只获取判断这些形态所需的K线；为空时扫描全部回看区间
+            as_of: 评估日期（YYYYMMDD），默认为当天
+            timeframe: K线周期，D 日线、W 周线、M 月线；周线、月线读取K线金字塔中预先归并的K线
+            adjust: 复权方式，qfq 前复权（以评估日期为基准）、hfq 后复权，为空时不复权
+        """
+        if timeframe not in PERIOD_NAMES:
+            raise ValueError(f"未知的K线周期: {timeframe}")
+        if adjust and adjust not in ADJUST_TYPES:
+            raise ValueError(f"未知的复权方式: {adjust}")
         self.lookback_period = lookback_period
+        self.provider = provider if provider is not None else get_provider()
+        self.recent_bars = recent_bars
+        self.as_of = as_of
+        self.timeframe = timeframe
+        self.adjust = adjust or None
+        self._date_range = None
+        
+    def fetch_data(self, stock: pd.Series) -> Optional[pd.DataFrame]:
+        """获取K线数据，长度不足时返回 None"""
+        kline_data = self.get_kline_data(stock['ts_code'])
+        min_bars = self.pattern_bars if self.recent_bars else self.lookback_period
+        if kline_data is None or len(kline_data) < min_bars:
+            return None
+        return kline_data
+    
+    def required_bars(self) -> int:
+        """recent_bars 模式下需要获取的K线数量"""
+        return self.pattern_bars + self.recent_bars - 1
+    
+    def get_date_range(self) -> tuple:
+        """计算获取K线的起止日期，同一筛选器实例只计算一次"""
+        if self._date_range is None:
+            end = datetime.strptime(self.as_of, '%Y%m%d') if self.as_of else datetime.now()
+            end_date = end.strftime('%Y%m%d')
+            bars = self.required_bars() if self.recent_bars else self.lookback_period
+            start_date = (end - timedelta(days=bars * CALENDAR_DAYS[self.timeframe])).strftime('%Y%m%d')
+            if self.recent_bars and self.timeframe == 'D':
+                # 按交易日历精确计算，只获取最近 required_bars 根K线
+                trade_dates = self.provider.recent_trade_dates(self.required_bars(), end_date)
+                if trade_dates:
+                    start_date = trade_dates[0]
+            self._date_range = (start_date, end_date)
+        return self._date_range
+    
+    def scan_start(self, n: int, default_start: int, offset: int = 0) -> int:
+        """形态扫描的起始下标
         
+        Args:
+            n: K线数量
+            default_start: 不限制最近窗口时的起始下标
+            offset: 形态在下标 i 处开始判断、在 i + offset 处结束
+        """
+        if not self.recent_bars:
+            return default_start
+        return max(default_start, n - self.recent_bars - offset)
+    
+    def in_recent_window(self, index: int, n: int) -> bool:
+        """下标为 index 的K线是否位于最近窗口内"""
+        return not self.recent_bars or index >= n - self.recent_bars
+
+    def signals(self, bars: dict) -> np.ndarray:
+        """在整个面板上向量化检测形态，用于历史回测
+
+        Args:
+            bars: open/high/low/close/volume 五个形状为 (交易日, 股票) 的数组，
+                按交易日升序排列，停牌或未上市处为 NaN
+
+        Returns:
+            同形状的布尔数组，True 表示形态在该交易日收盘时完成，
+            判断只使用截至该交易日（含）的数据
+        """
+        raise NotImplementedError(f"{type(self).__name__} 不支持向量化检测")
+
     def get_kline_data(self, stock_code: str) -> pd.DataFrame:
         """获取K线数据
         
         Args:
             stock_code: 股票代码
             
+        取数或复权失败时抛出异常（由执行计划按上游失败处理），没有数据时返回 None。
+
         Returns:
             DataFrame: 包含K线数据的DataFrame，列包括：
                 - open: 开盘价
@@ -29,15 +120,24 @@ class BaseKlineFilter(BaseFilter):
                 - vol: 成交量
         """
         try:
-            # 计算开始日期（往前推lookback_period个交易日）
-            end_date = datetime.now().strftime('%Y%m%d')
-            start_date = (datetime.now() - timedelta(days=self.lookback_period * 2)).strftime('%Y%m%d')
+            # 计算起止日期
+            start_date, end_date = self.get_date_range()
+
+            if self.timeframe != 'D':
+                return self._period_kline_data(stock_code, start_date, end_date)
             
-            # 获取日线数据
-            df = ts_api.daily(
-                ts_code=stock_code,
-                start_date=start_date,
-                end_date=end_date,
+            # 已发布共享行情面板时直接从内存映射中读取
+            df = shared_kline_frame(self.provider, stock_code, start_date, end_date, adjust=self.adjust)
+            if df is not None:
+                return df
+
+            # 获取日线数据，复权时与复权因子相乘（结果按股票缓存）
+            df = adjusted_daily(
+                self.provider,
+                stock_code,
+                start_date,
+                end_date,
+                self.adjust,
                 fields='ts_code,trade_date,open,high,low,close,vol'
             )
             
@@ -62,62 +162,31 @@ class BaseKlineFilter(BaseFilter):
             
         except Exception as e:
             logger.error(f"获取股票 {stock_code} 的K线数据时出错: {str(e)}")
+            raise
+
+    def _period_kline_data(self, stock_code: str, start_date: str, end_date: str) -> Optional[pd.DataFrame]:
+        """获取周线或月线，格式与日线相同，日期为每根K线实际的最后一个交易日"""
+        df = period_bars(self.provider, stock_code, self.timeframe, start_date, end_date, self.adjust)
+        if df is None or len(df) == 0:
+            logger.warning(f"未获取到股票 {stock_code} 的{PERIOD_NAMES[self.timeframe]}数据")
             return None
-            
+        df = df.rename(columns={'vol': 'volume'})
+        df['date'] = pd.to_datetime(df['bar_end'])
+        return df.set_index('date')[['ts_code', 'open', 'high', 'low', 'close', 'volume']]
+
     def calculate_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
-        """计算技术指标
-        
+        """添加均线（ma20、ma60、ma200）
+
+        复权日线在使用本地存储时从特征库读取预计算的均线，否则直接计算。
+        特征库中的均线按后复权价格保存，不复权价格和周线、月线总是直接计算。
+
         Args:
             df: K线数据DataFrame
-            
+
         Returns:
-            DataFrame: 添加了技术指标的DataFrame
+            DataFrame: 添加了均线的DataFrame
         """
         if df is None or len(df) == 0:
             return df
-            
-        try:
-            # 计算移动平均线
-            df['ma5'] = talib.MA(df['close'].values, timeperiod=5)
-            df['ma10'] = talib.MA(df['close'].values, timeperiod=10)
-            df['ma20'] = talib.MA(df['close'].values, timeperiod=20)
-            df['ma60'] = talib.MA(df['close'].values, timeperiod=60)
-            
-            # 计算MACD
-            df['macd'], df['signal'], df['hist'] = talib.MACD(
-                df['close'].values,
-                fastperiod=12,
-                slowperiod=26,
-                signalperiod=9
-            )
-            
-            # 计算RSI
-            df['rsi'] = talib.RSI(df['close'].values, timeperiod=14)
-            
-            # 计算布林带
-            df['upper'], df['middle'], df['lower'] = talib.BBANDS(
-                df['close'].values,
-                timeperiod=20,
-                nbdevup=2,
-                nbdevdn=2,
-                matype=0
-            )
-            
-            # 计算KDJ
-            df['k'], df['d'] = talib.STOCH(
-                df['high'].values,
-                df['low'].values,
-                df['close'].values,
-                fastk_period=9,
-                slowk_period=3,
-                slowk_matype=0,
-                slowd_period=3,
-                slowd_matype=0
-            )
-            df['j'] = 3 * df['k'] - 2 * df['d']
-            
-            return df
-            
-        except Exception as e:
-            logger.error(f"计算技术指标时出错: {str(e)}")
-            return df 
\ No newline at end of file
+        use_store = self.timeframe == 'D' and self.adjust
+        return calculate_features(df, self.provider if use_store else None)
@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 from .base_kline_filter import BaseKlineFilter
+from ..base_filter import excess, ratio, strength
+from .vector_ops import candle_parts, shift
 import logging
 
 logger = logging.getLogger(__name__)
@@ -8,46 +10,54 @@ logger = logging.getLogger(__name__)
 class BullishEngulfingFilter(BaseKlineFilter):
     """看涨吞没筛选器"""
     
-    def filter(self, stocks_df: pd.DataFrame) -> pd.DataFrame:
-        """执行看涨吞没筛选"""
-        logger.info("开始执行看涨吞没筛选，传入的股票数量：%d", len(stocks_df))
-        result_stocks = []
+    display_name = '看涨吞没'
+    pattern_bars = 2
+    estimated_pass_rate = 0.4
+    
+    def detect(self, stock: pd.Series, kline_data: pd.DataFrame):
+        """检测看涨吞没形态"""
+        # 计算K线实体和影线
+        kline_data['body'] = kline_data['close'] - kline_data['open']
+        kline_data['upper_shadow'] = kline_data['high'] - kline_data[['open', 'close']].max(axis=1)
+        kline_data['lower_shadow'] = kline_data[['open', 'close']].min(axis=1) - kline_data['low']
         
-        for _, stock in stocks_df.iterrows():
-            try:
-                # 获取K线数据
-                kline_data = self.get_kline_data(stock['ts_code'])
-                logger.info("获取股票 %s 的K线数据成功，K线数据长度：%d", stock['ts_code'], len(kline_data))
-                if kline_data is None or len(kline_data) < self.lookback_period:
-                    continue
+        # 寻找看涨吞没形态
+        for i in range(self.scan_start(len(kline_data), 1), len(kline_data)):
+            # 第一根K线：阴线
+            if kline_data['body'].iloc[i-1] < 0:
+                # 第二根K线：阳线
+                if (kline_data['body'].iloc[i] > 0 and
+                    kline_data['open'].iloc[i] < kline_data['close'].iloc[i-1] and
+                    kline_data['close'].iloc[i] > kline_data['open'].iloc[i-1]):
                     
-                # 计算K线实体和影线
-                kline_data['body'] = kline_data['close'] - kline_data['open']
-                kline_data['upper_shadow'] = kline_data['high'] - kline_data[['open', 'close']].max(axis=1)
-                kline_data['lower_shadow'] = kline_data[['open', 'close']].min(axis=1) - kline_data['low']
-                
-                # 寻找看涨吞没形态
-                for i in range(1, len(kline_data)):
-                    # 第一根K线：阴线
-                    if kline_data['body'].iloc[i-1] < 0:
-                        # 第二根K线：阳线
-                        if (kline_data['body'].iloc[i] > 0 and
-                            kline_data['open'].iloc[i] < kline_data['close'].iloc[i-1] and
-                            kline_data['close'].iloc[i] > kline_data['open'].iloc[i-1]):
-                            
-                            # 检查阳线实体是否大于阴线实体
-                            if abs(kline_data['body'].iloc[i]) > abs(kline_data['body'].iloc[i-1]):
-                                # 检查成交量
-                                if kline_data['volume'].iloc[i] > kline_data['volume'].iloc[i-1] * 1.5:
-                                    result_stocks.append(stock)
-                                    logger.info("股票 %s 形成看涨吞没形态，成交量放大：%.2f%%", 
-                                              stock['ts_code'],
-                                              (kline_data['volume'].iloc[i] / kline_data['volume'].iloc[i-1] - 1) * 100)
-                                    break
-                
-            except Exception as e:
-                logger.error("处理股票 %s 时出错: %s", stock['ts_code'], str(e))
-                continue
-        
-        logger.info("看涨吞没筛选完成，找到的股票数量：%d", len(result_stocks))
-        return pd.DataFrame(result_stocks) 
\ No newline at end of file
+                    # 检查阳线实体是否大于阴线实体
+                    if abs(kline_data['body'].iloc[i]) > abs(kline_data['body'].iloc[i-1]):
+                        # 检查成交量
+                        if kline_data['volume'].iloc[i] > kline_data['volume'].iloc[i-1] * 1.5:
+                            logger.info("股票 %s 形成看涨吞没形态，成交量放大：%.2f%%", 
+                                      stock['ts_code'],
+                                      (kline_data['volume'].iloc[i] / kline_data['volume'].iloc[i-1] - 1) * 100)
+                            engulf_ratio = ratio(kline_data['body'].iloc[i], abs(kline_data['body'].iloc[i-1]))
+                            volume_ratio = ratio(kline_data['volume'].iloc[i], kline_data['volume'].iloc[i-1])
+                            # 阳线实体相对阴线越大、收盘越高于前一日开盘、放量越多越强
+                            return {
+                                'score': strength(excess(engulf_ratio, 1, 3),
+                                                  excess(kline_data['close'].iloc[i] / kline_data['open'].iloc[i-1] - 1,
+                                                         0, 0.03),
+                                                  excess(volume_ratio, 1.5, 3)),
+                                'engulf_ratio': round(engulf_ratio, 2),
+                                'volume_ratio': round(volume_ratio, 2)
+                            }
+        return None
+
+    def signals(self, bars: dict) -> np.ndarray:
+        """向量化检测看涨吞没，与 detect 的判断条件一致"""
+        body, _, _ = candle_parts(bars)
+        prev_body = shift(body, 1)
+        with np.errstate(invalid='ignore'):
+            return ((prev_body < 0) &
+                    (body > 0) &
+                    (bars['open'] < shift(bars['close'], 1)) &
+                    (bars['close'] > shift(bars['open'], 1)) &
+                    (np.abs(body) > np.abs(prev_body)) &
+                    (bars['volume'] > shift(bars['volume'], 1) * 1.5))
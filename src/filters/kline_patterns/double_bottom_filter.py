@@ -1,6 +1,9 @@
 import pandas as pd
 import numpy as np
 from .base_kline_filter import BaseKlineFilter
+from ..base_filter import excess, strength
+from . import kernels
+from .vector_ops import shift
 import logging
 
 logger = logging.getLogger(__name__)
@@ -8,48 +11,77 @@ logger = logging.getLogger(__name__)
 class DoubleBottomFilter(BaseKlineFilter):
     """W底筛选器"""
     
-    def filter(self, stocks_df: pd.DataFrame) -> pd.DataFrame:
-        """执行W底筛选"""
-        logger.info("开始执行W底筛选，传入的股票数量：%d", len(stocks_df))
-        result_stocks = []
+    display_name = 'W底'
+    pattern_bars = 25
+    estimated_pass_rate = 0.4
+    
+    def detect(self, stock: pd.Series, kline_data: pd.DataFrame):
+        """检测W底形态"""
+        # 寻找两个底部
+        bottoms = []
+        for i in range(2, len(kline_data) - 2):
+            if (kline_data['close'].iloc[i] < kline_data['close'].iloc[i-1] and 
+                kline_data['close'].iloc[i] < kline_data['close'].iloc[i-2] and
+                kline_data['close'].iloc[i] < kline_data['close'].iloc[i+1] and
+                kline_data['close'].iloc[i] < kline_data['close'].iloc[i+2]):
+                bottoms.append(i)
         
-        for _, stock in stocks_df.iterrows():
-            try:
-                # 获取K线数据
-                kline_data = self.get_kline_data(stock['ts_code'])
-                logger.info("获取股票 %s 的K线数据成功，K线数据长度：%d", stock['ts_code'], len(kline_data))
-                if kline_data is None or len(kline_data) < self.lookback_period:
-                    continue
-                    
-                # 计算价格变化率
-                price_changes = kline_data['close'].pct_change()
-                
-                # 寻找两个底部
-                bottoms = []
-                for i in range(2, len(kline_data) - 2):
-                    if (kline_data['close'].iloc[i] < kline_data['close'].iloc[i-1] and 
-                        kline_data['close'].iloc[i] < kline_data['close'].iloc[i-2] and
-                        kline_data['close'].iloc[i] < kline_data['close'].iloc[i+1] and
-                        kline_data['close'].iloc[i] < kline_data['close'].iloc[i+2]):
-                        bottoms.append(i)
-                
-                logger.info("股票 %s 找到 %d 个可能的底部", stock['ts_code'], len(bottoms))
-                
-                # 检查是否有两个相近的底部
-                for i in range(len(bottoms) - 1):
-                    if bottoms[i+1] - bottoms[i] >= 5 and bottoms[i+1] - bottoms[i] <= 20:
-                        # 检查两个底部的价格是否接近
-                        price_diff = abs(kline_data['close'].iloc[bottoms[i]] - kline_data['close'].iloc[bottoms[i+1]])
-                        price_avg = (kline_data['close'].iloc[bottoms[i]] + kline_data['close'].iloc[bottoms[i+1]]) / 2
-                        
-                        if price_diff / price_avg < 0.05:  # 价格差异小于5%
-                            result_stocks.append(stock)
-                            logger.info("股票 %s 形成W底形态", stock['ts_code'])
-                            break
-                
-            except Exception as e:
-                logger.error("处理股票 %s 时出错: %s", stock['ts_code'], str(e))
-                continue
+        logger.info("股票 %s 找到 %d 个可能的底部", stock['ts_code'], len(bottoms))
         
-        logger.info("W底筛选完成，找到的股票数量：%d", len(result_stocks))
-        return pd.DataFrame(result_stocks) 
\ No newline at end of file
+        # 检查是否有两个相近的底部
+        for i in range(len(bottoms) - 1):
+            # 第二个底部需要之后两根K线确认，确认点须位于最近窗口内
+            if not self.in_recent_window(bottoms[i+1] + 2, len(kline_data)):
+                continue
+            if bottoms[i+1] - bottoms[i] >= 5 and bottoms[i+1] - bottoms[i] <= 20:
+                # 检查两个底部的价格是否接近
+                price_diff = abs(kline_data['close'].iloc[bottoms[i]] - kline_data['close'].iloc[bottoms[i+1]])
+                price_avg = (kline_data['close'].iloc[bottoms[i]] + kline_data['close'].iloc[bottoms[i+1]]) / 2
+                
+                if price_diff / price_avg < 0.05:  # 价格差异小于5%
+                    logger.info("股票 %s 形成W底形态", stock['ts_code'])
+                    # 颈线为两个底部之间的最高收盘价
+                    neckline = kline_data['close'].iloc[bottoms[i]:bottoms[i+1] + 1].max()
+                    breakout = kline_data['close'].iloc[-1] / neckline - 1
+                    rebound = kline_data['close'].iloc[-1] / kline_data['close'].iloc[bottoms[i+1]] - 1
+                    # 两个底部越接近、第二个底部之后反弹越多、越接近或突破颈线越强
+                    return {
+                        'score': strength(excess(price_diff / price_avg, 0.05, 0),
+                                          excess(rebound, 0, 0.1),
+                                          excess(breakout, -0.05, 0.03)),
+                        'neckline_breakout_pct': round(breakout * 100, 2)
+                    }
+        return None
+
+    def signals(self, bars: dict) -> np.ndarray:
+        """检测W底，信号位于第二个底部之后两根K线（底部得到确认时）
+
+        与 detect 一样只比较相邻的两个底部。安装了 numba 时使用编译内核。
+        """
+        if kernels.enabled():
+            return kernels.double_bottom(bars['close'])
+        return self.numpy_signals(bars)
+
+    def numpy_signals(self, bars: dict) -> np.ndarray:
+        """W底的 NumPy 向量化实现"""
+        close = bars['close']
+        with np.errstate(invalid='ignore'):
+            is_bottom = ((close < shift(close, 1)) & (close < shift(close, 2)) &
+                         (close < shift(close, -1)) & (close < shift(close, -2)))
+
+        # 每个位置之前最近一个底部的下标（没有时为 -1）
+        index = np.arange(len(close))[:, None]
+        last_bottom = np.maximum.accumulate(np.where(is_bottom, index, -1), axis=0)
+        prev_bottom = np.full(last_bottom.shape, -1)
+        prev_bottom[1:] = last_bottom[:-1]
+
+        gap = index - prev_bottom
+        prev_close = np.take_along_axis(close, np.maximum(prev_bottom, 0), axis=0)
+        with np.errstate(invalid='ignore'):
+            price_diff = np.abs(prev_close - close) / ((prev_close + close) / 2)
+            paired = is_bottom & (prev_bottom >= 0) & (gap >= 5) & (gap <= 20) & (price_diff < 0.05)
+
+        # 第二个底部在之后两根K线收盘时才能确认，信号推迟两根K线以避免使用未来数据
+        result = np.zeros(paired.shape, dtype=bool)
+        result[2:] = paired[:-2]
+        return result
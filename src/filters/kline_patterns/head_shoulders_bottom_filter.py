@@ -1,6 +1,9 @@
 import pandas as pd
 import numpy as np
 from .base_kline_filter import BaseKlineFilter
+from ..base_filter import excess, strength
+from . import kernels
+from .vector_ops import rolling_min, shift
 import logging
 
 logger = logging.getLogger(__name__)
@@ -8,56 +11,117 @@ logger = logging.getLogger(__name__)
 class HeadShouldersBottomFilter(BaseKlineFilter):
     """头肩底筛选器"""
     
-    def filter(self, stocks_df: pd.DataFrame) -> pd.DataFrame:
-        """执行头肩底筛选"""
-        logger.info("开始执行头肩底筛选，传入的股票数量：%d", len(stocks_df))
-        result_stocks = []
+    display_name = '头肩底'
+    # 局部最低点需要与前后各 window 根K线比较
+    window = 5
+    # 左肩到右肩最多 max_span 根K线，右肩之后 breakout_bars 根K线内须突破颈线
+    max_span = 60
+    breakout_bars = 20
+    # 突破K线之前最远到左肩之前 window 根K线
+    pattern_bars = window + max_span + breakout_bars + 1
+    estimated_pass_rate = 0.03
+
+    def __init__(self, lookback_period: int = 20, **kwargs):
+        # 少于 pattern_bars 根K线时形态不可能完成，回看区间至少取 pattern_bars 根
+        super().__init__(lookback_period=max(lookback_period, self.pattern_bars), **kwargs)
+    
+    def detect(self, stock: pd.Series, kline_data: pd.DataFrame):
+        """检测头肩底形态
+
+        右肩确认之后、下一个低点确认之前且不晚于右肩之后 breakout_bars 根K线内，
+        收盘价首次突破颈线即视为形态完成，这根突破K线须位于最近窗口内（未指定 recent_bars 时为整个回看区间）。
+        最初的实现要求最新一根K线的收盘价高于颈线；现在突破之后又回落到颈线以下的股票同样满足条件，
+        评分中的突破幅度仍按最新收盘价计算，回落到颈线以下时这一项为 0。
+        """
+        window = self.window
+        low = kline_data['low'].to_numpy(dtype=float)
+        high = kline_data['high'].to_numpy(dtype=float)
+        close = kline_data['close'].to_numpy(dtype=float)
+        n = len(kline_data)
+
+        # 寻找局部最低点
+        local_minima = [i for i in range(window, n - window)
+                        if low[i] <= low[i-window:i].min() and low[i] <= low[i+1:i+window+1].min()]
         
-        for _, stock in stocks_df.iterrows():
-            try:
-                # 获取K线数据
-                kline_data = self.get_kline_data(stock['ts_code'])
-                logger.info("获取股票 %s 的K线数据成功，K线数据长度：%d", stock['ts_code'], len(kline_data))
-                if kline_data is None or len(kline_data) < self.lookback_period:
-                    continue
-                    
-                # 寻找局部最低点
-                window = 5
-                local_minima = []
-                for i in range(window, len(kline_data) - window):
-                    if all(kline_data['low'].iloc[i] <= kline_data['low'].iloc[i-window:i]) and \
-                       all(kline_data['low'].iloc[i] <= kline_data['low'].iloc[i+1:i+window+1]):
-                        local_minima.append(i)
-                
-                logger.info("股票 %s 找到 %d 个局部最低点", stock['ts_code'], len(local_minima))
-                
-                # 寻找头肩底形态
-                for i in range(2, len(local_minima) - 2):
-                    left_shoulder = local_minima[i-1]
-                    head = local_minima[i]
-                    right_shoulder = local_minima[i+1]
-                    
-                    # 检查时间间隔
-                    if (head - left_shoulder < 10 or right_shoulder - head < 10 or
-                        right_shoulder - left_shoulder > 60):
-                        continue
-                    
-                    # 检查价格关系
-                    if (kline_data['low'].iloc[left_shoulder] > kline_data['low'].iloc[head] and
-                        kline_data['low'].iloc[right_shoulder] > kline_data['low'].iloc[head]):
-                        
-                        # 计算颈线
-                        neckline = max(kline_data['high'].iloc[left_shoulder:right_shoulder+1])
-                        
-                        # 检查是否突破颈线
-                        if kline_data['close'].iloc[-1] > neckline:
-                            result_stocks.append(stock)
-                            logger.info("股票 %s 形成头肩底形态，突破颈线", stock['ts_code'])
-                            break
-                
-            except Exception as e:
-                logger.error("处理股票 %s 时出错: %s", stock['ts_code'], str(e))
-                continue
+        logger.info("股票 %s 找到 %d 个局部最低点", stock['ts_code'], len(local_minima))
         
-        logger.info("头肩底筛选完成，找到的股票数量：%d", len(result_stocks))
-        return pd.DataFrame(result_stocks) 
\ No newline at end of file
+        # 相邻的三个局部最低点依次作为左肩、头部和右肩
+        for k in range(len(local_minima) - 2):
+            left_shoulder, head, right_shoulder = local_minima[k:k+3]
+            
+            # 检查时间间隔
+            if (head - left_shoulder < 10 or right_shoulder - head < 10 or
+                right_shoulder - left_shoulder > self.max_span):
+                continue
+            
+            # 检查价格关系
+            if not (low[left_shoulder] > low[head] and low[right_shoulder] > low[head]):
+                continue
+
+            # 计算颈线
+            neckline = high[left_shoulder:right_shoulder+1].max()
+
+            # 右肩在之后 window 根K线收盘时才能确认，在确认之后、下一个低点确认之前
+            # 且不晚于右肩之后 breakout_bars 根K线寻找收盘价首次突破颈线的K线
+            confirmed = right_shoulder + window
+            end = min(n, right_shoulder + self.breakout_bars + 1)
+            if k + 3 < len(local_minima):
+                end = min(end, local_minima[k+3] + window)
+            above = np.flatnonzero(close[confirmed:end] > neckline)
+            if len(above) == 0 or not self.in_recent_window(confirmed + int(above[0]), n):
+                continue
+
+            logger.info("股票 %s 形成头肩底形态，突破颈线", stock['ts_code'])
+            breakout = close[-1] / neckline - 1
+            head_low = low[head]
+            shoulder_low = min(low[left_shoulder], low[right_shoulder])
+            shoulder_gap = abs(low[left_shoulder] - low[right_shoulder]) / shoulder_low
+            # 突破颈线越多、头部相对两肩越深、两肩越对称越强
+            return {
+                'score': strength(excess(breakout, 0, 0.08),
+                                  excess(shoulder_low / head_low - 1, 0, 0.1),
+                                  excess(shoulder_gap, 0.1, 0)),
+                'neckline_breakout_pct': round(breakout * 100, 2)
+            }
+        return None
+
+    def signals(self, bars: dict) -> np.ndarray:
+        """检测头肩底，信号位于收盘价首次突破颈线的K线
+
+        局部最低点在其后 5 根K线收盘时才能确认，因此只使用截至信号当天已确认的三个相邻低点，
+        突破须在右肩之后 breakout_bars 根K线内，与 detect 一致。安装了 numba 时使用编译内核。
+        """
+        if kernels.enabled():
+            return kernels.head_shoulders(bars['low'], bars['high'], bars['close'], self.window,
+                                          self.max_span, self.breakout_bars)
+        return self.numpy_signals(bars)
+
+    def numpy_signals(self, bars: dict) -> np.ndarray:
+        """头肩底的 NumPy 实现，低点数量很少，逐只股票遍历低点即可"""
+        window = self.window
+        low, high, close = bars['low'], bars['high'], bars['close']
+        with np.errstate(invalid='ignore'):
+            is_minimum = ((low <= rolling_min(shift(low, 1), window)) &
+                          (low <= shift(rolling_min(low, window), -window)))
+
+        result = np.zeros(low.shape, dtype=bool)
+        n = len(low)
+        for column in range(low.shape[1]):
+            minima = np.flatnonzero(is_minimum[:, column])
+            for left_shoulder, head, right_shoulder in zip(minima, minima[1:], minima[2:]):
+                if (head - left_shoulder < 10 or right_shoulder - head < 10 or
+                        right_shoulder - left_shoulder > self.max_span):
+                    continue
+                if not (low[left_shoulder, column] > low[head, column] and
+                        low[right_shoulder, column] > low[head, column]):
+                    continue
+                neckline = np.max(high[left_shoulder:right_shoulder + 1, column])
+                # 在右肩确认之后、下一个低点确认之前且不晚于右肩之后 breakout_bars 根K线寻找首次突破
+                confirmed = right_shoulder + window
+                next_index = np.searchsorted(minima, right_shoulder, side='right')
+                end = minima[next_index] + window if next_index < len(minima) else n
+                end = min(end, right_shoulder + self.breakout_bars + 1)
+                segment = close[confirmed:end, column] > neckline
+                if segment.any():
+                    result[confirmed + int(np.argmax(segment)), column] = True
+        return result
@@ -0,0 +1,197 @@
+"""逐只股票循环的形态检测内核
+
+头肩底、W底和V型底的判断本质上是沿时间轴的状态机（寻找相邻低点、配对底部、比较前后两段），
+用 NumPy 广播表达时需要多次整表运算，头肩底还要逐只股票遍历低点。这里把它们写成对原始
+float64 数组的循环，安装了 numba 时即时编译（编译结果缓存在 __pycache__ 中，之后启动不再编译），
+没有 numba 时各筛选器仍使用原来的 NumPy 实现。
+
+内核只用于整个面板上的向量化检测 signals（形态回测和盘中实时筛选）。/api/filter 等筛选逐只股票
+调用 detect，每只股票只有几十根K线，仍是筛选器中的 Python 循环，不经过内核。
+
+内核的输入和输出都是 (股票, 交易日) 排列的连续数组，每只股票的数据在内存中相邻。
+结果与 NumPy 实现逐元素一致，可以用下面的命令核对：
+    python -m src.filters.kline_patterns.kernels --stocks 500 --days 750
+与 detect 的一致性（内核和 NumPy 实现分别核对）见 src.backtest.parity。
+"""
+import argparse
+import logging
+import math
+import time
+import numpy as np
+from src.api.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numba
+    HAVE_NUMBA = True
+except ImportError:
+    numba = None
+    HAVE_NUMBA = False
+
+def _jit(func):
+    """有 numba 时编译并缓存到磁盘，否则原样返回（只在核对时以纯 Python 运行）"""
+    if HAVE_NUMBA:
+        return numba.njit(cache=True, nogil=True, error_model='numpy')(func)
+    return func
+
+def enabled() -> bool:
+    """是否使用编译内核：KLINE_KERNELS=auto 时取决于是否安装了 numba，numpy 时总是不用"""
+    mode = get_settings().KLINE_KERNELS
+    if mode == 'numba' and not HAVE_NUMBA:
+        logger.warning("KLINE_KERNELS=numba 但未安装 numba，使用 NumPy 实现")
+    return HAVE_NUMBA and mode != 'numpy'
+
+def _by_stock(values: np.ndarray) -> np.ndarray:
+    """(交易日, 股票) 面板转为按股票连续存放的 float64 数组"""
+    return np.ascontiguousarray(np.asarray(values, dtype=np.float64).T)
+
+@_jit
+def _double_bottom(close):
+    n_stocks, n = close.shape
+    result = np.zeros((n_stocks, n), dtype=np.bool_)
+    for s in range(n_stocks):
+        c = close[s]
+        prev_bottom = -1
+        for i in range(2, n - 2):
+            # NaN 参与的比较均为 False
+            if not (c[i] < c[i - 1] and c[i] < c[i - 2] and c[i] < c[i + 1] and c[i] < c[i + 2]):
+                continue
+            if prev_bottom >= 0:
+                gap = i - prev_bottom
+                p = c[prev_bottom]
+                if 5 <= gap <= 20 and abs(p - c[i]) / ((p + c[i]) / 2) < 0.05:
+                    # 第二个底部在之后两根K线收盘时才能确认
+                    result[s, i + 2] = True
+            prev_bottom = i
+    return result
+
+@_jit
+def _head_shoulders(low, high, close, window, max_span, breakout_bars):
+    n_stocks, n = low.shape
+    result = np.zeros((n_stocks, n), dtype=np.bool_)
+    minima = np.empty(n, dtype=np.int64)
+    for s in range(n_stocks):
+        lo, hi, c = low[s], high[s], close[s]
+        # 局部最低点：不高于前后各 window 根K线的最低价（窗口内有 NaN 时不成立）
+        count = 0
+        for i in range(window, n - window):
+            if math.isnan(lo[i]):
+                continue
+            ok = True
+            for j in range(i - window, i + window + 1):
+                if j != i and not (lo[i] <= lo[j]):
+                    ok = False
+                    break
+            if ok:
+                minima[count] = i
+                count += 1
+
+        for k in range(count - 2):
+            left_shoulder, head, right_shoulder = minima[k], minima[k + 1], minima[k + 2]
+            if (head - left_shoulder < 10 or right_shoulder - head < 10 or
+                    right_shoulder - left_shoulder > max_span):
+                continue
+            if not (lo[left_shoulder] > lo[head] and lo[right_shoulder] > lo[head]):
+                continue
+            neckline = -np.inf
+            for j in range(left_shoulder, right_shoulder + 1):
+                if math.isnan(hi[j]):
+                    neckline = np.nan
+                    break
+                if hi[j] > neckline:
+                    neckline = hi[j]
+            if math.isnan(neckline):
+                continue
+            # 在右肩确认之后、下一个低点确认之前且不晚于右肩之后 breakout_bars 根K线寻找首次突破
+            confirmed = right_shoulder + window
+            end = minima[k + 3] + window if k + 3 < count else n
+            end = min(end, n, right_shoulder + breakout_bars + 1)
+            for j in range(confirmed, end):
+                if c[j] > neckline:
+                    result[s, j] = True
+                    break
+    return result
+
+@_jit
+def _v_bottom(close):
+    n_stocks, n = close.shape
+    result = np.zeros((n_stocks, n), dtype=np.bool_)
+    change_sum = np.empty(n)
+    for s in range(n_stocks):
+        c = close[s]
+        # 最近 5 日涨跌幅之和，窗口不完整或有缺失时为 NaN
+        for i in range(n):
+            if i < 5:
+                change_sum[i] = np.nan
+                continue
+            total = 0.0
+            for j in range(i - 4, i + 1):
+                total += c[j] / c[j - 1] - 1
+            change_sum[i] = total
+        for i in range(10, n):
+            if not (change_sum[i - 5] < -0.1 and change_sum[i] > 0.1):
+                continue
+            decline_angle = math.atan2(c[i - 5] - c[i - 10], 5)
+            rebound_angle = math.atan2(c[i] - c[i - 5], 5)
+            if abs(decline_angle + rebound_angle) < 0.2:
+                result[s, i] = True
+    return result
+
+def double_bottom(close: np.ndarray) -> np.ndarray:
+    """W底信号，与 DoubleBottomFilter 的 NumPy 实现一致"""
+    return _double_bottom(_by_stock(close)).T
+
+def head_shoulders(low: np.ndarray, high: np.ndarray, close: np.ndarray, window: int = 5,
+                   max_span: int = 60, breakout_bars: int = 20) -> np.ndarray:
+    """头肩底信号，与 HeadShouldersBottomFilter 的 NumPy 实现一致"""
+    return _head_shoulders(_by_stock(low), _by_stock(high), _by_stock(close),
+                           window, max_span, breakout_bars).T
+
+def v_bottom(close: np.ndarray) -> np.ndarray:
+    """V型底信号，与 VBottomFilter 的 NumPy 实现一致"""
+    return _v_bottom(_by_stock(close)).T
+
+def main():
+    """命令行：在合成面板上核对编译内核与 NumPy 实现的结果并比较耗时"""
+    from src.data.synthetic_provider import SyntheticProvider
+    from src.data.panel import load_panel
+    from .double_bottom_filter import DoubleBottomFilter
+    from .head_shoulders_bottom_filter import HeadShouldersBottomFilter
+    from .v_bottom_filter import VBottomFilter
+
+    parser = argparse.ArgumentParser(description="核对形态检测内核")
+    parser.add_argument('--stocks', type=int, default=500)
+    parser.add_argument('--days', type=int, default=750)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    provider = SyntheticProvider(stock_count=args.stocks, seed=args.seed)
+    dates = provider.recent_trade_dates(args.days)
+    bars = load_panel(provider, dates).bars
+    print(f"面板: {len(dates)} 个交易日 × {bars['close'].shape[1]} 只股票，numba: {HAVE_NUMBA}")
+
+    cases = [
+        ('W底', DoubleBottomFilter, lambda: double_bottom(bars['close'])),
+        ('头肩底', HeadShouldersBottomFilter, lambda: head_shoulders(bars['low'], bars['high'], bars['close'])),
+        ('V型底', VBottomFilter, lambda: v_bottom(bars['close'])),
+    ]
+    failed = False
+    for name, filter_class, kernel in cases:
+        filter_instance = filter_class(provider=provider)
+        start = time.perf_counter()
+        expected = filter_instance.numpy_signals(bars)
+        numpy_seconds = time.perf_counter() - start
+        kernel()  # 首次调用包含编译（或读取编译缓存）
+        start = time.perf_counter()
+        actual = kernel()
+        kernel_seconds = time.perf_counter() - start
+        mismatches = int((expected != actual).sum())
+        failed = failed or mismatches > 0
+        print(f"{name}: 信号 {int(expected.sum())} 个，不一致 {mismatches} 处，"
+              f"NumPy {numpy_seconds:.3f}秒，内核 {kernel_seconds:.3f}秒")
+    raise SystemExit(1 if failed else 0)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 from .base_kline_filter import BaseKlineFilter
+from ..base_filter import excess, strength
+from .vector_ops import candle_parts, shift
 import logging
 
 logger = logging.getLogger(__name__)
@@ -8,46 +10,56 @@ logger = logging.getLogger(__name__)
 class MorningStarFilter(BaseKlineFilter):
     """启明之星筛选器"""
     
-    def filter(self, stocks_df: pd.DataFrame) -> pd.DataFrame:
-        """执行启明之星筛选"""
-        logger.info("开始执行启明之星筛选，传入的股票数量：%d", len(stocks_df))
-        result_stocks = []
+    display_name = '启明之星'
+    pattern_bars = 3
+    
+    def detect(self, stock: pd.Series, kline_data: pd.DataFrame):
+        """检测启明之星形态"""
+        # 计算K线实体和影线
+        kline_data['body'] = kline_data['close'] - kline_data['open']
+        kline_data['upper_shadow'] = kline_data['high'] - kline_data[['open', 'close']].max(axis=1)
+        kline_data['lower_shadow'] = kline_data[['open', 'close']].min(axis=1) - kline_data['low']
         
-        for _, stock in stocks_df.iterrows():
-            try:
-                # 获取K线数据
-                kline_data = self.get_kline_data(stock['ts_code'])
-                logger.info("获取股票 %s 的K线数据成功，K线数据长度：%d", stock['ts_code'], len(kline_data))
-                if kline_data is None or len(kline_data) < self.lookback_period:
-                    continue
-                    
-                # 计算K线实体和影线
-                kline_data['body'] = kline_data['close'] - kline_data['open']
-                kline_data['upper_shadow'] = kline_data['high'] - kline_data[['open', 'close']].max(axis=1)
-                kline_data['lower_shadow'] = kline_data[['open', 'close']].min(axis=1) - kline_data['low']
+        # 寻找启明之星形态
+        for i in range(self.scan_start(len(kline_data), 2), len(kline_data)):
+            # 第一根K线：大阴线
+            if (kline_data['body'].iloc[i-2] < 0 and 
+                abs(kline_data['body'].iloc[i-2]) > kline_data['close'].iloc[i-2] * 0.02):
                 
-                # 寻找启明之星形态
-                for i in range(2, len(kline_data)):
-                    # 第一根K线：大阴线
-                    if (kline_data['body'].iloc[i-2] < 0 and 
-                        abs(kline_data['body'].iloc[i-2]) > kline_data['close'].iloc[i-2] * 0.02):
+                # 第二根K线：小实体
+                if (abs(kline_data['body'].iloc[i-1]) < kline_data['close'].iloc[i-1] * 0.01 and
+                    kline_data['lower_shadow'].iloc[i-1] > kline_data['body'].iloc[i-1] * 2):
+                    
+                    # 第三根K线：大阳线
+                    if (kline_data['body'].iloc[i] > 0 and
+                        kline_data['body'].iloc[i] > kline_data['close'].iloc[i] * 0.02 and
+                        kline_data['close'].iloc[i] > kline_data['open'].iloc[i-2]):
                         
-                        # 第二根K线：小实体
-                        if (abs(kline_data['body'].iloc[i-1]) < kline_data['close'].iloc[i-1] * 0.01 and
-                            kline_data['lower_shadow'].iloc[i-1] > kline_data['body'].iloc[i-1] * 2):
-                            
-                            # 第三根K线：大阳线
-                            if (kline_data['body'].iloc[i] > 0 and
-                                kline_data['body'].iloc[i] > kline_data['close'].iloc[i] * 0.02 and
-                                kline_data['close'].iloc[i] > kline_data['open'].iloc[i-2]):
-                                
-                                result_stocks.append(stock)
-                                logger.info("股票 %s 形成启明之星形态", stock['ts_code'])
-                                break
-                
-            except Exception as e:
-                logger.error("处理股票 %s 时出错: %s", stock['ts_code'], str(e))
-                continue
-        
-        logger.info("启明之星筛选完成，找到的股票数量：%d", len(result_stocks))
-        return pd.DataFrame(result_stocks) 
\ No newline at end of file
+                        logger.info("股票 %s 形成启明之星形态", stock['ts_code'])
+                        decline_pct = abs(kline_data['body'].iloc[i-2]) / kline_data['close'].iloc[i-2]
+                        rally_pct = kline_data['body'].iloc[i] / kline_data['close'].iloc[i]
+                        # 前后两根K线实体越大、中间K线实体越小、收盘越高于第一根开盘越强
+                        return {
+                            'score': strength(excess(decline_pct, 0.02, 0.06),
+                                              excess(abs(kline_data['body'].iloc[i-1]) / kline_data['close'].iloc[i-1],
+                                                     0.01, 0),
+                                              excess(rally_pct, 0.02, 0.06),
+                                              excess(kline_data['close'].iloc[i] / kline_data['open'].iloc[i-2] - 1,
+                                                     0, 0.03)),
+                            'rally_pct': round(rally_pct * 100, 2)
+                        }
+        return None
+
+    def signals(self, bars: dict) -> np.ndarray:
+        """向量化检测启明之星，与 detect 的判断条件一致"""
+        body, _, lower_shadow = candle_parts(bars)
+        first_body = shift(body, 2)
+        star_body = shift(body, 1)
+        with np.errstate(invalid='ignore'):
+            return ((first_body < 0) &
+                    (np.abs(first_body) > shift(bars['close'], 2) * 0.02) &
+                    (np.abs(star_body) < shift(bars['close'], 1) * 0.01) &
+                    (shift(lower_shadow, 1) > star_body * 2) &
+                    (body > 0) &
+                    (body > bars['close'] * 0.02) &
+                    (bars['close'] > shift(bars['open'], 2)))
@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 from .base_kline_filter import BaseKlineFilter
+from ..base_filter import excess, ratio, strength
+from .vector_ops import candle_parts, shift
 import logging
 
 logger = logging.getLogger(__name__)
@@ -8,47 +10,56 @@ logger = logging.getLogger(__name__)
 class RisingSunFilter(BaseKlineFilter):
     """旭日东升筛选器"""
     
-    def filter(self, stocks_df: pd.DataFrame) -> pd.DataFrame:
-        """执行旭日东升筛选"""
-        logger.info("开始执行旭日东升筛选，传入的股票数量：%d", len(stocks_df))
-        result_stocks = []
+    display_name = '旭日东升'
+    pattern_bars = 2
+    
+    def detect(self, stock: pd.Series, kline_data: pd.DataFrame):
+        """检测旭日东升形态"""
+        # 计算K线实体和影线
+        kline_data['body'] = kline_data['close'] - kline_data['open']
+        kline_data['upper_shadow'] = kline_data['high'] - kline_data[['open', 'close']].max(axis=1)
+        kline_data['lower_shadow'] = kline_data[['open', 'close']].min(axis=1) - kline_data['low']
         
-        for _, stock in stocks_df.iterrows():
-            try:
-                # 获取K线数据
-                kline_data = self.get_kline_data(stock['ts_code'])
-                logger.info("获取股票 %s 的K线数据成功，K线数据长度：%d", stock['ts_code'], len(kline_data))
-                if kline_data is None or len(kline_data) < self.lookback_period:
-                    continue
-                    
-                # 计算K线实体和影线
-                kline_data['body'] = kline_data['close'] - kline_data['open']
-                kline_data['upper_shadow'] = kline_data['high'] - kline_data[['open', 'close']].max(axis=1)
-                kline_data['lower_shadow'] = kline_data[['open', 'close']].min(axis=1) - kline_data['low']
-                
-                # 寻找旭日东升形态
-                for i in range(1, len(kline_data)):
-                    # 第一根K线：大阴线
-                    if (kline_data['body'].iloc[i-1] < 0 and
-                        abs(kline_data['body'].iloc[i-1]) > kline_data['close'].iloc[i-1] * 0.02):
-                        
-                        # 第二根K线：大阳线
-                        if (kline_data['body'].iloc[i] > 0 and
-                            kline_data['body'].iloc[i] > kline_data['close'].iloc[i] * 0.02 and
-                            kline_data['open'].iloc[i] < kline_data['close'].iloc[i-1] and
-                            kline_data['close'].iloc[i] > kline_data['open'].iloc[i-1]):
-                            
-                            # 检查成交量
-                            if kline_data['volume'].iloc[i] > kline_data['volume'].iloc[i-1] * 1.5:
-                                result_stocks.append(stock)
-                                logger.info("股票 %s 形成旭日东升形态，成交量放大：%.2f%%", 
-                                          stock['ts_code'],
-                                          (kline_data['volume'].iloc[i] / kline_data['volume'].iloc[i-1] - 1) * 100)
-                                break
+        # 寻找旭日东升形态
+        for i in range(self.scan_start(len(kline_data), 1), len(kline_data)):
+            # 第一根K线：大阴线
+            if (kline_data['body'].iloc[i-1] < 0 and
+                abs(kline_data['body'].iloc[i-1]) > kline_data['close'].iloc[i-1] * 0.02):
                 
-            except Exception as e:
-                logger.error("处理股票 %s 时出错: %s", stock['ts_code'], str(e))
-                continue
-        
-        logger.info("旭日东升筛选完成，找到的股票数量：%d", len(result_stocks))
-        return pd.DataFrame(result_stocks) 
\ No newline at end of file
+                # 第二根K线：大阳线
+                if (kline_data['body'].iloc[i] > 0 and
+                    kline_data['body'].iloc[i] > kline_data['close'].iloc[i] * 0.02 and
+                    kline_data['open'].iloc[i] < kline_data['close'].iloc[i-1] and
+                    kline_data['close'].iloc[i] > kline_data['open'].iloc[i-1]):
+                    
+                    # 检查成交量
+                    if kline_data['volume'].iloc[i] > kline_data['volume'].iloc[i-1] * 1.5:
+                        logger.info("股票 %s 形成旭日东升形态，成交量放大：%.2f%%", 
+                                  stock['ts_code'],
+                                  (kline_data['volume'].iloc[i] / kline_data['volume'].iloc[i-1] - 1) * 100)
+                        body_pct = kline_data['body'].iloc[i] / kline_data['close'].iloc[i]
+                        volume_ratio = ratio(kline_data['volume'].iloc[i], kline_data['volume'].iloc[i-1])
+                        # 阳线实体越大、收盘越高于前一日开盘、放量越多越强
+                        return {
+                            'score': strength(excess(body_pct, 0.02, 0.06),
+                                              excess(kline_data['close'].iloc[i] / kline_data['open'].iloc[i-1] - 1,
+                                                     0, 0.03),
+                                              excess(volume_ratio, 1.5, 3)),
+                            'body_pct': round(body_pct * 100, 2),
+                            'volume_ratio': round(volume_ratio, 2)
+                        }
+        return None
+
+    def signals(self, bars: dict) -> np.ndarray:
+        """向量化检测旭日东升，与 detect 的判断条件一致"""
+        body, _, _ = candle_parts(bars)
+        prev_body = shift(body, 1)
+        prev_close = shift(bars['close'], 1)
+        with np.errstate(invalid='ignore'):
+            return ((prev_body < 0) &
+                    (np.abs(prev_body) > prev_close * 0.02) &
+                    (body > 0) &
+                    (body > bars['close'] * 0.02) &
+                    (bars['open'] < prev_close) &
+                    (bars['close'] > shift(bars['open'], 1)) &
+                    (bars['volume'] > shift(bars['volume'], 1) * 1.5))
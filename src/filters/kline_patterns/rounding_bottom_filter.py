@@ -1,30 +1,49 @@
 import pandas as pd
 import numpy as np
 from .base_kline_filter import BaseKlineFilter
+from ..base_filter import excess, strength
 import logging
 from scipy.signal import argrelextrema
 from statsmodels.nonparametric.kernel_regression import KernelReg
 
 logger = logging.getLogger(__name__)
 
+# 各周期的回看K线数和长期均线周期（40 周、10 个月均线约与日线的 MA200 相当）
+TIMEFRAME_CONFIG = {'D': (480, 200), 'W': (200, 40), 'M': (120, 10)}
+
 class RoundingBottomFilter(BaseKlineFilter):
     """圆弧底筛选器"""
     
-    def __init__(self):
-        super().__init__(lookback_period=480)
+    display_name = '圆弧底'
+    # 形态总是在最近的窗口中检测，但需要足够长的历史计算 MA200
+    pattern_bars = 480
+    # 核回归拟合较慢，且需要约两年的数据
+    estimated_seconds = 2.0
+    estimated_pass_rate = 0.02
+    
+    def __init__(self, timeframe: str = 'D', **kwargs):
+        lookback_period, trend_ma = TIMEFRAME_CONFIG.get(timeframe, TIMEFRAME_CONFIG['D'])
+        super().__init__(lookback_period=lookback_period, timeframe=timeframe, **kwargs)
+        # 周线、月线需要的历史K线更少
+        self.pattern_bars = lookback_period
         self.config = {
-            'lookback_period': 480,    # 约2年交易日
-            'min_formation_days': 40,   # 最小形态形成天数
+            'lookback_period': lookback_period,    # 日线约2年交易日
+            'min_formation_days': 40,   # 最小形态形成K线数
             'min_r_squared': 0.75,     # 最小拟合优度
             'max_price_volatility': 0.03,  # 价格波动阈值
             'volume_increase_ratio': 1.5,  # 成交量放大倍数
-            'ma_periods': [20, 60, 200]    # 均线周期
+            'ma_periods': [p for p in (20, 60) if p < trend_ma] + [trend_ma],    # 均线周期
+            'trend_ma': trend_ma    # 判断突破的长期均线
         }
+        self.trend_column = f"ma{trend_ma}"
 
     def _calculate_moving_averages(self, data: pd.DataFrame) -> pd.DataFrame:
-        """计算多周期均线"""
+        """计算多周期均线，日线的均线由 calculate_indicators 读取特征库"""
+        if self.timeframe == 'D':
+            data = self.calculate_indicators(data)
         for period in self.config['ma_periods']:
-            data[f'MA{period}'] = data['close'].rolling(window=period).mean()
+            if f'ma{period}' not in data.columns:
+                data[f'ma{period}'] = data['close'].rolling(window=period).mean()
         return data
 
     def _check_volume_pattern(self, data: pd.DataFrame) -> bool:
@@ -51,52 +70,41 @@ class RoundingBottomFilter(BaseKlineFilter):
         
         return r2, minima, maxima
 
-    def filter(self, stocks_df: pd.DataFrame) -> pd.DataFrame:
-        """执行圆弧底筛选"""
-        logger.info("开始执行圆弧底筛选，传入的股票数量：%d", len(stocks_df))
-        result_stocks = []
+    def detect(self, stock: pd.Series, kline_data: pd.DataFrame):
+        """检测圆弧底形态"""
+        logger.info("分析股票 %s 的K线数据，数据长度：%d", stock['ts_code'], len(kline_data))
         
-        for _, stock in stocks_df.iterrows():
-            try:
-                kline_data = self.get_kline_data(stock['ts_code'])
-                if kline_data is None or len(kline_data) < self.config['lookback_period']:
-                    continue
-                
-                logger.info("分析股票 %s 的K线数据，数据长度：%d", stock['ts_code'], len(kline_data))
+        # 计算技术指标
+        kline_data = self._calculate_moving_averages(kline_data)
+        
+        # 在不同时间窗口中寻找形态
+        for window in range(self.config['min_formation_days'], 120, 20):
+            recent_data = kline_data.iloc[-window:]
+            
+            # 检测圆弧底形态
+            r2, minima, maxima = self._detect_rounding_pattern(recent_data)
+            
+            if (r2 > self.config['min_r_squared'] and 
+                len(minima) >= 2 and len(maxima) >= 1):
                 
-                # 计算技术指标
-                kline_data = self._calculate_moving_averages(kline_data)
+                # 验证价格突破
+                price_breakout = (recent_data['close'].iloc[-1] > 
+                                recent_data[self.trend_column].iloc[-1])
                 
-                # 在不同时间窗口中寻找形态
-                for window in range(self.config['min_formation_days'], 120, 20):
-                    recent_data = kline_data.iloc[-window:]
-                    
-                    # 检测圆弧底形态
-                    r2, minima, maxima = self._detect_rounding_pattern(recent_data)
-                    
-                    if (r2 > self.config['min_r_squared'] and 
-                        len(minima) >= 2 and len(maxima) >= 1):
-                        
-                        # 验证价格突破
-                        price_breakout = (recent_data['close'].iloc[-1] > 
-                                        recent_data['MA200'].iloc[-1])
-                        
-                        # 验证成交量特征
-                        volume_valid = self._check_volume_pattern(recent_data)
-                        
-                        if price_breakout and volume_valid:
-                            result_stocks.append({
-                                **stock.to_dict(),
-                                'r_squared': r2,
-                                'formation_days': window
-                            })
-                            logger.info("股票 %s 形成有效圆弧底形态，拟合度：%.2f，形成周期：%d", 
-                                      stock['ts_code'], r2, window)
-                            break
+                # 验证成交量特征
+                volume_valid = self._check_volume_pattern(recent_data)
                 
-            except Exception as e:
-                logger.error("处理股票 %s 时出错: %s", stock['ts_code'], str(e))
-                continue
-        
-        logger.info("圆弧底筛选完成，找到的股票数量：%d", len(result_stocks))
-        return pd.DataFrame(result_stocks) 
\ No newline at end of file
+                if price_breakout and volume_valid:
+                    logger.info("股票 %s 形成有效圆弧底形态，拟合度：%.2f，形成周期：%d", 
+                              stock['ts_code'], r2, window)
+                    ma_breakout = recent_data['close'].iloc[-1] / recent_data[self.trend_column].iloc[-1] - 1
+                    volume_ratio = recent_data['volume'].iloc[-20:].mean() / recent_data['volume'].iloc[:20].mean()
+                    # 拟合越好、站上长期均线越多、突破放量越多越强
+                    return {
+                        'score': strength(excess(r2, self.config['min_r_squared'], 1),
+                                          excess(ma_breakout, 0, 0.1),
+                                          excess(volume_ratio, self.config['volume_increase_ratio'], 3)),
+                        'r_squared': r2,
+                        'formation_days': window
+                    }
+        return None
@@ -0,0 +1,89 @@
+import pandas as pd
+from ...filters.base_filter import PerStockFilter
+from src.data.base_provider import DataProvider
+from src.data.provider_factory import get_provider
+from src.data.similarity import find_similar
+from src.utils.metrics import FILTER_STAGE_SECONDS, STOCKS_PROCESSED, observe_seconds
+from typing import Optional
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class SimilarityFilter(PerStockFilter):
+    """形态相似筛选器
+
+    横截面实现：在相似形态索引中查找最近一个窗口（默认 60 根日线）与参照K线形态最相似的股票，
+    只在候选列表内比较，保留距离最小的 top_n 只，评分为相似度（0-100）。
+    参照K线为 reference 中的股票代码和起止日期（见 src.data.similarity.find_similar），参照股票本身不在结果中。
+    窗口总是使用后复权收盘价并做 z 标准化，与价格高低和复权方式无关。
+    """
+
+    display_name = '形态相似'
+    cross_sectional = True
+    estimated_pass_rate = 0.01
+    # 索引常驻内存，单只股票的成本接近于零
+    estimated_seconds = 0.001
+    estimated_calls = 0.001
+
+    def __init__(self, reference: Optional[dict] = None, top_n: int = 50, min_score: float = 0.0,
+                 band: Optional[int] = None, provider: Optional[DataProvider] = None,
+                 recent_bars: Optional[int] = None, as_of: Optional[str] = None,
+                 timeframe: str = 'D', adjust: Optional[str] = None):
+        """
+        Args:
+            reference: 参照K线 {'ts_code': 股票代码, 'start_date': 起始日期, 'end_date': 结束日期}，
+                日期为空时取参照股票最近一个窗口
+            top_n: 保留最相似的股票数
+            min_score: 最低相似度评分
+            band: DTW 带宽，默认取配置 SIMILARITY_BAND，0 表示欧氏距离
+            provider: 数据提供者，默认按配置创建
+            recent_bars、adjust: 与K线形态筛选器统一创建，不使用
+            as_of: 评估日期（YYYYMMDD），默认为当天
+            timeframe: 只支持日线
+        """
+        if timeframe != 'D':
+            raise ValueError(f"{self.display_name}只支持日线")
+        self.reference = reference
+        self.top_n = top_n
+        self.min_score = min_score
+        self.band = band
+        self.provider = provider if provider is not None else get_provider()
+        self.recent_bars = recent_bars
+        self.as_of = as_of
+
+    def search(self, stocks_df: pd.DataFrame, top_n: int) -> pd.DataFrame:
+        """在候选股票中查找与参照K线最相似的 top_n 只，返回 ts_code/distance/score/window_end"""
+        if not self.reference or not self.reference.get('ts_code'):
+            raise ValueError(f"{self.display_name}需要指定参照K线的股票代码")
+        result, info = find_similar(self.provider, self.reference['ts_code'],
+                                    self.reference.get('start_date'), self.reference.get('end_date'),
+                                    top_n, self.band, codes=stocks_df['ts_code'], as_of=self.as_of)
+        logger.info(f"{self.display_name}：索引截至 {info['trade_date']}，{info['stats']['candidates']} 只候选中"
+                    f"计算 LB_Keogh {info['stats']['keogh']} 只、精确距离 {info['stats']['exact']} 只")
+        return result[result['score'] >= self.min_score]
+
+    def filter(self, stocks_df: pd.DataFrame) -> pd.DataFrame:
+        """对全部候选股票一次性查找，结果按相似度从高到低排列"""
+        logger.info("开始执行%s筛选，传入的股票数量：%d", self.display_name, len(stocks_df))
+        start_time = time.time()
+        name = type(self).__name__
+        with observe_seconds(FILTER_STAGE_SECONDS, name, 'compute'):
+            matched = self.search(stocks_df, self.top_n)
+
+        STOCKS_PROCESSED.labels(name, 'rejected').inc(len(stocks_df) - len(matched))
+        STOCKS_PROCESSED.labels(name, 'matched').inc(len(matched))
+        result = stocks_df.drop(columns=[col for col in matched.columns if col != 'ts_code' and col in stocks_df.columns])
+        result = matched.merge(result, on='ts_code')[list(result.columns) + ['distance', 'score', 'window_end']]
+        logger.info("%s筛选完成，耗时%.2f秒，找到的股票数量：%d", self.display_name,
+                    time.time() - start_time, len(result))
+        return result
+
+    def fetch_data(self, stock: pd.Series) -> Optional[pd.DataFrame]:
+        """该股票窗口与参照K线的距离，不在索引中时返回 None"""
+        result = self.search(stock.to_frame().T, 1)
+        return result if not result.empty else None
+
+    def detect(self, stock: pd.Series, data: pd.DataFrame):
+        """相似度不低于 min_score 时满足条件"""
+        return data.iloc[0][['distance', 'score', 'window_end']].to_dict()
@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 from .base_kline_filter import BaseKlineFilter
+from ..base_filter import excess, ratio, strength
+from .vector_ops import candle_parts, rolling_mean, shift
 import logging
 
 logger = logging.getLogger(__name__)
@@ -8,61 +10,74 @@ logger = logging.getLogger(__name__)
 class ThreeWhiteSoldiersFilter(BaseKlineFilter):
     """红三兵筛选器"""
     
-    def filter(self, stocks_df: pd.DataFrame) -> pd.DataFrame:
-        """执行红三兵筛选"""
-        logger.info("开始执行红三兵筛选，传入的股票数量：%d", len(stocks_df))
-        result_stocks = []
+    display_name = '红三兵'
+    pattern_bars = 3
+    
+    def detect(self, stock: pd.Series, kline_data: pd.DataFrame):
+        """检测红三兵形态"""
+        # 计算K线实体和影线
+        kline_data['body'] = kline_data['close'] - kline_data['open']
+        kline_data['body_size'] = abs(kline_data['body'])
+        kline_data['upper_shadow'] = kline_data['high'] - kline_data[['open', 'close']].max(axis=1)
+        kline_data['lower_shadow'] = kline_data[['open', 'close']].min(axis=1) - kline_data['low']
         
-        for _, stock in stocks_df.iterrows():
-            try:
-                # 获取K线数据
-                kline_data = self.get_kline_data(stock['ts_code'])
-                logger.info("获取股票 %s 的K线数据成功，K线数据长度：%d", stock['ts_code'], len(kline_data))
-                if kline_data is None or len(kline_data) < self.lookback_period:
-                    continue
-                    
-                # 计算K线实体和影线
-                kline_data['body'] = kline_data['close'] - kline_data['open']
-                kline_data['body_size'] = abs(kline_data['body'])
-                kline_data['upper_shadow'] = kline_data['high'] - kline_data[['open', 'close']].max(axis=1)
-                kline_data['lower_shadow'] = kline_data[['open', 'close']].min(axis=1) - kline_data['low']
+        # 寻找红三兵形态
+        for i in range(self.scan_start(len(kline_data), 2), len(kline_data)):
+            # 检查连续三根阳线（收盘价必须高于开盘价）
+            if not all(kline_data['close'].iloc[i-2:i+1] > kline_data['open'].iloc[i-2:i+1]):
+                continue
+            
+            # 检查每根阳线的实体大小（过滤掉十字星等微小实体）
+            avg_body = kline_data['body_size'].iloc[i-2:i+1].mean()
+            if not all(kline_data['body_size'].iloc[i-2:i+1] > avg_body * 0.5):
+                continue
                 
-                # 寻找红三兵形态
-                for i in range(2, len(kline_data)):
-                    # 检查连续三根阳线（收盘价必须高于开盘价）
-                    if not all(kline_data['close'].iloc[i-2:i+1] > kline_data['open'].iloc[i-2:i+1]):
-                        continue
-                    
-                    # 检查每根阳线的实体大小（过滤掉十字星等微小实体）
-                    avg_body = kline_data['body_size'].iloc[i-2:i+1].mean()
-                    if not all(kline_data['body_size'].iloc[i-2:i+1] > avg_body * 0.5):
-                        continue
-                        
-                    # 检查每根阳线的开盘价是否高于前一根阳线的开盘价
-                    if not (kline_data['open'].iloc[i] > kline_data['open'].iloc[i-1] > kline_data['open'].iloc[i-2]):
-                        continue
-                        
-                    # 检查每根阳线的收盘价是否高于前一根阳线的收盘价
-                    if not (kline_data['close'].iloc[i] > kline_data['close'].iloc[i-1] > kline_data['close'].iloc[i-2]):
-                        continue
-                        
-                    # 检查上影线不能过长（不超过实体的50%）
-                    if not all(kline_data['upper_shadow'].iloc[i-2:i+1] < kline_data['body_size'].iloc[i-2:i+1] * 0.5):
-                        continue
-                        
-                    # 检查成交量是否递增
-                    if (kline_data['volume'].iloc[i] > kline_data['volume'].iloc[i-1] and
-                        kline_data['volume'].iloc[i-1] > kline_data['volume'].iloc[i-2]):
-                        
-                        result_stocks.append(stock)
-                        logger.info("股票 %s 形成红三兵形态，成交量递增：%.2f%%", 
-                                  stock['ts_code'],
-                                  (kline_data['volume'].iloc[i] / kline_data['volume'].iloc[i-2] - 1) * 100)
-                        break
+            # 检查每根阳线的开盘价是否高于前一根阳线的开盘价
+            if not (kline_data['open'].iloc[i] > kline_data['open'].iloc[i-1] > kline_data['open'].iloc[i-2]):
+                continue
                 
-            except Exception as e:
-                logger.error("处理股票 %s 时出错: %s", stock['ts_code'], str(e))
+            # 检查每根阳线的收盘价是否高于前一根阳线的收盘价
+            if not (kline_data['close'].iloc[i] > kline_data['close'].iloc[i-1] > kline_data['close'].iloc[i-2]):
                 continue
-        
-        logger.info("红三兵筛选完成，找到的股票数量：%d", len(result_stocks))
-        return pd.DataFrame(result_stocks) 
\ No newline at end of file
+                
+            # 检查上影线不能过长（不超过实体的50%）
+            if not all(kline_data['upper_shadow'].iloc[i-2:i+1] < kline_data['body_size'].iloc[i-2:i+1] * 0.5):
+                continue
+                
+            # 检查成交量是否递增
+            if (kline_data['volume'].iloc[i] > kline_data['volume'].iloc[i-1] and
+                kline_data['volume'].iloc[i-1] > kline_data['volume'].iloc[i-2]):
+                
+                logger.info("股票 %s 形成红三兵形态，成交量递增：%.2f%%", 
+                          stock['ts_code'],
+                          (kline_data['volume'].iloc[i] / kline_data['volume'].iloc[i-2] - 1) * 100)
+                gain = kline_data['close'].iloc[i] / kline_data['open'].iloc[i-2] - 1
+                volume_ratio = ratio(kline_data['volume'].iloc[i], kline_data['volume'].iloc[i-2])
+                upper_ratio = max(ratio(kline_data['upper_shadow'].iloc[j], kline_data['body_size'].iloc[j])
+                                  for j in range(i - 2, i + 1))
+                # 三根阳线累计涨幅越大、成交量增长越多、上影线越短越强
+                return {
+                    'score': strength(excess(gain, 0, 0.08), excess(volume_ratio, 1, 2),
+                                      excess(upper_ratio, 0.5, 0)),
+                    'gain_pct': round(gain * 100, 2),
+                    'volume_ratio': round(volume_ratio, 2)
+                }
+        return None
+
+    def signals(self, bars: dict) -> np.ndarray:
+        """向量化检测红三兵，与 detect 的判断条件一致"""
+        body, upper_shadow, _ = candle_parts(bars)
+        body_size = np.abs(body)
+        avg_body = rolling_mean(body_size, 3)
+        opens = [shift(bars['open'], k) for k in (2, 1, 0)]
+        closes = [shift(bars['close'], k) for k in (2, 1, 0)]
+        volumes = [shift(bars['volume'], k) for k in (2, 1, 0)]
+        with np.errstate(invalid='ignore'):
+            result = ((opens[2] > opens[1]) & (opens[1] > opens[0]) &
+                      (closes[2] > closes[1]) & (closes[1] > closes[0]) &
+                      (volumes[2] > volumes[1]) & (volumes[1] > volumes[0]))
+            for k in range(3):
+                result &= ((shift(bars['close'], k) > shift(bars['open'], k)) &
+                           (shift(body_size, k) > avg_body * 0.5) &
+                           (shift(upper_shadow, k) < shift(body_size, k) * 0.5))
+        return result
@@ -1,6 +1,9 @@
 import pandas as pd
 import numpy as np
 from .base_kline_filter import BaseKlineFilter
+from ..base_filter import excess, strength
+from . import kernels
+from .vector_ops import pct_change, rolling_sum, shift
 import logging
 
 logger = logging.getLogger(__name__)
@@ -8,50 +11,61 @@ logger = logging.getLogger(__name__)
 class VBottomFilter(BaseKlineFilter):
     """V型底筛选器"""
     
-    def filter(self, stocks_df: pd.DataFrame) -> pd.DataFrame:
-        """执行V型底筛选"""
-        logger.info("开始执行V型底筛选，传入的股票数量：%d", len(stocks_df))
-        result_stocks = []
+    display_name = 'V型底'
+    pattern_bars = 16
+    estimated_pass_rate = 0.03
+    
+    def detect(self, stock: pd.Series, kline_data: pd.DataFrame):
+        """检测V型底形态"""
+        # 计算价格变化率
+        price_changes = kline_data['close'].pct_change()
         
-        for _, stock in stocks_df.iterrows():
-            try:
-                # 获取K线数据
-                kline_data = self.get_kline_data(stock['ts_code'])
-                logger.info("获取K线数据成功，K线数据长度：%d", len(kline_data))
-                if kline_data is None or len(kline_data) < self.lookback_period:
-                    continue
-                    
-                # 计算价格变化率
-                price_changes = kline_data['close'].pct_change()
-                
-                # 寻找急速下跌
-                rapid_decline = price_changes.rolling(5).sum() < -0.1
-                
-                # 寻找快速反弹
-                rapid_rebound = price_changes.rolling(5).sum() > 0.1
-                
-                # 判断V型底形态
-                for i in range(self.lookback_period - 10, len(kline_data) - 5):
-                    if rapid_decline.iloc[i] and rapid_rebound.iloc[i + 5]:
-                        # 计算V型底的角度
-                        decline_angle = np.arctan2(
-                            kline_data['close'].iloc[i] - kline_data['close'].iloc[i-5],
-                            5
-                        )
-                        rebound_angle = np.arctan2(
-                            kline_data['close'].iloc[i+5] - kline_data['close'].iloc[i],
-                            5
-                        )
-                        
-                        # 判断角度是否接近对称
-                        if abs(decline_angle + rebound_angle) < 0.2:
-                            result_stocks.append(stock)
-                            break
-                
-            except Exception as e:
-                logger.error(f"处理股票 {stock['ts_code']} 时出错: {str(e)}")
-                continue
+        # 寻找急速下跌
+        rapid_decline = price_changes.rolling(5).sum() < -0.1
+        
+        # 寻找快速反弹
+        rapid_rebound = price_changes.rolling(5).sum() > 0.1
         
-        logger.info("V型底筛选完成，找到的股票数量：%d", len(result_stocks))
+        # 判断V型底形态
+        # 形态在 i 处见底、在 i + 5 处完成反弹
+        for i in range(self.scan_start(len(kline_data), self.lookback_period - 10, offset=5), len(kline_data) - 5):
+            if rapid_decline.iloc[i] and rapid_rebound.iloc[i + 5]:
+                # 计算V型底的角度
+                decline_angle = np.arctan2(
+                    kline_data['close'].iloc[i] - kline_data['close'].iloc[i-5],
+                    5
+                )
+                rebound_angle = np.arctan2(
+                    kline_data['close'].iloc[i+5] - kline_data['close'].iloc[i],
+                    5
+                )
+                
+                # 判断角度是否接近对称
+                if abs(decline_angle + rebound_angle) < 0.2:
+                    decline = -price_changes.rolling(5).sum().iloc[i]
+                    rebound = price_changes.rolling(5).sum().iloc[i + 5]
+                    # 跌得越急、反弹越强、两边越对称越强
+                    return {
+                        'score': strength(excess(decline, 0.1, 0.25), excess(rebound, 0.1, 0.25),
+                                          excess(abs(decline_angle + rebound_angle), 0.2, 0)),
+                        'rebound_pct': round(rebound * 100, 2)
+                    }
+        return None
+
+    def signals(self, bars: dict) -> np.ndarray:
+        """检测V型底，信号位于反弹完成的K线（见底后第5根），安装了 numba 时使用编译内核"""
+        if kernels.enabled():
+            return kernels.v_bottom(bars['close'])
+        return self.numpy_signals(bars)
 
-        return pd.DataFrame(result_stocks) 
\ No newline at end of file
+    def numpy_signals(self, bars: dict) -> np.ndarray:
+        """V型底的 NumPy 向量化实现"""
+        close = bars['close']
+        change_sum = rolling_sum(pct_change(close), 5)
+        bottom_close = shift(close, 5)
+        decline_angle = np.arctan2(bottom_close - shift(close, 10), 5)
+        rebound_angle = np.arctan2(close - bottom_close, 5)
+        with np.errstate(invalid='ignore'):
+            return ((shift(change_sum, 5) < -0.1) &
+                    (change_sum > 0.1) &
+                    (np.abs(decline_angle + rebound_angle) < 0.2))
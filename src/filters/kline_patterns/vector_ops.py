@@ -0,0 +1,56 @@
+"""面板数据的向量化运算
+
+面板为形状 (交易日, 股票) 的二维数组，缺失值为 NaN。所有函数沿时间轴（axis 0）计算，
+窗口不完整或位移越界的位置填充 NaN，与 NaN 比较的结果为 False，因此不会产生误报。
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+def shift(values: np.ndarray, periods: int) -> np.ndarray:
+    """沿时间轴位移，periods > 0 时取前 periods 根K线的值"""
+    result = np.full(values.shape, np.nan)
+    if periods == 0:
+        return values.astype(float, copy=True)
+    if abs(periods) >= len(values):
+        return result
+    if periods > 0:
+        result[periods:] = values[:-periods]
+    else:
+        result[:periods] = values[-periods:]
+    return result
+
+def _rolling(values: np.ndarray, window: int, func) -> np.ndarray:
+    result = np.full(values.shape, np.nan)
+    if len(values) < window:
+        return result
+    windows = sliding_window_view(values, window, axis=0)
+    with np.errstate(invalid='ignore'):
+        result[window - 1:] = func(windows, axis=-1)
+    return result
+
+def rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    return _rolling(values, window, np.sum)
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    return _rolling(values, window, np.mean)
+
+def rolling_std(values: np.ndarray, window: int) -> np.ndarray:
+    """样本标准差（ddof=1），与 pandas 的 rolling().std() 一致"""
+    return _rolling(values, window, lambda w, axis: np.std(w, axis=axis, ddof=1))
+
+def rolling_min(values: np.ndarray, window: int) -> np.ndarray:
+    return _rolling(values, window, np.min)
+
+def rolling_max(values: np.ndarray, window: int) -> np.ndarray:
+    return _rolling(values, window, np.max)
+
+def candle_parts(bars: dict) -> tuple:
+    """计算K线实体、上影线和下影线"""
+    body = bars['close'] - bars['open']
+    upper_shadow = bars['high'] - np.maximum(bars['open'], bars['close'])
+    lower_shadow = np.minimum(bars['open'], bars['close']) - bars['low']
+    return body, upper_shadow, lower_shadow
+
+def pct_change(values: np.ndarray) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return values / shift(values, 1) - 1
@@ -1,28 +1,52 @@
 import pandas as pd
 import numpy as np
-from ...filters.base_filter import BaseFilter
-from src.utils.config import ts_api
-import talib
+from ...filters.base_filter import PerStockFilter
+from src.data.base_provider import DataProvider
+from src.data.provider_factory import get_provider
 import logging
+from typing import Optional
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
-class BasePriceFilter(BaseFilter):
+class BasePriceFilter(PerStockFilter):
     """基础价格形态筛选器"""
     
-    def __init__(self, lookback_period: int = 20):
+    def __init__(self, lookback_period: int = 20, provider: Optional[DataProvider] = None,
+                 recent_bars: Optional[int] = None, as_of: Optional[str] = None):
+        """
+        Args:
+            lookback_period: 回看的自然日数
+            provider: 数据提供者，默认按配置创建
+            recent_bars: 价格筛选只看最新数据，接受该参数以便与K线形态筛选器统一创建
+            as_of: 评估日期（YYYYMMDD），默认为当天
+        """
         self.lookback_period = lookback_period
+        self.provider = provider if provider is not None else get_provider()
+        self.recent_bars = recent_bars
+        self.as_of = as_of
+    
+    def get_end_date(self) -> datetime:
+        """评估日期"""
+        return datetime.strptime(self.as_of, '%Y%m%d') if self.as_of else datetime.now()
         
+    def fetch_data(self, stock: pd.Series) -> Optional[pd.DataFrame]:
+        """获取K线数据，长度不足 lookback_period 时返回 None"""
+        kline_data = self.get_kline_data(stock['ts_code'])
+        if kline_data is None or len(kline_data) < self.lookback_period:
+            return None
+        return kline_data
+
     def get_kline_data(self, stock_code: str) -> pd.DataFrame:
         """获取K线数据"""
         try:
             # 计算开始日期（往前推lookback_period个交易日）
-            end_date = datetime.now().strftime('%Y%m%d')
-            start_date = (datetime.now() - timedelta(days=self.lookback_period * 2)).strftime('%Y%m%d')
+            end = self.get_end_date()
+            end_date = end.strftime('%Y%m%d')
+            start_date = (end - timedelta(days=self.lookback_period * 2)).strftime('%Y%m%d')
             
             # 获取日线数据
-            df = ts_api.daily(
+            df = self.provider.daily(
                 ts_code=stock_code,
                 start_date=start_date,
                 end_date=end_date,
@@ -51,30 +75,3 @@ class BasePriceFilter(BaseFilter):
         except Exception as e:
             logger.error(f"获取股票 {stock_code} 的K线数据时出错: {str(e)}")
             return None
-            
-    def calculate_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
-        """计算技术指标"""
-        if df is None or len(df) == 0:
-            return df
-            
-        try:
-            # 计算涨跌幅
-            df['pct_change'] = df['close'].pct_change()
-            
-            # 计算振幅
-            df['amplitude'] = (df['high'] - df['low']) / df['close'].shift(1)
-            
-            # 计算换手率
-            df['turnover_rate'] = df['volume'] / df['volume'].rolling(window=20).mean()
-            
-            # 计算量比
-            df['volume_ratio'] = df['volume'] / df['volume'].rolling(window=5).mean()
-            
-            # 计算资金流向
-            df['money_flow'] = df['amount'] * (df['close'] - df['open']) / (df['high'] - df['low'])
-            
-            return df
-            
-        except Exception as e:
-            logger.error(f"计算技术指标时出错: {str(e)}")
-            return df 
\ No newline at end of file
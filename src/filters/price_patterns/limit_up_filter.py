@@ -1,70 +1,212 @@
 import pandas as pd
 import numpy as np
 from .base_price_filter import BasePriceFilter
+from ..kline_patterns.vector_ops import rolling_mean, shift
+from src.utils.metrics import FILTER_STAGE_SECONDS, STOCKS_PROCESSED, observe_seconds
+from typing import Optional
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# 各板块的涨跌幅限制
+BOARD_LIMITS = {'主板': 0.10, '创业板': 0.20, '科创板': 0.20, '北交所': 0.30, 'CDR': 0.10}
+# 主板 ST 股票的涨跌幅限制（创业板、科创板的 ST 股票与普通股票相同）
+ST_LIMIT = 0.05
+# 涨幅距涨停不超过该幅度时视为接近涨停（主板即 9.5%）
+NEAR_LIMIT_GAP = 0.005
+# ST 股票名称的前缀：ST、*ST，以及尚未股改的 SST、S*ST
+ST_PATTERN = r'(?:\*|S\*?)?ST'
+
 class LimitUpFilter(BasePriceFilter):
-    """可能涨停筛选器"""
-    
+    """可能涨停筛选器
+
+    横截面实现：一次获取评估日全市场的日线和每日指标（前收盘价缺失时再取前一交易日的日线），
+    按板块和 ST 状态确定每只股票的涨跌幅限制，把 8 个条件作为列运算对全部候选股票一起判断。
+    量比和换手率（%）直接使用每日指标。同一个筛选器实例只获取一次数据，
+    执行计划在逐只股票筛选之前对整个候选列表调用 filter。
+    """
+
+    display_name = '可能涨停'
+    cross_sectional = True
+    estimated_pass_rate = 0.01
+    # 全市场数据只获取一次，单只股票的成本接近于零
+    estimated_seconds = 0.001
+    estimated_calls = 0.001
+    # 向量化检测所需的K线数量（没有量比时使用5日均量）
+    pattern_bars = 5
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._session: Optional[pd.DataFrame] = None
+        self.trade_date: Optional[str] = None
+
+    @staticmethod
+    def board_limits(stocks_df: pd.DataFrame) -> pd.Series:
+        """按板块（market）和名称前缀的 ST 标记确定涨跌幅限制"""
+        limits = stocks_df['market'].map(BOARD_LIMITS).fillna(BOARD_LIMITS['主板'])
+        is_st = stocks_df['name'].fillna('').str.strip().str.upper().str.match(ST_PATTERN)
+        return limits.where(~(is_st & (stocks_df['market'] == '主板')), ST_LIMIT)
+
+    def session_table(self) -> pd.DataFrame:
+        """评估日全市场的行情与每日指标，按 ts_code 索引，同一实例只获取一次"""
+        if self._session is not None:
+            return self._session
+
+        end_date = self.get_end_date().strftime('%Y%m%d')
+        # 当天收盘数据可能尚未发布，依次往前找最近一个有数据的交易日
+        trade_dates = self.provider.recent_trade_dates(3, end_date)
+        daily = pd.DataFrame()
+        for trade_date in reversed(trade_dates):
+            daily = self.provider.daily(trade_date=trade_date,
+                                        fields='ts_code,trade_date,open,high,low,close,pre_close,vol,amount')
+            if daily is not None and not daily.empty:
+                self.trade_date = trade_date
+                break
+        if daily is None or daily.empty:
+            logger.warning(f"{end_date} 之前的最近交易日没有行情数据")
+            self._session = pd.DataFrame()
+            return self._session
+
+        table = daily.set_index('ts_code')
+        if 'pre_close' not in table.columns or table['pre_close'].isna().all():
+            previous = [d for d in trade_dates if d < self.trade_date]
+            prev = self.provider.daily(trade_date=previous[-1], fields='ts_code,close') if previous else None
+            table['pre_close'] = prev.set_index('ts_code')['close'] if prev is not None and not prev.empty else np.nan
+
+        basic = self.provider.daily_basic(trade_date=self.trade_date,
+                                          fields='ts_code,turnover_rate,volume_ratio')
+        if basic is not None and not basic.empty:
+            table = table.join(basic.set_index('ts_code')[['turnover_rate', 'volume_ratio']])
+        else:
+            table['turnover_rate'] = np.nan
+            table['volume_ratio'] = np.nan
+        self._session = table
+        logger.info(f"涨停筛选使用 {self.trade_date} 的行情，共 {len(table)} 只股票")
+        return self._session
+
+    def evaluate_frame(self, frame: pd.DataFrame) -> pd.Series:
+        """对合并了行情的候选股票逐列判断 8 个条件，返回是否满足的布尔序列"""
+        limit = self.board_limits(frame)
+        pct_change = frame['close'] / frame['pre_close'] - 1
+        amplitude = (frame['high'] - frame['low']) / frame['pre_close']
+        money_flow = frame['amount'] * (frame['close'] - frame['open']) / (frame['high'] - frame['low'])
+
+        # 与逐只股票的判断一样，条件写成“不满足时淘汰”，指标缺失时不淘汰
+        return (
+            frame['close'].notna() &
+            # 1. 当日涨幅接近涨停（主板 9.5%，创业板/科创板 19.5%，主板 ST 4.5%）
+            ~(pct_change < limit - NEAR_LIMIT_GAP) &
+            # 2. 当日振幅较大（超过5%）
+            ~(amplitude < 0.05) &
+            # 3. 成交量放大（量比大于2）
+            ~(frame['volume_ratio'] < 2) &
+            # 4. 换手率较高（超过5%）
+            ~(frame['turnover_rate'] < 5) &
+            # 5. 资金流向为正
+            ~(money_flow <= 0) &
+            # 6. 开盘价低于收盘价（阳线）
+            ~(frame['open'] >= frame['close']) &
+            # 7. 收盘价接近最高价（上影线短）
+            ~((frame['high'] - frame['close']) / (frame['high'] - frame['low']) > 0.2) &
+            # 8. 前一日收盘价低于当日开盘价（跳空高开）
+            ~(frame['pre_close'] >= frame['open'])
+        )
+
+    def _join_session(self, stocks_df: pd.DataFrame) -> pd.DataFrame:
+        """候选股票的板块、名称与评估日行情合并，停牌或无数据的股票不在结果中"""
+        table = self.session_table()
+        if table.empty:
+            return pd.DataFrame()
+        columns = ['open', 'high', 'low', 'close', 'pre_close', 'amount', 'turnover_rate', 'volume_ratio']
+        return stocks_df[['ts_code', 'market', 'name']].join(table[columns], on='ts_code', how='inner')
+
+    def score_frame(self, frame: pd.DataFrame) -> pd.Series:
+        """强度评分（0-100）：涨幅越接近涨停、量比和换手率越高、收盘越接近最高价越强"""
+        limit = self.board_limits(frame)
+        pct_change = frame['close'] / frame['pre_close'] - 1
+        upper_ratio = (frame['high'] - frame['close']) / (frame['high'] - frame['low'])
+
+        def excess_column(values: pd.Series, threshold, full) -> np.ndarray:
+            return np.nan_to_num(np.clip((values - threshold) / (full - threshold), 0, 1).to_numpy(dtype=float))
+
+        components = [
+            excess_column(pct_change, limit - NEAR_LIMIT_GAP, limit),
+            excess_column(frame['volume_ratio'], 2, 5),
+            excess_column(frame['turnover_rate'], 5, 15),
+            excess_column(upper_ratio, 0.2, 0),
+        ]
+        return pd.Series((np.mean(components, axis=0) * 100).round(1), index=frame.index)
+
+    def _extra_fields(self, frame: pd.DataFrame) -> pd.DataFrame:
+        return pd.DataFrame({
+            'limit_pct': (self.board_limits(frame) * 100).round(1).to_numpy(),
+            'limit_date': self.trade_date,
+            'score': self.score_frame(frame).to_numpy()
+        }, index=frame.index)
+
     def filter(self, stocks_df: pd.DataFrame) -> pd.DataFrame:
-        """执行可能涨停筛选"""
-        logger.info("开始执行可能涨停筛选，传入的股票数量：%d", len(stocks_df))
-        result_stocks = []
-        
-        for _, stock in stocks_df.iterrows():
-            try:
-                # 获取K线数据
-                kline_data = self.get_kline_data(stock['ts_code'])
-                if kline_data is None or len(kline_data) < self.lookback_period:
-                    continue
-                    
-                # 计算技术指标
-                kline_data = self.calculate_indicators(kline_data)
-                
-                # 获取最新数据
-                latest = kline_data.iloc[-1]
-                prev = kline_data.iloc[-2]
-                
-                # 检查是否满足涨停条件
-                # 1. 当日涨幅接近涨停（9.5%以上）
-                if latest['pct_change'] < 0.095:
-                    continue
-                    
-                # 2. 当日振幅较大（超过5%）
-                if latest['amplitude'] < 0.05:
-                    continue
-                    
-                # 3. 成交量放大（量比大于2）
-                if latest['volume_ratio'] < 2:
-                    continue
-                    
-                # 4. 换手率较高（超过5%）
-                if latest['turnover_rate'] < 0.05:
-                    continue
-                    
-                # 5. 资金流向为正
-                if latest['money_flow'] <= 0:
-                    continue
-                    
-                # 6. 开盘价低于收盘价（阳线）
-                if latest['open'] >= latest['close']:
-                    continue
-                    
-                # 7. 收盘价接近最高价（上影线短）
-                if (latest['high'] - latest['close']) / (latest['high'] - latest['low']) > 0.2:
-                    continue
-                    
-                # 8. 前一日收盘价低于当日开盘价（跳空高开）
-                if prev['close'] >= latest['open']:
-                    continue
-                    
-                result_stocks.append(stock)
-                
-            except Exception as e:
-                logger.error(f"处理股票 {stock['ts_code']} 时出错: {str(e)}")
-                continue
-        
-        logger.info("可能涨停筛选完成，找到的股票数量：%d", len(result_stocks))
-        return pd.DataFrame(result_stocks) 
\ No newline at end of file
+        """对全部候选股票一次性判断"""
+        logger.info("开始执行%s筛选，传入的股票数量：%d", self.display_name, len(stocks_df))
+        start_time = time.time()
+        name = type(self).__name__
+        with observe_seconds(FILTER_STAGE_SECONDS, name, 'fetch'):
+            frame = self._join_session(stocks_df)
+        if frame.empty:
+            STOCKS_PROCESSED.labels(name, 'skipped').inc(len(stocks_df))
+            return stocks_df.iloc[:0]
+        with observe_seconds(FILTER_STAGE_SECONDS, name, 'compute'):
+            matched = frame[self.evaluate_frame(frame)]
+
+        STOCKS_PROCESSED.labels(name, 'skipped').inc(len(stocks_df) - len(frame))
+        STOCKS_PROCESSED.labels(name, 'rejected').inc(len(frame) - len(matched))
+        STOCKS_PROCESSED.labels(name, 'matched').inc(len(matched))
+        extra = self._extra_fields(matched)
+        result = stocks_df.drop(columns=[col for col in extra.columns if col in stocks_df.columns])
+        result = result.merge(extra.assign(ts_code=matched['ts_code'].to_numpy()), on='ts_code')
+        logger.info("%s筛选完成，耗时%.2f秒，找到的股票数量：%d", self.display_name,
+                    time.time() - start_time, len(result))
+        return result
+
+    def fetch_data(self, stock: pd.Series) -> Optional[pd.DataFrame]:
+        """从评估日的全市场数据中取出该股票并合并板块、名称"""
+        frame = self._join_session(stock.to_frame().T)
+        return frame if not frame.empty else None
+
+    def detect(self, stock: pd.Series, frame: pd.DataFrame):
+        """检查是否满足涨停条件"""
+        if not self.evaluate_frame(frame).iloc[0]:
+            return None
+        logger.info("股票 %s 可能涨停", stock['ts_code'])
+        return self._extra_fields(frame).iloc[0].to_dict()
+
+    def signals(self, bars: dict) -> np.ndarray:
+        """在 (交易日, 股票) 面板上向量化检测，用于盘中实时筛选
+
+        bars 需要 open/high/low/close/volume/amount 字段，可选 limit 字段（每只股票的涨跌幅限制，
+        缺省按 10%）和 volume_ratio、turnover_rate 字段（量比、换手率（%），与每日指标的定义相同）。
+        没有量比时用成交量相对 5 日均量代替；没有换手率时不判断换手率条件，与横截面筛选中指标缺失时一样。
+        当天没有行情的股票不会被选中。
+        """
+        open_, high, low, close = bars['open'], bars['high'], bars['low'], bars['close']
+        volume = bars['volume']
+        limit = bars.get('limit', BOARD_LIMITS['主板'])
+        turnover_rate = bars.get('turnover_rate', np.nan)
+        prev_close = shift(close, 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pct_change = close / prev_close - 1
+            amplitude = (high - low) / prev_close
+            volume_ratio = bars['volume_ratio'] if 'volume_ratio' in bars else volume / rolling_mean(volume, 5)
+            money_flow = bars['amount'] * (close - open_) / (high - low)
+            upper_ratio = (high - close) / (high - low)
+
+            # 条件写成“不满足时淘汰”，指标为 NaN 时不淘汰
+            return (~np.isnan(close) & ~np.isnan(prev_close) &
+                    ~(pct_change < limit - NEAR_LIMIT_GAP) &
+                    ~(amplitude < 0.05) &
+                    ~(volume_ratio < 2) &
+                    ~(turnover_rate < 5) &
+                    ~(money_flow <= 0) &
+                    ~(open_ >= close) &
+                    ~(upper_ratio > 0.2) &
+                    ~(prev_close >= open_))
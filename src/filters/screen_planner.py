@@ -0,0 +1,414 @@
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from functools import lru_cache
+import pandas as pd
+import logging
+import heapq
+import json
+import os
+import threading
+import time
+from .base_filter import PerStockFilter
+from .checkpoint import ScreenCheckpoint
+from src.data.base_provider import track_usage
+from src.api.config import get_settings
+from src.utils import cancellation
+
+logger = logging.getLogger(__name__)
+
+class FilterStats:
+    """单个筛选器的成本与通过率估计"""
+
+    def __init__(self, seconds: float, calls: float, pass_rate: float, samples: int = 0):
+        self.seconds = seconds      # 单只股票平均耗时（秒）
+        self.calls = calls          # 单只股票平均上游调用次数
+        self.pass_rate = pass_rate  # 通过率
+        self.samples = samples      # 累计观测的股票数
+
+    @classmethod
+    def from_filter(cls, filter_instance: PerStockFilter) -> 'FilterStats':
+        return cls(filter_instance.estimated_seconds,
+                   filter_instance.estimated_calls,
+                   filter_instance.estimated_pass_rate)
+
+    def update(self, processed: int, passed: int, seconds: float, calls: int):
+        """用一次运行的实际统计更新估计（按样本量加权的指数平均）"""
+        if processed <= 0:
+            return
+        alpha = min(0.5, processed / (processed + 100))
+        if self.samples == 0:
+            alpha = 1.0
+        self.seconds += alpha * (seconds / processed - self.seconds)
+        self.calls += alpha * (calls / processed - self.calls)
+        self.pass_rate += alpha * (passed / processed - self.pass_rate)
+        self.samples += processed
+
+    def rank(self) -> float:
+        """排序代价：越便宜、淘汰越多的筛选器越靠前"""
+        return self.seconds / max(1.0 - self.pass_rate, 1e-3)
+
+    def to_dict(self) -> dict:
+        return {
+            'seconds': self.seconds,
+            'calls': self.calls,
+            'pass_rate': self.pass_rate,
+            'samples': self.samples
+        }
+
+class _RunCounter:
+    """一次运行中单个筛选器的实际统计"""
+
+    def __init__(self):
+        self.processed = 0
+        self.passed = 0
+        self.seconds = 0.0
+        self.calls = 0
+
+class ScreenOutcome:
+    """一次筛选的完成情况
+
+    undecided 为重试后仍因上游调用失败而未能判断的股票。不为空时结果不完整：
+    调用方不应缓存结果或把候选当作已全部处理，检查点会保留，以相同条件再次筛选时只需判断这些股票。
+    """
+
+    def __init__(self):
+        self.undecided: List[str] = []
+
+    @property
+    def incomplete(self) -> bool:
+        return bool(self.undecided)
+
+class ScreenPlanner:
+    """基于成本的筛选执行计划
+
+    多个形态/价格筛选器之间是“与”的关系。计划器为每个筛选器维护单只股票耗时、
+    上游调用次数和通过率的估计（先验来自筛选器的 estimated_* 属性，之后由实际运行更新并持久化），
+    按 耗时 / (1 - 通过率) 从小到大排序，然后逐只股票依次执行，
+    某个筛选器不通过就跳过后面的筛选器。
+    """
+
+    # 因上游调用失败而无法判断的股票最多重试的轮数，以及每轮之前至少等待的秒数
+    retry_rounds = 2
+    retry_delay = 5.0
+
+    def __init__(self, stats_path: Optional[str] = None):
+        self.stats_path = stats_path
+        self._stats: Dict[str, FilterStats] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def _key(filter_instance: PerStockFilter) -> str:
+        return type(filter_instance).__name__
+
+    def _load(self):
+        if not self.stats_path or not os.path.exists(self.stats_path):
+            return
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._stats = {key: FilterStats(**value) for key, value in data.items()}
+        except Exception as e:
+            logger.error(f"读取筛选器统计失败: {str(e)}")
+
+    def _save(self):
+        if not self.stats_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.stats_path) or '.', exist_ok=True)
+            tmp_path = f"{self.stats_path}.tmp-{os.getpid()}"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({key: stats.to_dict() for key, stats in self._stats.items()},
+                          f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.stats_path)
+        except Exception as e:
+            logger.error(f"保存筛选器统计失败: {str(e)}")
+
+    def stats_for(self, filter_instance: PerStockFilter) -> FilterStats:
+        key = self._key(filter_instance)
+        with self._lock:
+            if key not in self._stats:
+                self._stats[key] = FilterStats.from_filter(filter_instance)
+            return self._stats[key]
+
+    def plan(self, filters: List[PerStockFilter]) -> List[PerStockFilter]:
+        """返回按排序代价排列的筛选器，整体处理候选列表的筛选器总是排在最前面"""
+        return sorted(filters, key=lambda f: (not f.cross_sectional, self.stats_for(f).rank()))
+
+    def explain(self, filters: List[PerStockFilter], candidate_count: int) -> dict:
+        """估算执行计划，不访问任何数据"""
+        steps = []
+        remaining = float(candidate_count)
+        total_calls = 0.0
+        total_seconds = 0.0
+        for order, filter_instance in enumerate(self.plan(filters), start=1):
+            stats = self.stats_for(filter_instance)
+            calls = remaining * stats.calls
+            seconds = remaining * stats.seconds
+            steps.append({
+                'order': order,
+                'filter': filter_instance.display_name or self._key(filter_instance),
+                'stocks_in': round(remaining),
+                'seconds_per_stock': round(stats.seconds, 4),
+                'calls_per_stock': round(stats.calls, 3),
+                'pass_rate': round(stats.pass_rate, 4),
+                'estimated_calls': round(calls),
+                'estimated_seconds': round(seconds, 1),
+                'samples': stats.samples
+            })
+            total_calls += calls
+            total_seconds += seconds
+            remaining *= stats.pass_rate
+        return {
+            'candidates': candidate_count,
+            'steps': steps,
+            'estimated_matches': round(remaining),
+            'estimated_calls': round(total_calls),
+            'estimated_seconds': round(total_seconds, 1)
+        }
+
+    def _apply_cross_sectional(self, stocks_df: pd.DataFrame, filter_instance: PerStockFilter,
+                               counter: _RunCounter) -> Optional[pd.DataFrame]:
+        """对整个候选列表执行一个横截面筛选器
+
+        执行期间有上游调用失败（重试用尽或熔断）时返回 None，不能当作没有股票满足条件
+        （筛选器内部吞掉了错误时结果也可能缺少股票）；其他错误（如参数错误、缺少数据列）直接抛出。
+        """
+        start = time.perf_counter()
+        with track_usage() as usage:
+            try:
+                result = filter_instance.filter(stocks_df)
+            except Exception as e:
+                if not usage.failures:
+                    raise
+                logger.error("%s筛选因上游调用失败未能完成: %s", filter_instance.display_name, str(e))
+                return None
+            finally:
+                counter.seconds += time.perf_counter() - start
+                counter.calls += usage.calls
+        if usage.failures:
+            logger.error("%s筛选期间有上游调用失败，结果可能不完整", filter_instance.display_name)
+            return None
+        counter.processed += len(stocks_df)
+        counter.passed += len(result)
+        return result
+
+    def _retry_delay(self, providers) -> float:
+        """重试之前等待的秒数：至少 retry_delay，上游熔断时等到恢复"""
+        return max([self.retry_delay] + [provider.retry_after() for provider in providers])
+
+    @staticmethod
+    def _wait(delay: float, stop: Optional[threading.Event]) -> bool:
+        """等待 delay 秒，期间被停止时返回 False（请求被取消时抛出 Cancelled）"""
+        if stop is None:
+            cancellation.sleep(delay)
+            return True
+        return not stop.wait(delay)
+
+    def _evaluate_stock(self, stock: pd.Series, per_stock: List[PerStockFilter],
+                        counters: Dict[str, _RunCounter]) -> Tuple[Optional[dict], bool]:
+        """对单只股票依次执行逐只股票的筛选器
+
+        Returns:
+            (结果行或 None, 是否因上游调用失败而无法判断)
+            结果行的 score 为各筛选器强度评分的平均（含横截面筛选器已附加的评分）
+        """
+        result = stock.to_dict()
+        scores = [result.pop('score')] if pd.notna(result.get('score')) else []
+        for filter_instance in per_stock:
+            counter = counters[self._key(filter_instance)]
+            start = time.perf_counter()
+            # 只统计本线程为这只股票发出的调用，并发的其他筛选的失败不会算到这只股票上
+            with track_usage() as usage:
+                try:
+                    matched = filter_instance.evaluate(stock)
+                except Exception as e:
+                    logger.error("处理股票 %s 时出错: %s", stock['ts_code'], str(e))
+                    matched = None
+            counter.seconds += time.perf_counter() - start
+            counter.calls += usage.calls
+            if matched is None and usage.failures:
+                # 数据没取到，不能当作不满足条件，也不计入通过率统计
+                return None, True
+            counter.processed += 1
+            if matched is None:
+                return None, False
+            counter.passed += 1
+            matched = dict(matched)
+            score = matched.pop('score', None)
+            if score is not None:
+                scores.append(score)
+            result.update(matched)
+        if scores:
+            result['score'] = round(sum(scores) / len(scores), 1)
+        return result, False
+
+    def iter_matches(self, stocks_df: pd.DataFrame, filters: List[PerStockFilter],
+                     progress: Optional[Callable[[int, int], None]] = None,
+                     stop: Optional[threading.Event] = None,
+                     checkpoint: Optional[ScreenCheckpoint] = None,
+                     outcome: Optional[ScreenOutcome] = None) -> Iterator[dict]:
+        """按计划执行筛选器，依次产出满足全部条件的结果行
+
+        横截面筛选器先对整个候选列表执行（因上游调用失败出错时同样重试，仍失败时全部候选记为未能判断），
+        其余筛选器再逐只股票执行。
+        因上游调用失败（重试用尽或熔断）而无法判断的股票放到最后重试，最多 retry_rounds 轮，
+        每轮之前等待上游恢复。
+
+        Args:
+            progress: 每处理完一只股票调用一次 progress(已处理数, 总数)
+            stop: 设置后在处理下一只股票之前停止（返回已找到的部分结果）
+            checkpoint: 进度检查点；存在已保存的进度时先产出其中的结果并跳过已处理的股票，
+                未正常完成（停止、取消、出错或仍有股票无法判断）时保存进度，完成后删除；
+                执行期间锁定，已被相同条件的另一次筛选锁定时本次不使用检查点
+            outcome: 处理完全部候选后记录仍未能判断的股票（见 ScreenOutcome）
+
+        在请求中执行时（见 src.utils.cancellation），当前请求被取消后在处理下一只股票之前抛出 Cancelled。
+        """
+        ordered = self.plan(filters)
+        counters = {self._key(f): _RunCounter() for f in ordered}
+        logger.info("筛选执行计划: %s", ' -> '.join(f.display_name or self._key(f) for f in ordered))
+        per_stock = [f for f in ordered if not f.cross_sectional]
+        providers = {id(f.provider): f.provider for f in per_stock}.values()
+
+        if checkpoint is not None and not checkpoint.acquire():
+            # 相同条件的另一次筛选正在使用这个检查点，两边同时读写会互相覆盖进度
+            logger.warning("相同条件的筛选正在执行，本次不使用检查点 %s", checkpoint.path)
+            checkpoint = None
+
+        completed = False
+        try:
+            for filter_instance in ordered:
+                if not filter_instance.cross_sectional or stocks_df.empty:
+                    continue
+                result = None
+                for retry_round in range(self.retry_rounds + 1):
+                    if retry_round > 0:
+                        delay = self._retry_delay([filter_instance.provider])
+                        logger.warning("%s筛选%.0f秒后第 %d 轮重试", filter_instance.display_name,
+                                       delay, retry_round)
+                        if not self._wait(delay, stop):
+                            logger.info("筛选已停止")
+                            return
+                    result = self._apply_cross_sectional(stocks_df, filter_instance,
+                                                         counters[self._key(filter_instance)])
+                    if result is not None:
+                        break
+                if result is None:
+                    # 横截面筛选器没有完成时无法判断任何候选，保留检查点，以相同条件再次筛选时重新执行
+                    logger.error("%s筛选重试后仍因上游调用失败未能完成", filter_instance.display_name)
+                    if outcome is not None:
+                        outcome.undecided = stocks_df['ts_code'].tolist()
+                    return
+                stocks_df = result
+
+            total = len(stocks_df)
+            processed = 0
+            done = set()
+            if checkpoint is not None and checkpoint.load():
+                codes = set(stocks_df['ts_code']) if total else set()
+                done = checkpoint.processed & codes
+                processed = len(done)
+                for result in checkpoint.matches:
+                    if result.get('ts_code') in codes:
+                        yield result
+            if progress is not None:
+                progress(processed, total)
+
+            pending = [stock for _, stock in stocks_df.iterrows() if stock['ts_code'] not in done]
+            for retry_round in range(self.retry_rounds + 1):
+                if retry_round > 0:
+                    delay = self._retry_delay(providers)
+                    logger.warning("%d 只股票因上游调用失败未能判断，%.0f秒后第 %d 轮重试",
+                                   len(pending), delay, retry_round)
+                    if not self._wait(delay, stop):
+                        logger.info("筛选已停止，处理了 %d/%d 只股票", processed, total)
+                        return
+                failed = []
+                for stock in pending:
+                    if stop is not None and stop.is_set():
+                        logger.info("筛选已停止，处理了 %d/%d 只股票", processed, total)
+                        return
+                    cancellation.check()
+                    result, upstream_failed = self._evaluate_stock(stock, per_stock, counters)
+                    if upstream_failed:
+                        failed.append(stock)
+                        continue
+                    processed += 1
+                    if checkpoint is not None:
+                        checkpoint.record(stock['ts_code'], result)
+                    if progress is not None:
+                        progress(processed, total)
+                    if result is not None:
+                        yield result
+                pending = failed
+                if not pending:
+                    break
+
+            if pending:
+                # 保留检查点，再次执行相同的筛选时只需处理这些股票
+                logger.error("%d 只股票重试后仍因上游调用失败未能判断: %s", len(pending),
+                             ', '.join(stock['ts_code'] for stock in pending[:20]))
+                if outcome is not None:
+                    outcome.undecided = [stock['ts_code'] for stock in pending]
+            completed = not pending
+        finally:
+            if checkpoint is not None:
+                if completed:
+                    checkpoint.clear()
+                else:
+                    checkpoint.save()
+                checkpoint.release()
+            self._record(ordered, counters)
+
+    def run(self, stocks_df: pd.DataFrame, filters: List[PerStockFilter],
+            checkpoint: Optional[ScreenCheckpoint] = None,
+            outcome: Optional[ScreenOutcome] = None) -> pd.DataFrame:
+        """执行筛选并返回全部结果"""
+        return pd.DataFrame(list(self.iter_matches(stocks_df, filters, checkpoint=checkpoint,
+                                                   outcome=outcome)))
+
+    def top_matches(self, stocks_df: pd.DataFrame, filters: List[PerStockFilter], k: int,
+                    checkpoint: Optional[ScreenCheckpoint] = None,
+                    stop: Optional[threading.Event] = None,
+                    outcome: Optional[ScreenOutcome] = None) -> List[dict]:
+        """执行筛选，只保留强度评分最高的 k 个结果（按评分从高到低）
+
+        结果逐个从 iter_matches 流过，用大小为 k 的最小堆保留评分最高的结果，
+        不保存也不排序全部匹配。评分相同时先找到的排在前面。
+        没有评分的结果（筛选器未给出 score）无法与有评分的比较，不进入堆，
+        按找到的顺序排在全部有评分的结果之后，只在有评分的结果不足 k 个时补足。
+        """
+        heap = []
+        unscored = []
+        for sequence, result in enumerate(self.iter_matches(stocks_df, filters, stop=stop,
+                                                             checkpoint=checkpoint, outcome=outcome)):
+            if result.get('score') is None:
+                if len(unscored) < k:
+                    unscored.append(result)
+                continue
+            item = (result['score'], -sequence, result)
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif item[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, item)
+        scored = [item[2] for item in sorted(heap, key=lambda item: item[:2], reverse=True)]
+        return scored + unscored[:k - len(scored)]
+
+    def _record(self, ordered: List[PerStockFilter], counters: Dict[str, _RunCounter]):
+        with self._lock:
+            for filter_instance in ordered:
+                key = self._key(filter_instance)
+                counter = counters[key]
+                if counter.processed == 0:
+                    continue
+                stats = self._stats.setdefault(key, FilterStats.from_filter(filter_instance))
+                stats.update(counter.processed, counter.passed, counter.seconds, counter.calls)
+                logger.info("%s: 处理 %d 只，通过 %d 只，耗时 %.1f秒，上游调用 %d 次",
+                            filter_instance.display_name or key, counter.processed,
+                            counter.passed, counter.seconds, counter.calls)
+            self._save()
+
+@lru_cache()
+def get_planner() -> ScreenPlanner:
+    """获取筛选计划器单例"""
+    return ScreenPlanner(get_settings().PLANNER_STATS_PATH)
@@ -0,0 +1,96 @@
+from abc import ABC, abstractmethod
+from typing import Optional
+import logging
+import os
+import httpx
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 行情快照的列：
+#   ts_code, open, high, low, price（最新价）, vol（当日累计成交量，手）, amount（当日累计成交额，千元），
+#   可选 trade_date（YYYYMMDD，缺省为当天）和 name。单位与 daily 接口一致。
+QUOTE_COLUMNS = ['ts_code', 'open', 'high', 'low', 'price', 'vol', 'amount']
+
+class QuoteSource(ABC):
+    """全市场实时行情快照来源"""
+
+    name = 'base'
+
+    @abstractmethod
+    def snapshot(self) -> pd.DataFrame:
+        """获取最新的全市场行情快照，每只股票一行"""
+        pass
+
+    @staticmethod
+    def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+        """检查列并统一类型"""
+        if df is None or df.empty:
+            return pd.DataFrame(columns=QUOTE_COLUMNS)
+        missing = [col for col in QUOTE_COLUMNS if col not in df.columns]
+        if missing:
+            raise ValueError(f"行情快照缺少列: {', '.join(missing)}")
+        df = df.copy()
+        if 'trade_date' in df.columns:
+            df['trade_date'] = df['trade_date'].astype(str)
+        else:
+            df['trade_date'] = pd.Timestamp.now().strftime('%Y%m%d')
+        for col in QUOTE_COLUMNS[1:]:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        return df.drop_duplicates('ts_code', keep='last').reset_index(drop=True)
+
+class FileQuoteSource(QuoteSource):
+    """从本地文件读取快照（csv / parquet / json），文件更新后才重新读取
+
+    适合测试或由其他行情程序定时写出快照文件的部署方式。
+    """
+
+    name = 'file'
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime: Optional[float] = None
+        self._cached = pd.DataFrame(columns=QUOTE_COLUMNS)
+
+    def snapshot(self) -> pd.DataFrame:
+        if not os.path.exists(self.path):
+            logger.warning(f"行情快照文件不存在: {self.path}")
+            return self._cached
+        mtime = os.path.getmtime(self.path)
+        if mtime != self._mtime:
+            if self.path.endswith('.parquet'):
+                df = pd.read_parquet(self.path)
+            elif self.path.endswith('.json'):
+                df = pd.read_json(self.path, dtype={'ts_code': str, 'trade_date': str})
+            else:
+                df = pd.read_csv(self.path, dtype={'ts_code': str, 'trade_date': str})
+            self._cached = self._normalize(df)
+            self._mtime = mtime
+        return self._cached
+
+class HttpQuoteSource(QuoteSource):
+    """从 HTTP 接口获取快照，接口返回行情列表或 {"data": [...]}"""
+
+    name = 'http'
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+        self._client = httpx.Client(timeout=timeout)
+
+    def snapshot(self) -> pd.DataFrame:
+        response = self._client.get(self.url)
+        response.raise_for_status()
+        payload = response.json()
+        if isinstance(payload, dict):
+            payload = payload.get('data', [])
+        return self._normalize(pd.DataFrame(payload))
+
+def create_quote_source(settings) -> QuoteSource:
+    """按配置创建行情快照来源"""
+    source_type = settings.LIVE_QUOTE_SOURCE
+    if source_type == 'file':
+        return FileQuoteSource(settings.LIVE_QUOTE_PATH)
+    if source_type == 'http':
+        return HttpQuoteSource(settings.LIVE_QUOTE_URL)
+    raise ValueError(f"未知的行情来源类型: {source_type}")
@@ -0,0 +1,237 @@
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+import logging
+import threading
+import time
+import numpy as np
+import pandas as pd
+from src.api.config import get_settings
+from src.data.base_provider import DataProvider
+from src.data.panel import load_panel
+from src.data.provider_factory import get_provider
+from src.filters.filter_factory import FilterFactory
+from src.filters.price_patterns.limit_up_filter import BOARD_LIMITS, LimitUpFilter
+from src.utils.metrics import SCREEN_STAGE_SECONDS, observe_seconds
+from .quote_source import QuoteSource, create_quote_source
+
+logger = logging.getLogger(__name__)
+
+# 面板字段与行情快照列名的对应关系
+QUOTE_FIELDS = {'open': 'open', 'high': 'high', 'low': 'low', 'close': 'price',
+                'volume': 'vol', 'amount': 'amount'}
+
+class LiveScreener:
+    """盘中实时筛选
+
+    每个交易日开始时加载各形态所需的最近若干根已完成日线（每个交易日一次全市场调用），
+    之后每隔 interval 秒获取一次全市场行情快照，把它作为当天“正在形成的K线”接在历史后面，
+    用各筛选器的向量化 signals 规则对全市场判断最后一根K线，
+    只把新满足和不再满足条件的股票推送给订阅者。
+
+    盘中的成交量是当天累计值，量比、成交量放大等条件会随交易时间逐步满足。
+    有涨停规则时，按前一交易日每日指标的换手率和成交量推算换手率 1% 对应的成交量，
+    盘中换手率（%）即累计成交量除以该值，与每日指标的换手率定义相同。
+    """
+
+    def __init__(self, source: QuoteSource, patterns: List[str],
+                 provider: Optional[DataProvider] = None, interval: float = 3.0):
+        self.source = source
+        self.provider = provider if provider is not None else get_provider()
+        self.interval = interval
+        self.filters = {}
+        for name in patterns:
+            filter_instance = FilterFactory.create_filter(name, provider=self.provider)
+            try:
+                # 在空面板上试运行，确认筛选器实现了向量化规则
+                filter_instance.signals({field: np.empty((1, 0)) for field in QUOTE_FIELDS})
+            except (AttributeError, NotImplementedError):
+                raise ValueError(f"{name} 不支持实时筛选")
+            self.filters[name] = filter_instance
+
+        self._lock = threading.Lock()
+        self._subscribers: List[Callable[[dict], None]] = []
+        self._matches: Dict[str, set] = {name: set() for name in self.filters}
+        self._history: Dict[str, np.ndarray] = {}
+        self._codes: List[str] = []
+        self._limits = np.empty(0)
+        self._turnover_volume = np.empty(0)
+        self._names: Dict[str, str] = {}
+        self._trade_date: Optional[str] = None
+        self._last_update: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # ------------------------------------------------------------------
+    # 订阅
+    # ------------------------------------------------------------------
+    def subscribe(self, callback: Callable[[dict], None]) -> Callable[[], None]:
+        """订阅变化事件，返回取消订阅的函数"""
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def _publish(self, event: dict):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error(f"推送实时筛选事件失败: {str(e)}")
+
+    def current_matches(self) -> dict:
+        """当前满足各形态的股票"""
+        with self._lock:
+            return {
+                'trade_date': self._trade_date,
+                'updated_at': self._last_update,
+                'matches': {name: [self._describe(code) for code in sorted(codes)]
+                            for name, codes in self._matches.items()}
+            }
+
+    def _describe(self, ts_code: str) -> dict:
+        return {'ts_code': ts_code, 'name': self._names.get(ts_code, '')}
+
+    # ------------------------------------------------------------------
+    # 计算
+    # ------------------------------------------------------------------
+    def history_bars(self) -> int:
+        """除当天外需要的已完成K线数量"""
+        return max((getattr(f, 'pattern_bars', 1) for f in self.filters.values()), default=1) - 1
+
+    def _load_history(self, trade_date: str):
+        """加载 trade_date 之前的已完成日线"""
+        count = self.history_bars()
+        dates = []
+        if count > 0:
+            dates = [d for d in self.provider.recent_trade_dates(count + 1, trade_date) if d < trade_date][-count:]
+        with observe_seconds(SCREEN_STAGE_SECONDS, 'live_history'):
+            panel = load_panel(self.provider, dates, fields=tuple(QUOTE_FIELDS))
+        stocks = self.provider.stock_basic(fields='ts_code,name,market')
+        # 每只股票的涨跌幅限制，供涨停规则使用
+        limits = np.full(len(panel.ts_codes), BOARD_LIMITS['主板'])
+        if not stocks.empty:
+            stock_limits = LimitUpFilter.board_limits(stocks.set_index('ts_code', drop=False))
+            limits = stock_limits.reindex(panel.ts_codes).fillna(BOARD_LIMITS['主板']).to_numpy()
+        turnover_volume = self._load_turnover_volume(dates, panel)
+        with self._lock:
+            self._history = panel.bars
+            self._codes = panel.ts_codes
+            self._limits = limits
+            self._turnover_volume = turnover_volume
+            self._names = dict(zip(stocks['ts_code'], stocks['name'])) if not stocks.empty else {}
+            self._trade_date = trade_date
+            self._matches = {name: set() for name in self.filters}
+        logger.info(f"实时筛选加载 {trade_date} 之前的 {len(dates)} 个交易日，共 {len(self._codes)} 只股票")
+
+    def _load_turnover_volume(self, dates: List[str], panel) -> np.ndarray:
+        """换手率 1% 对应的成交量（前一交易日成交量 / 换手率），没有涨停规则或没有每日指标时为 NaN"""
+        volume = np.full(len(panel.ts_codes), np.nan)
+        if not dates or not any(isinstance(f, LimitUpFilter) for f in self.filters.values()):
+            return volume
+        basic = self.provider.daily_basic(trade_date=dates[-1], fields='ts_code,turnover_rate')
+        if basic is None or basic.empty:
+            logger.warning(f"{dates[-1]} 没有每日指标，实时涨停规则不判断换手率")
+            return volume
+        turnover = basic.set_index('ts_code')['turnover_rate'].reindex(panel.ts_codes).to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            volume = panel.bars['volume'][-1] / turnover
+        return np.where(np.isfinite(volume) & (volume > 0), volume, np.nan)
+
+    def _forming_bars(self, snapshot: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """历史K线加上由快照组成的当天K线"""
+        quotes = snapshot.set_index('ts_code').reindex(self._codes)
+        bars = {}
+        for field, column in QUOTE_FIELDS.items():
+            values = quotes[column].to_numpy(dtype=float)
+            if field in ('open', 'high', 'low', 'close'):
+                # 停牌或尚未成交的股票价格为 0
+                values = np.where(values > 0, values, np.nan)
+            bars[field] = np.vstack([self._history[field], values[None, :]])
+        bars['limit'] = self._limits
+        # 只有当天的换手率，历史K线不需要
+        turnover = np.full_like(bars['volume'], np.nan)
+        turnover[-1] = bars['volume'][-1] / self._turnover_volume
+        bars['turnover_rate'] = turnover
+        return bars
+
+    def poll_once(self) -> List[dict]:
+        """获取一次快照并重新判断，返回产生的变化事件"""
+        snapshot = self.source.snapshot()
+        if snapshot is None or snapshot.empty:
+            return []
+        trade_date = str(snapshot['trade_date'].iloc[0])
+        if trade_date != self._trade_date:
+            self._load_history(trade_date)
+        if not self._codes:
+            return []
+
+        events = []
+        with observe_seconds(SCREEN_STAGE_SECONDS, 'live_tick'):
+            bars = self._forming_bars(snapshot)
+            codes = np.asarray(self._codes)
+            updated_at = pd.Timestamp.now().strftime('%H:%M:%S')
+            for name, filter_instance in self.filters.items():
+                matched = set(codes[filter_instance.signals(bars)[-1]])
+                with self._lock:
+                    previous = self._matches[name]
+                    self._matches[name] = matched
+                added, removed = sorted(matched - previous), sorted(previous - matched)
+                if added or removed:
+                    events.append({
+                        'type': 'diff',
+                        'pattern': name,
+                        'trade_date': trade_date,
+                        'time': updated_at,
+                        'added': [self._describe(code) for code in added],
+                        'removed': [self._describe(code) for code in removed]
+                    })
+            self._last_update = updated_at
+
+        for event in events:
+            logger.info(f"实时筛选 {event['pattern']}: 新增 {len(event['added'])} 只，移除 {len(event['removed'])} 只")
+            self._publish(event)
+        return events
+
+    # ------------------------------------------------------------------
+    # 后台轮询
+    # ------------------------------------------------------------------
+    def start(self):
+        """启动后台轮询线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='live-screener', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+
+    def _run(self):
+        logger.info(f"实时筛选启动，形态: {', '.join(self.filters)}，间隔 {self.interval} 秒")
+        while not self._stop.is_set():
+            start = time.monotonic()
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.error(f"实时筛选轮询失败: {str(e)}")
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - start)))
+
+@lru_cache()
+def get_live_screener() -> LiveScreener:
+    """获取实时筛选器单例，第一次获取时启动后台轮询"""
+    settings = get_settings()
+    screener = LiveScreener(
+        create_quote_source(settings),
+        patterns=[name.strip() for name in settings.LIVE_PATTERNS.split(',') if name.strip()],
+        interval=settings.LIVE_INTERVAL
+    )
+    screener.start()
+    return screener
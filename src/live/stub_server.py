@@ -0,0 +1,111 @@
+import argparse
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+import numpy as np
+import pandas as pd
+from src.data.base_provider import DataProvider
+from src.data.provider_factory import get_provider
+
+logger = logging.getLogger(__name__)
+
+class SimulatedQuotes:
+    """基于最近一个交易日收盘价模拟盘中行情，用于本地测试实时筛选
+
+    每次取快照推进一步随机游走，价格限制在前收盘价 ±10% 以内，
+    成交量和成交额逐步累加；少数股票带有上涨漂移并放量，便于触发涨停类条件。
+    """
+
+    def __init__(self, provider: DataProvider, trade_date: Optional[str] = None, seed: int = 0,
+                 steps_per_session: int = 200):
+        self.trade_date = trade_date or pd.Timestamp.now().strftime('%Y%m%d')
+        self.steps_per_session = steps_per_session
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+        previous = [d for d in provider.recent_trade_dates(2, self.trade_date) if d < self.trade_date]
+        last = provider.daily(trade_date=previous[-1]) if previous else pd.DataFrame()
+        if last.empty:
+            raise ValueError(f"{self.trade_date} 之前没有日线数据，无法模拟行情")
+        stocks = provider.stock_basic(fields='ts_code,name')
+
+        self.ts_codes = last['ts_code'].to_numpy()
+        self.names = stocks.set_index('ts_code')['name'].reindex(self.ts_codes).fillna('').to_numpy()
+        self.pre_close = last['close'].to_numpy(dtype=float)
+        self._full_day_vol = last['vol'].to_numpy(dtype=float)
+        n = len(self.ts_codes)
+        self._drift = np.where(self._rng.random(n) < 0.02, 0.004, 0.0)
+        self.open = self.pre_close * (1 + self._rng.normal(0.0, 0.01, n) + self._drift * 5)
+        self.price = self.open.copy()
+        self.high = self.open.copy()
+        self.low = self.open.copy()
+        self.vol = np.zeros(n)
+        self.amount = np.zeros(n)
+
+    def step(self) -> pd.DataFrame:
+        """推进一步并返回快照"""
+        with self._lock:
+            n = len(self.ts_codes)
+            change = self._rng.normal(0.0, 0.003, n) + self._drift
+            self.price = np.clip(self.price * (1 + change), self.pre_close * 0.9, self.pre_close * 1.1).round(2)
+            self.high = np.maximum(self.high, self.price)
+            self.low = np.minimum(self.low, self.price)
+            step_vol = self._full_day_vol / self.steps_per_session * self._rng.uniform(0.5, 1.5, n)
+            # 上涨漂移的股票放量
+            step_vol *= np.where(self._drift > 0, 3.0, 1.0)
+            self.vol += step_vol
+            # 成交量单位为手，成交额单位为千元
+            self.amount += step_vol * self.price * 100 / 1000
+            return pd.DataFrame({
+                'ts_code': self.ts_codes,
+                'name': self.names,
+                'trade_date': self.trade_date,
+                'open': self.open.round(2),
+                'high': self.high.round(2),
+                'low': self.low.round(2),
+                'price': self.price,
+                'pre_close': self.pre_close,
+                'vol': self.vol.round(0),
+                'amount': self.amount.round(3)
+            })
+
+def make_handler(quotes: SimulatedQuotes):
+    class QuoteHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/quotes':
+                self.send_error(404)
+                return
+            body = json.dumps({'data': quotes.step().to_dict('records')}, ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    return QuoteHandler
+
+def main():
+    """命令行：启动模拟行情服务，GET /quotes 返回全市场快照"""
+    parser = argparse.ArgumentParser(description="模拟盘中行情快照服务")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--trade-date', default=None, help="模拟的交易日，默认为当天")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    quotes = SimulatedQuotes(get_provider(), trade_date=args.trade_date, seed=args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(quotes))
+    print(f"模拟行情服务: http://{args.host}:{args.port}/quotes（{len(quotes.ts_codes)} 只股票）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
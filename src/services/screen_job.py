@@ -0,0 +1,97 @@
+from typing import List, Optional
+import logging
+import threading
+import time
+import pandas as pd
+from src.filters.base_filter import PerStockFilter
+from src.filters.checkpoint import ScreenCheckpoint
+from src.filters.screen_planner import ScreenOutcome, get_planner
+
+logger = logging.getLogger(__name__)
+
+class ScreenJob:
+    """在后台线程中执行的形态筛选
+
+    按执行计划逐只股票筛选，随时可以读取进度和已找到的结果，也可以中途取消。
+    读取状态的线程（如 Streamlit 脚本线程）不会被筛选阻塞。
+    传入检查点时，取消或进程退出后以相同条件重新启动会从上次的进度继续。
+    """
+
+    RUNNING = 'running'
+    DONE = 'done'
+    CANCELLED = 'cancelled'
+    FAILED = 'failed'
+
+    def __init__(self, stocks_df: pd.DataFrame, filters: List[PerStockFilter],
+                 checkpoint: Optional[ScreenCheckpoint] = None):
+        self.stocks_df = stocks_df
+        self.filters = filters
+        self.checkpoint = checkpoint
+        self.status = self.RUNNING
+        self.error: Optional[str] = None
+        self.total = len(stocks_df)
+        self.processed = 0
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._matches: List[dict] = []
+        # 完成后仍因上游调用失败未能判断的股票
+        self.outcome = ScreenOutcome()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='screen-job', daemon=True)
+
+    def start(self) -> 'ScreenJob':
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """请求停止，正在处理的股票完成后生效"""
+        self._stop.set()
+
+    @property
+    def running(self) -> bool:
+        return self.status == self.RUNNING
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def eta(self) -> Optional[float]:
+        """按已处理股票的平均耗时估算的剩余秒数"""
+        if not self.running or self.processed == 0:
+            return None
+        return self.elapsed / self.processed * (self.total - self.processed)
+
+    def matches(self) -> pd.DataFrame:
+        """目前已找到的结果"""
+        with self._lock:
+            return pd.DataFrame(list(self._matches))
+
+    @property
+    def match_count(self) -> int:
+        with self._lock:
+            return len(self._matches)
+
+    def _on_progress(self, processed: int, total: int):
+        self.processed = processed
+        self.total = total
+
+    def _run(self):
+        try:
+            for result in get_planner().iter_matches(self.stocks_df, self.filters,
+                                                     progress=self._on_progress, stop=self._stop,
+                                                     checkpoint=self.checkpoint, outcome=self.outcome):
+                with self._lock:
+                    self._matches.append(result)
+            self.status = self.CANCELLED if self._stop.is_set() else self.DONE
+            if self.outcome.incomplete:
+                self.error = f"{len(self.outcome.undecided)} 只股票因上游调用失败未能判断，可稍后重新筛选"
+        except Exception as e:
+            logger.error(f"后台筛选失败: {str(e)}", exc_info=True)
+            self.error = str(e)
+            self.status = self.FAILED
+        finally:
+            self.finished_at = time.time()
+            logger.info(f"后台筛选结束（{self.status}），处理 {self.processed}/{self.total} 只股票，"
+                        f"找到 {self.match_count} 只，耗时 {self.elapsed:.1f}秒")
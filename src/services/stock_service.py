@@ -2,10 +2,22 @@ import pandas as pd
 import logging
 import asyncio
 from typing import List, Dict, Optional
-from src.utils.config import ts_api
+from src.data.provider_factory import get_provider
+from src.data.adjust import resolve_adjust
+from src.data.bar_pyramid import period_bars, period_keys
+from src.data.downsample import downsample_bars
+from src.data.similarity import find_similar
 from src.filters.filter_factory import FilterFactory
-from src.services.deepseek_client import DeepSeekClient
+from src.filters.checkpoint import ScreenCheckpoint
+from src.filters.screen_planner import ScreenOutcome, get_planner
 import re
+import time
+import hashlib
+import json
+from contextlib import closing
+from src.api.config import get_settings
+from src.utils.cache import get_cache
+from src.utils.metrics import SCREEN_STAGE_SECONDS, observe_seconds
 
 # 配置日志
 logging.basicConfig(
@@ -18,7 +30,7 @@ def get_market_types() -> List[str]:
     """获取市场类型列表"""
     try:
         # 获取股票列表
-        df = ts_api.stock_basic(exchange='', list_status='L')
+        df = get_provider().stock_basic(exchange='', list_status='L')
         # 获取唯一市场类型
         market_types = df['market'].unique().tolist()
         return market_types
@@ -30,7 +42,7 @@ def get_industries() -> List[str]:
     """获取行业分类列表"""
     try:
         # 获取股票列表
-        df = ts_api.stock_basic(exchange='', list_status='L')
+        df = get_provider().stock_basic(exchange='', list_status='L')
         # 获取唯一行业分类
         industries = df['industry'].unique().tolist()
         return industries
@@ -49,6 +61,290 @@ def get_index_components() -> List[str]:
         logger.error(f"获取指数成分股失败: {str(e)}")
         return []
 
+def _get_candidates(
+    market_types: List[str] = None,
+    industries: List[str] = None,
+    index_components: List[str] = None
+) -> Optional[pd.DataFrame]:
+    """获取股票列表并执行市场类型、行业和指数成分股筛选，获取失败时返回 None"""
+    # 获取股票列表
+    stage_start = time.perf_counter()
+    df = get_provider().stock_basic(exchange='', list_status='L')
+    SCREEN_STAGE_SECONDS.labels('universe').observe(time.perf_counter() - stage_start)
+    logger.info(f"获取到原始股票列表: type={type(df)}, shape={df.shape if isinstance(df, pd.DataFrame) else 'not DataFrame'}")
+    
+    if not isinstance(df, pd.DataFrame):
+        logger.error(f"获取股票列表返回类型错误: {type(df)}")
+        logger.error(f"返回内容: {df}")
+        return None
+    
+    if df.empty:
+        logger.warning("获取到的股票列表为空")
+        return None
+    
+    # 市场类型筛选
+    stage_start = time.perf_counter()
+    if market_types:
+        logger.info(f"进行市场类型筛选，条件: {market_types}")
+        df = df[df['market'].isin(market_types)]
+        logger.info(f"市场类型筛选后剩余股票数: {len(df)}")
+        
+    # 行业筛选
+    if industries:
+        logger.info(f"进行行业筛选，条件: {industries}")
+        df = df[df['industry'].isin(industries)]
+        logger.info(f"行业筛选后剩余股票数: {len(df)}")
+        
+    # 指数成分股筛选
+    if index_components:
+        logger.info(f"进行指数成分股筛选，条件: {index_components}")
+        index_stocks = set()
+        for index_code in index_components:
+            try:
+                logger.info(f"获取指数 {index_code} 的成分股")
+                index_df = get_provider().index_weight(index_code=index_code)
+                logger.info(f"指数 {index_code} 返回数据类型: {type(index_df)}")
+                if isinstance(index_df, pd.DataFrame) and not index_df.empty:
+                    current_stocks = index_df['con_code'].tolist()
+                    logger.info(f"指数 {index_code} 包含成分股数量: {len(current_stocks)}")
+                    index_stocks.update(current_stocks)
+            except Exception as e:
+                logger.error(f"获取指数 {index_code} 成分股失败: {str(e)}", exc_info=True)
+        if index_stocks:
+            logger.info(f"总成分股数量: {len(index_stocks)}")
+            df = df[df['ts_code'].isin(index_stocks)]
+            logger.info(f"指数成分股筛选后剩余股票数: {len(df)}")
+            
+    SCREEN_STAGE_SECONDS.labels('basic_filters').observe(time.perf_counter() - stage_start)
+    return df
+
+def get_candidates(
+    market_types: List[str] = None,
+    industries: List[str] = None,
+    index_components: List[str] = None
+) -> pd.DataFrame:
+    """基础筛选（市场类型、行业、指数成分股）后的股票列表，获取失败时返回空表"""
+    try:
+        df = _get_candidates(market_types, industries, index_components)
+    except Exception as e:
+        logger.error(f"基础筛选失败: {str(e)}", exc_info=True)
+        df = None
+    return df.reset_index(drop=True) if df is not None else pd.DataFrame()
+
+def _create_pattern_filters(kline_pattern: str = None, price_prediction: str = None,
+                            timeframe: Optional[str] = None, adjust: Optional[str] = None,
+                            reference: Optional[dict] = None, **filter_kwargs) -> list:
+    """创建K线形态和价格预测筛选器，filter_kwargs 传给各筛选器（如 recent_bars、as_of）
+
+    timeframe 和 adjust 只作用于K线形态，价格预测（涨停、资金流向）总是按不复权日线判断；
+    reference 为形态相似的参照K线，只传给形态相似筛选器。
+    """
+    filters = []
+    filter_kwargs = {key: value for key, value in filter_kwargs.items() if value is not None}
+    
+    # K线形态筛选
+    if kline_pattern and kline_pattern != '所有':
+        logger.info(f"进行K线形态筛选，条件: {kline_pattern}，周期: {timeframe or 'D'}，复权: {adjust or '不复权'}")
+        kline_kwargs = dict(filter_kwargs)
+        if timeframe:
+            kline_kwargs['timeframe'] = timeframe
+        if adjust:
+            kline_kwargs['adjust'] = adjust
+        if reference:
+            kline_kwargs['reference'] = reference
+        filter_instance = FilterFactory.create_filter(kline_pattern, **kline_kwargs)
+        if filter_instance:
+            filters.append(filter_instance)
+            
+    # 价格预测筛选
+    if price_prediction:
+        logger.info(f"进行价格预测筛选，条件: {price_prediction}")
+        filter_instance = FilterFactory.create_filter(price_prediction, **filter_kwargs)
+        if filter_instance:
+            filters.append(filter_instance)
+    
+    return filters
+
+def _page_rows(df_page: pd.DataFrame) -> List[dict]:
+    """为一页结果补充最新行情和每日指标，并转换为可以 JSON 序列化的字典"""
+    # 获取最新行情数据
+    stage_start = time.perf_counter()
+    if not df_page.empty:
+        stock_codes = ','.join(df_page['ts_code'].tolist())
+        recent_start = (pd.Timestamp.now() - pd.Timedelta(days=30)).strftime('%Y%m%d')
+        logger.info(f"获取行情数据，股票代码: {stock_codes}")
+        try:
+            # 获取日线数据
+            logger.info("开始获取日线数据")
+            daily = get_provider().daily(ts_code=stock_codes, start_date=recent_start)
+            logger.info(f"日线数据类型: {type(daily)}, 是否为空: {daily.empty if isinstance(daily, pd.DataFrame) else 'not DataFrame'}")
+            
+            if isinstance(daily, pd.DataFrame) and not daily.empty:
+                daily = daily.sort_values('trade_date').groupby('ts_code').last()
+                logger.info(f"处理后的日线数据列: {daily.columns.tolist()}")
+                df_page = df_page.merge(daily[['close', 'pct_chg', 'vol', 'amount']], 
+                                left_on='ts_code', right_index=True, how='left')
+                df_page = df_page.rename(columns={
+                    'close': 'price',
+                    'vol': 'volume'
+                })
+                logger.info("日线数据合并完成")
+            
+            # 获取每日指标
+            logger.info("开始获取每日指标")
+            daily_basic = get_provider().daily_basic(ts_code=stock_codes, start_date=recent_start)
+            logger.info(f"每日指标数据类型: {type(daily_basic)}, 是否为空: {daily_basic.empty if isinstance(daily_basic, pd.DataFrame) else 'not DataFrame'}")
+            
+            if isinstance(daily_basic, pd.DataFrame) and not daily_basic.empty:
+                daily_basic = daily_basic.sort_values('trade_date').groupby('ts_code').last()
+                logger.info(f"处理后的每日指标列: {daily_basic.columns.tolist()}")
+                df_page = df_page.merge(daily_basic[['pe', 'pb', 'total_mv']], 
+                                left_on='ts_code', right_index=True, how='left')
+                logger.info("每日指标合并完成")
+        except Exception as e:
+            logger.error(f"获取行情数据失败: {str(e)}", exc_info=True)
+    
+    SCREEN_STAGE_SECONDS.labels('enrich').observe(time.perf_counter() - stage_start)
+    
+    # 处理数据，确保JSON序列化不会出错
+    stage_start = time.perf_counter()
+    logger.info("开始处理数据进行JSON序列化")
+    result = []
+    for idx, row in df_page.iterrows():
+        try:
+            logger.debug(f"处理第 {idx} 行数据")
+            # 先转换为字典
+            row_dict = row.to_dict() if hasattr(row, 'to_dict') else dict(row)
+            logger.debug(f"行数据转换为字典: {row_dict}")
+            
+            stock_data = {
+                'ts_code': str(row_dict.get('ts_code', '')),
+                'name': str(row_dict.get('name', '')),
+                'industry': str(row_dict.get('industry', '')),
+                'market': str(row_dict.get('market', '')),
+                'area': str(row_dict.get('area', '')),
+                'list_date': str(row_dict.get('list_date', '')),
+                'price': float(row_dict['price']) if pd.notna(row_dict.get('price')) else None,
+                'change': float(row_dict['pct_chg']) if pd.notna(row_dict.get('pct_chg')) else None,
+                'volume': float(row_dict['volume']) if pd.notna(row_dict.get('volume')) else None,
+                'amount': float(row_dict['amount']) if pd.notna(row_dict.get('amount')) else None,
+                'pe': float(row_dict['pe']) if pd.notna(row_dict.get('pe')) else None,
+                'pb': float(row_dict['pb']) if pd.notna(row_dict.get('pb')) else None,
+                'total_mv': float(row_dict['total_mv']) if pd.notna(row_dict.get('total_mv')) else None,
+                'score': float(row_dict['score']) if pd.notna(row_dict.get('score')) else None
+            }
+            result.append(stock_data)
+        except Exception as e:
+            logger.error(f"处理股票数据失败: {str(e)}, row: {row}", exc_info=True)
+            continue
+    
+    SCREEN_STAGE_SECONDS.labels('serialize').observe(time.perf_counter() - stage_start)
+    logger.info(f"数据处理完成，返回 {len(result)} 条记录")
+    return result
+
+# 优先顺序 -> 所在的表，均按从大到小排列
+PRIORITIES = {
+    'total_mv': 'daily_basic',
+    'circ_mv': 'daily_basic',
+    'turnover_rate': 'daily_basic',
+    'amount': 'daily'
+}
+
+def _prioritize(df: pd.DataFrame, priority: str, as_of: Optional[str] = None) -> pd.DataFrame:
+    """按最近一个交易日的指标（如总市值）从大到小排列候选股票，缺少数据的排在最后
+
+    全市场的指标按交易日一次获取，当天数据尚未发布时使用前一个交易日。
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"未知的优先顺序: {priority}")
+    provider = get_provider()
+    table = PRIORITIES[priority]
+    for trade_date in reversed(provider.recent_trade_dates(3, as_of)):
+        values = getattr(provider, table)(trade_date=trade_date, fields=f"ts_code,{priority}")
+        if values is not None and not values.empty and priority in values.columns:
+            break
+    else:
+        logger.warning(f"未获取到 {priority}，按默认顺序筛选")
+        return df
+    order = df['ts_code'].map(values.drop_duplicates('ts_code').set_index('ts_code')[priority])
+    return (df.assign(_priority=order.to_numpy())
+            .sort_values('_priority', ascending=False, na_position='last', kind='stable')
+            .drop(columns='_priority'))
+
+class CursorError(ValueError):
+    """续取游标无效或与筛选条件不匹配"""
+
+def _cursor(screen_key: dict, offset: int) -> str:
+    """续取游标：筛选条件的摘要加上已返回的结果数"""
+    digest = hashlib.sha1(json.dumps(screen_key, sort_keys=True, ensure_ascii=False)
+                          .encode('utf-8')).hexdigest()[:8]
+    return f"{digest}-{offset}"
+
+def _cursor_offset(screen_key: dict, cursor: Optional[str]) -> int:
+    """解析续取游标，游标无效或与筛选条件不匹配时抛出 CursorError"""
+    if not cursor:
+        return 0
+    digest, _, offset = cursor.partition('-')
+    if not offset.isdigit() or _cursor(screen_key, 0) != f"{digest}-0":
+        raise CursorError(f"游标与筛选条件不匹配: {cursor}")
+    return int(offset)
+
+def _first_matches(screen_key: dict, market_types, industries, index_components, kline_pattern,
+                   price_prediction, recent_bars, as_of, timeframe, adjust, reference, priority,
+                   limit: int, cursor: Optional[str]) -> Dict[str, any]:
+    """按需筛选：找到游标之后的 limit 只股票（再多找一只用于判断是否还有更多）就停止
+
+    候选股票按 priority 排序后逐只交给执行计划，结果是生成器，取够之后关闭即停止获取数据和判断。
+    关闭时执行计划把已处理的股票和已找到的结果保存到检查点，带上 next_cursor 续取时从检查点继续，
+    已处理的股票不再重新判断。全部候选都处理完时结果与分页筛选共用缓存。
+    有股票因上游调用失败未能判断时返回 incomplete 和未判断的股票数，结果不缓存，
+    以相同参数重试时从检查点继续，只判断这些股票。
+    """
+    cache = get_cache()
+    offset = _cursor_offset(screen_key, cursor)
+    outcome = ScreenOutcome()
+    df = cache.get('screen', screen_key)
+    exhausted = df is not None
+    if exhausted:
+        found = df.to_dict('records')
+    else:
+        df = _get_candidates(market_types, industries, index_components)
+        if df is None:
+            return {'data': [], 'total': 0, 'limit': limit, 'has_more': False, 'next_cursor': None}
+        if priority:
+            df = _prioritize(df, priority, screen_key['as_of'])
+        filters = _create_pattern_filters(kline_pattern, price_prediction, timeframe, adjust, reference,
+                                          recent_bars=recent_bars, as_of=as_of)
+        found = []
+        if filters:
+            checkpoint = ScreenCheckpoint.for_screen(screen_key, screen_key['as_of'])
+            matches = get_planner().iter_matches(df, filters, checkpoint=checkpoint, outcome=outcome)
+            exhausted = True
+            with observe_seconds(SCREEN_STAGE_SECONDS, 'pattern_filters'), closing(matches):
+                for result in matches:
+                    found.append(result)
+                    if len(found) > offset + limit:
+                        exhausted = False
+                        break
+            exhausted = exhausted and not outcome.incomplete
+            logger.info(f"按需筛选找到 {len(found)} 只股票{'，已处理全部候选' if exhausted else ''}")
+        else:
+            found, exhausted = df.to_dict('records'), True
+        if exhausted:
+            cache.set('screen', screen_key, pd.DataFrame(found), ttl=get_settings().CACHE_TTL)
+
+    has_more = len(found) > offset + limit
+    return {
+        'data': _page_rows(pd.DataFrame(found[offset:offset + limit])),
+        # 没有处理完全部候选时总数未知
+        'total': len(found) if exhausted else None,
+        'limit': limit,
+        'has_more': has_more,
+        'next_cursor': _cursor(screen_key, offset + limit) if has_more else None,
+        'incomplete': outcome.incomplete,
+        'undecided': len(outcome.undecided)
+    }
+
 def filter_stocks(
     market_types: List[str] = None,
     industries: List[str] = None,
@@ -56,84 +352,107 @@ def filter_stocks(
     kline_pattern: str = None,
     price_prediction: str = None,
     page: int = 1,
-    page_size: int = 20
+    page_size: int = 20,
+    recent_bars: Optional[int] = None,
+    as_of: Optional[str] = None,
+    limit: Optional[int] = None,
+    priority: Optional[str] = None,
+    cursor: Optional[str] = None,
+    top_k: Optional[int] = None,
+    timeframe: str = 'D',
+    adjust: Optional[str] = None,
+    reference: Optional[dict] = None
 ) -> Dict[str, any]:
-    """筛选股票"""
+    """筛选股票
+    
+    Args:
+        recent_bars: 只接受在最近 recent_bars 个交易日内结束的形态
+        as_of: 评估日期（YYYYMMDD），默认为当天
+        limit: 只需要前 limit 只股票时按需筛选，找够即停止（此时忽略 page、page_size），
+            返回 has_more 和续取用的 next_cursor
+        priority: 候选股票的筛选顺序（见 PRIORITIES，如 total_mv 按总市值从大到小）
+        cursor: 上一次按需筛选返回的 next_cursor
+        top_k: 只返回形态强度评分最高的 top_k 只股票（按评分从高到低分页），
+            需要判断全部候选，此时忽略 limit
+        timeframe: K线形态的周期，D 日线、W 周线、M 月线（recent_bars 也按该周期的K线计数）
+        adjust: K线形态使用的复权方式 qfq/hfq/none，默认取配置 PRICE_ADJUST
+        reference: 形态相似的参照K线 {'ts_code', 'start_date', 'end_date'}，日期为空时取最近一个窗口
+
+    有股票因上游调用失败未能判断时，返回的 incomplete 为 True、undecided 为未判断的股票数，
+    结果不缓存；以相同参数重试时从检查点继续，只判断这些股票。
+    """
+    adjust = resolve_adjust(adjust)
     try:
         logger.info(f"开始筛选股票，参数：market_types={market_types}, industries={industries}, "
                    f"index_components={index_components}, kline_pattern={kline_pattern}, "
-                   f"price_prediction={price_prediction}, page={page}, page_size={page_size}")
-        
-        # 获取股票列表
-        df = ts_api.stock_basic(exchange='', list_status='L')
-        logger.info(f"获取到原始股票列表: type={type(df)}, shape={df.shape if isinstance(df, pd.DataFrame) else 'not DataFrame'}")
-        
-        if not isinstance(df, pd.DataFrame):
-            logger.error(f"获取股票列表返回类型错误: {type(df)}")
-            logger.error(f"返回内容: {df}")
-            return {
-                'data': [],
-                'total': 0,
-                'page': page,
-                'page_size': page_size
-            }
-        
-        if df.empty:
-            logger.warning("获取到的股票列表为空")
-            return {
-                'data': [],
-                'total': 0,
-                'page': page,
-                'page_size': page_size
-            }
+                   f"price_prediction={price_prediction}, page={page}, page_size={page_size}, "
+                   f"recent_bars={recent_bars}, as_of={as_of}, limit={limit}, priority={priority}, "
+                   f"cursor={cursor}, top_k={top_k}, timeframe={timeframe}, adjust={adjust}, "
+                   f"reference={reference}")
         
-        # 市场类型筛选
-        if market_types:
-            logger.info(f"进行市场类型筛选，条件: {market_types}")
-            df = df[df['market'].isin(market_types)]
-            logger.info(f"市场类型筛选后剩余股票数: {len(df)}")
-            
-        # 行业筛选
-        if industries:
-            logger.info(f"进行行业筛选，条件: {industries}")
-            df = df[df['industry'].isin(industries)]
-            logger.info(f"行业筛选后剩余股票数: {len(df)}")
-            
-        # 指数成分股筛选
-        if index_components:
-            logger.info(f"进行指数成分股筛选，条件: {index_components}")
-            index_stocks = set()
-            for index_code in index_components:
-                try:
-                    logger.info(f"获取指数 {index_code} 的成分股")
-                    index_df = ts_api.index_weight(index_code=index_code)
-                    logger.info(f"指数 {index_code} 返回数据类型: {type(index_df)}")
-                    if isinstance(index_df, pd.DataFrame) and not index_df.empty:
-                        current_stocks = index_df['con_code'].tolist()
-                        logger.info(f"指数 {index_code} 包含成分股数量: {len(current_stocks)}")
-                        index_stocks.update(current_stocks)
-                except Exception as e:
-                    logger.error(f"获取指数 {index_code} 成分股失败: {str(e)}", exc_info=True)
-            if index_stocks:
-                logger.info(f"总成分股数量: {len(index_stocks)}")
-                df = df[df['ts_code'].isin(index_stocks)]
-                logger.info(f"指数成分股筛选后剩余股票数: {len(df)}")
-                
-        # K线形态筛选
-        if kline_pattern and kline_pattern != '所有':
-            logger.info(f"进行K线形态筛选，条件: {kline_pattern}")
-            filter_instance = FilterFactory.create_filter(kline_pattern)
-            if filter_instance:
-                df = filter_instance.filter(df)
-                logger.info(f"K线形态筛选后剩余股票数: {len(df)}")
-                
-        # 价格预测筛选
-        if price_prediction:
-            logger.info(f"进行价格预测筛选，条件: {price_prediction}")
-            filter_instance = FilterFactory.create_filter(price_prediction)
-            if filter_instance:
-                df = filter_instance.filter(df)
-                logger.info(f"价格预测筛选后剩余股票数: {len(df)}")
+        # 同一天相同条件的筛选结果在各工作进程间共享，翻页时不再重新筛选
+        cache = get_cache()
+        screen_key = {
+            'market_types': sorted(market_types or []),
+            'industries': sorted(industries or []),
+            'index_components': sorted(index_components or []),
+            'kline_pattern': kline_pattern,
+            'price_prediction': price_prediction,
+            'recent_bars': recent_bars,
+            'timeframe': timeframe,
+            'adjust': adjust,
+            'reference': reference,
+            'as_of': as_of or pd.Timestamp.now().strftime('%Y%m%d'),
+            'priority': priority,
+            'top_k': top_k
+        }
+        if limit and not top_k:
+            return _first_matches(screen_key, market_types, industries, index_components, kline_pattern,
+                                  price_prediction, recent_bars, as_of, timeframe, adjust, reference,
+                                  priority, limit, cursor)
+
+        page_key = dict(screen_key, page=page, page_size=page_size)
+        cached_page = cache.get('screen_page', page_key)
+        if cached_page is not None:
+            logger.info("使用缓存的筛选结果页")
+            return cached_page
+
+        outcome = ScreenOutcome()
+        df = cache.get('screen', screen_key)
+        if df is not None:
+            logger.info(f"使用缓存的筛选结果，共 {len(df)} 只股票")
+        else:
+            df = _get_candidates(market_types, industries, index_components)
+            if df is None:
+                return {
+                    'data': [],
+                    'total': 0,
+                    'page': page,
+                    'page_size': page_size
+                }
+            if priority:
+                df = _prioritize(df, priority, screen_key['as_of'])
+
+            # K线形态与价格预测筛选，由执行计划决定顺序，不满足条件的股票跳过后续筛选器
+            filters = _create_pattern_filters(kline_pattern, price_prediction, timeframe, adjust, reference,
+                                              recent_bars=recent_bars, as_of=as_of)
+            if filters:
+                # 中途被取消或进程退出时，相同条件再次请求会从检查点继续
+                checkpoint = ScreenCheckpoint.for_screen(screen_key, screen_key['as_of'], top_k=top_k)
+                with observe_seconds(SCREEN_STAGE_SECONDS, 'pattern_filters'):
+                    if top_k:
+                        df = pd.DataFrame(get_planner().top_matches(df, filters, top_k, checkpoint=checkpoint,
+                                                                    outcome=outcome))
+                    else:
+                        df = get_planner().run(df, filters, checkpoint=checkpoint, outcome=outcome)
+                logger.info(f"形态与价格筛选后剩余股票数: {len(df)}")
+            elif top_k:
+                # 没有形态条件时没有评分，保留前 top_k 只
+                df = df.head(top_k)
+            if outcome.incomplete:
+                logger.warning(f"{len(outcome.undecided)} 只股票未能判断，筛选结果不缓存")
+            else:
+                cache.set('screen', screen_key, df, ttl=get_settings().CACHE_TTL)
         
         # 计算总数
         total = len(df)
@@ -146,100 +465,76 @@ def filter_stocks(
         df_page = df.iloc[start_idx:end_idx].copy()
         logger.info(f"当前页股票数: {len(df_page)}")
         
-        # 获取最新行情数据
-        if not df_page.empty:
-            stock_codes = ','.join(df_page['ts_code'].tolist())
-            logger.info(f"获取行情数据，股票代码: {stock_codes}")
-            try:
-                # 获取日线数据
-                logger.info("开始获取日线数据")
-                daily = ts_api.daily(ts_code=stock_codes)
-                logger.info(f"日线数据类型: {type(daily)}, 是否为空: {daily.empty if isinstance(daily, pd.DataFrame) else 'not DataFrame'}")
-                
-                if isinstance(daily, pd.DataFrame) and not daily.empty:
-                    daily = daily.sort_values('trade_date').groupby('ts_code').last()
-                    logger.info(f"处理后的日线数据列: {daily.columns.tolist()}")
-                    df_page = df_page.merge(daily[['close', 'pct_chg', 'vol', 'amount']], 
-                                    left_on='ts_code', right_index=True, how='left')
-                    df_page = df_page.rename(columns={
-                        'close': 'price',
-                        'vol': 'volume'
-                    })
-                    logger.info("日线数据合并完成")
-                
-                # 获取每日指标
-                logger.info("开始获取每日指标")
-                daily_basic = ts_api.daily_basic(ts_code=stock_codes)
-                logger.info(f"每日指标数据类型: {type(daily_basic)}, 是否为空: {daily_basic.empty if isinstance(daily_basic, pd.DataFrame) else 'not DataFrame'}")
-                
-                if isinstance(daily_basic, pd.DataFrame) and not daily_basic.empty:
-                    daily_basic = daily_basic.sort_values('trade_date').groupby('ts_code').last()
-                    logger.info(f"处理后的每日指标列: {daily_basic.columns.tolist()}")
-                    df_page = df_page.merge(daily_basic[['pe', 'pb', 'total_mv']], 
-                                    left_on='ts_code', right_index=True, how='left')
-                    logger.info("每日指标合并完成")
-            except Exception as e:
-                logger.error(f"获取行情数据失败: {str(e)}", exc_info=True)
-        
-        # 处理数据，确保JSON序列化不会出错
-        logger.info("开始处理数据进行JSON序列化")
-        result = []
-        for idx, row in df_page.iterrows():
-            try:
-                logger.debug(f"处理第 {idx} 行数据")
-                # 先转换为字典
-                row_dict = row.to_dict() if hasattr(row, 'to_dict') else dict(row)
-                logger.debug(f"行数据转换为字典: {row_dict}")
-                
-                stock_data = {
-                    'ts_code': str(row_dict.get('ts_code', '')),
-                    'name': str(row_dict.get('name', '')),
-                    'industry': str(row_dict.get('industry', '')),
-                    'market': str(row_dict.get('market', '')),
-                    'area': str(row_dict.get('area', '')),
-                    'list_date': str(row_dict.get('list_date', '')),
-                    'price': float(row_dict['price']) if pd.notna(row_dict.get('price')) else None,
-                    'change': float(row_dict['pct_chg']) if pd.notna(row_dict.get('pct_chg')) else None,
-                    'volume': float(row_dict['volume']) if pd.notna(row_dict.get('volume')) else None,
-                    'amount': float(row_dict['amount']) if pd.notna(row_dict.get('amount')) else None,
-                    'pe': float(row_dict['pe']) if pd.notna(row_dict.get('pe')) else None,
-                    'pb': float(row_dict['pb']) if pd.notna(row_dict.get('pb')) else None,
-                    'total_mv': float(row_dict['total_mv']) if pd.notna(row_dict.get('total_mv')) else None
-                }
-                result.append(stock_data)
-            except Exception as e:
-                logger.error(f"处理股票数据失败: {str(e)}, row: {row}", exc_info=True)
-                continue
-        
-        logger.info(f"数据处理完成，返回 {len(result)} 条记录")
-        return {
+        result = _page_rows(df_page)
+        response = {
             'data': result,
             'total': total,
             'page': page,
-            'page_size': page_size
+            'page_size': page_size,
+            'incomplete': outcome.incomplete,
+            'undecided': len(outcome.undecided)
         }
+        if not outcome.incomplete:
+            cache.set('screen_page', page_key, response, ttl=get_settings().CACHE_TTL)
+        return response
         
+    except CursorError:
+        raise
     except Exception as e:
         logger.error(f"筛选股票失败: {str(e)}", exc_info=True)
+        if limit:
+            return {'data': [], 'total': 0, 'limit': limit, 'has_more': False, 'next_cursor': None,
+                    'error': str(e)}
         return {
             'data': [],
             'total': 0,
             'page': page,
-            'page_size': page_size
+            'page_size': page_size,
+            'error': str(e)
         }
 
+def explain_screen(
+    market_types: List[str] = None,
+    industries: List[str] = None,
+    index_components: List[str] = None,
+    kline_pattern: str = None,
+    price_prediction: str = None,
+    recent_bars: Optional[int] = None,
+    as_of: Optional[str] = None,
+    timeframe: str = 'D',
+    adjust: Optional[str] = None,
+    reference: Optional[dict] = None
+) -> Dict[str, any]:
+    """估算筛选的执行计划、上游调用次数和耗时，不执行形态筛选"""
+    df = _get_candidates(market_types, industries, index_components)
+    candidate_count = 0 if df is None else len(df)
+    filters = _create_pattern_filters(kline_pattern, price_prediction, timeframe, resolve_adjust(adjust),
+                                      reference, recent_bars=recent_bars, as_of=as_of)
+    plan = get_planner().explain(filters, candidate_count)
+    # 股票列表和指数成分股各需要一次调用
+    plan['basic_calls'] = 1 + len(index_components or [])
+    plan['estimated_calls'] += plan['basic_calls']
+    return plan
+
 def get_stock_basic_info(stock_code: str) -> dict:
     """获取股票基础信息"""
     logger.info(f"获取股票{stock_code}的基础信息")
+    cache_key = {'ts_code': stock_code, 'date': pd.Timestamp.now().strftime('%Y%m%d')}
+    cached = get_cache().get('stock_info', cache_key)
+    if cached is not None:
+        return cached
     try:
+        provider = get_provider()
+        recent_start = (pd.Timestamp.now() - pd.Timedelta(days=30)).strftime('%Y%m%d')
+        
         # 获取基本信息
-        basic_info = ts_api.stock_basic(ts_code=stock_code, fields='ts_code,name,area,industry,market,list_date')
+        basic_info = provider.stock_basic(ts_code=stock_code, fields='ts_code,name,area,industry,market,list_date')
         
         # 获取实时行情
-        daily = ts_api.daily(ts_code=stock_code)
+        daily = provider.daily(ts_code=stock_code, start_date=recent_start)
         
         # 获取每日指标
-        daily_basic = ts_api.daily_basic(ts_code=stock_code)
+        daily_basic = provider.daily_basic(ts_code=stock_code, start_date=recent_start)
         
         if basic_info.empty:
             raise ValueError(f"股票不存在: {stock_code}")
@@ -266,11 +561,106 @@ def get_stock_basic_info(stock_code: str) -> dict:
                 'total_mv': float(daily_basic_latest.get('total_mv')) if pd.notna(daily_basic_latest.get('total_mv')) else None
             })
             
+        get_cache().set('stock_info', cache_key, result, ttl=get_settings().CACHE_TTL)
         return result
     except Exception as e:
         logger.error(f"获取股票{stock_code}基础信息时发生错误: {str(e)}", exc_info=True)
         raise
 
+def _choose_period(calendar: List[str], points: Optional[int], style: str) -> str:
+    """按目标点数选择K线周期
+
+    K线图选择点数不超过 points 的最细周期，月线仍超过时再按组归并；
+    折线图选择点数不少于 points 的最粗周期，再用 LTTB 降到 points 个点，
+    这样读取的数据量只与 points 有关，而与区间长短无关。
+    """
+    if not points or len(calendar) <= points:
+        return 'D'
+    counts = {'D': len(calendar)}
+    for period in ('W', 'M'):
+        counts[period] = len(set(period_keys(calendar, period)))
+    if style == 'line':
+        return next((p for p in ('M', 'W') if counts[p] >= points), 'D')
+    return next((p for p in ('W', 'M') if counts[p] <= points), 'M')
+
+def get_stock_kline(
+    stock_code: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    points: Optional[int] = None,
+    style: str = 'candle',
+    period: str = 'auto',
+    adjust: Optional[str] = 'none'
+) -> dict:
+    """获取用于绘图的K线
+
+    Args:
+        stock_code: 股票代码
+        start_date: 起始日期（YYYYMMDD），默认为 120 天前
+        end_date: 结束日期（YYYYMMDD），默认为当天
+        points: 目标点数，为空时不降采样
+        style: candle（保留开高低收的归并）/ line（对收盘价做 LTTB）
+        period: D / W / M，auto 时按 points 从日线、周线、月线中选择
+        adjust: 复权方式 qfq/hfq/none，默认不复权；为 None 时取配置 PRICE_ADJUST（前复权以 end_date 为基准）
+
+    Returns:
+        {'period': 实际使用的周期, 'data': K线列表}
+    """
+    end_date = end_date or pd.Timestamp.now().strftime('%Y%m%d')
+    start_date = start_date or (pd.Timestamp(end_date) - pd.Timedelta(days=120)).strftime('%Y%m%d')
+    provider = get_provider()
+    if period == 'auto':
+        period = _choose_period(provider.trade_dates(start_date, end_date), points, style)
+
+    df = period_bars(provider, stock_code, period, start_date, end_date, resolve_adjust(adjust))
+    if df is None or df.empty:
+        return {'period': period, 'data': []}
+    df = downsample_bars(df, points, style)
+
+    # 周线、月线以实际包含的最后一个交易日作为日期，未结束的周期不会显示为将来的日期
+    dates = df['bar_end'] if 'bar_end' in df.columns else df['trade_date']
+    data = pd.DataFrame({
+        'trade_date': dates.astype(str),
+        'open': df['open'].astype(float),
+        'close': df['close'].astype(float),
+        'high': df['high'].astype(float),
+        'low': df['low'].astype(float),
+        'volume': df['vol'].astype(float),
+        'amount': df['amount'].astype(float)
+    })
+    return {'period': period, 'data': data.to_dict('records')}
+
+def find_similar_stocks(
+    stock_code: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    top_n: int = 20,
+    band: Optional[int] = None,
+    market_types: List[str] = None,
+    industries: List[str] = None,
+    index_components: List[str] = None
+) -> dict:
+    """查找最近一个窗口（SIMILARITY_WINDOW 根日线）与参照K线形态最相似的股票
+
+    Args:
+        stock_code: 参照股票代码
+        start_date、end_date: 参照K线的起止日期（YYYYMMDD），都为空时取参照股票最近一个窗口；结果不包含参照股票本身
+        top_n: 返回的股票数
+        band: DTW 带宽，默认取配置 SIMILARITY_BAND，0 表示欧氏距离
+        market_types、industries、index_components: 只在基础筛选后的股票中查找
+
+    Returns:
+        {'data': 按相似度从高到低的股票, 'reference': 参照K线, 'window': 窗口长度,
+         'trade_date': 索引日期, 'stats': 各阶段的候选数}
+    """
+    candidates = get_candidates(market_types, industries, index_components)
+    codes = candidates['ts_code'] if market_types or industries or index_components else None
+    result, info = find_similar(get_provider(), stock_code, start_date, end_date, top_n, band, codes=codes)
+    if not candidates.empty:
+        columns = [c for c in ('ts_code', 'name', 'industry', 'market') if c in candidates.columns]
+        result = result.merge(candidates[columns], on='ts_code', how='left')
+    return dict(info, data=result.astype(object).where(result.notna(), None).to_dict('records'))
+
 async def get_deepseek_analysis(stock_code: str) -> dict:
     """获取DeepSeek分析结果
     
@@ -281,13 +671,18 @@ async def get_deepseek_analysis(stock_code: str) -> dict:
         分析结果字典
     """
     logger.info(f"开始获取股票{stock_code}的DeepSeek分析")
+    # 分析结果按股票和日期缓存，同一天重复查看不再调用 DeepSeek
+    cache_key = {'ts_code': stock_code, 'date': pd.Timestamp.now().strftime('%Y%m%d')}
+    cached = get_cache().get('analysis', cache_key)
+    if cached is not None:
+        return cached
     try:
         # 获取股票基础信息
         basic_info = get_stock_basic_info(stock_code)
         logger.info(f"获取到的基础信息: {basic_info}")
         
         # 获取最近的交易数据
-        daily_data = ts_api.daily(ts_code=stock_code, start_date=(pd.Timestamp.now() - pd.Timedelta(days=30)).strftime('%Y%m%d'))
+        daily_data = get_provider().daily(ts_code=stock_code, start_date=(pd.Timestamp.now() - pd.Timedelta(days=30)).strftime('%Y%m%d'))
         logger.info(f"获取到的交易数据: \n{daily_data.head() if not daily_data.empty else '无数据'}")
         
         # 构建分析提示词
@@ -333,7 +728,8 @@ async def get_deepseek_analysis(stock_code: str) -> dict:
 """
         logger.info(f"构建的提示词: {prompt}")
         
-        # 初始化DeepSeek客户端
+        # 初始化DeepSeek客户端（openai 客户端库导入较慢，用到时才导入）
+        from src.services.deepseek_client import DeepSeekClient
         deepseek = DeepSeekClient()
         logger.info("已初始化DeepSeek客户端")
         
@@ -347,10 +743,12 @@ async def get_deepseek_analysis(stock_code: str) -> dict:
         analysis = response.choices[0].message.content
         logger.info(f"DeepSeek返回的分析结果: {analysis}")
         
-        return {
+        result = {
             "content": analysis,
             "error": None
         }
+        get_cache().set('analysis', cache_key, result, ttl=get_settings().CACHE_ANALYSIS_TTL)
+        return result
         
     except Exception as e:
         logger.error(f"获取股票{stock_code}的DeepSeek分析失败: {str(e)}", exc_info=True)
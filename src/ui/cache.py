@@ -0,0 +1,91 @@
+import asyncio
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+import pandas as pd
+import streamlit as st
+from src.services import stock_service
+
+# Streamlit 每次交互都会重新执行脚本，这里对服务函数做页面级缓存。
+# 缓存键都带上当天日期，基础数据（股票列表、行业、候选股票）跨天自动失效；
+# 行情和详情在盘中会变化，另外设置较短的过期时间。
+BASIC_TTL = 6 * 3600
+DETAIL_TTL = 300
+
+def trading_day() -> str:
+    """缓存所属的日期（YYYYMMDD）"""
+    return datetime.now().strftime('%Y%m%d')
+
+@st.cache_data(ttl=BASIC_TTL, show_spinner=False)
+def _market_types(day: str) -> List[str]:
+    return stock_service.get_market_types()
+
+@st.cache_data(ttl=BASIC_TTL, show_spinner=False)
+def _industries(day: str) -> List[str]:
+    return stock_service.get_industries()
+
+@st.cache_data(show_spinner=False)
+def _index_components() -> List[Tuple[str, str]]:
+    return stock_service.get_index_components()
+
+@st.cache_data(ttl=BASIC_TTL, show_spinner="正在获取股票列表...")
+def _candidates(market_types: Tuple[str, ...], industries: Tuple[str, ...],
+                index_components: Tuple[str, ...], day: str) -> pd.DataFrame:
+    return stock_service.get_candidates(list(market_types), list(industries), list(index_components))
+
+@st.cache_data(ttl=DETAIL_TTL, show_spinner="正在获取行情与指标...")
+def _stock_info(stock_code: str, day: str) -> dict:
+    return stock_service.get_stock_basic_info(stock_code)
+
+def market_types() -> List[str]:
+    """市场类型列表，获取失败（空列表）时不缓存"""
+    result = _market_types(trading_day())
+    if not result:
+        _market_types.clear()
+    return result
+
+def industries() -> List[str]:
+    """行业列表，获取失败（空列表）时不缓存"""
+    result = _industries(trading_day())
+    if not result:
+        _industries.clear()
+    return result
+
+def index_components() -> List[Tuple[str, str]]:
+    """指数代码与名称"""
+    return _index_components()
+
+def candidates(market_types: Sequence[str], industries: Sequence[str],
+               index_components: Sequence[str]) -> pd.DataFrame:
+    """基础筛选结果，同一天相同条件只获取一次，获取失败（空表）时不缓存"""
+    args = (tuple(sorted(market_types)), tuple(sorted(industries)), tuple(sorted(index_components)),
+            trading_day())
+    result = _candidates(*args)
+    if result.empty:
+        _candidates.clear()
+    return result
+
+def stock_info(stock_code: str) -> Optional[dict]:
+    """股票行情与指标，获取失败时返回 None"""
+    try:
+        return _stock_info(stock_code, trading_day())
+    except Exception as e:
+        st.error(f"获取 {stock_code} 的详情失败: {str(e)}")
+        return None
+
+def stock_analysis(stock_code: str) -> dict:
+    """DeepSeek 分析结果，保存在会话中，重新执行脚本时直接显示
+
+    成功的结果在服务层已按股票和日期缓存，这里不再使用 st.cache_data，失败时下次点击可以重试。
+    """
+    analyses = st.session_state.setdefault('analyses', {})
+    key = (stock_code, trading_day())
+    if key not in analyses:
+        analysis = asyncio.run(stock_service.get_deepseek_analysis(stock_code))
+        if analysis.get('error'):
+            return analysis
+        analyses[key] = analysis
+    return analyses[key]
+
+def cached_analysis(stock_code: str) -> Optional[dict]:
+    """本次会话中已经获取过的分析结果"""
+    return st.session_state.get('analyses', {}).get((stock_code, trading_day()))
@@ -1,8 +1,13 @@
+import time
 import streamlit as st
-from src.services.stock_service import filter_stocks, get_stock_basic_info, get_deepseek_analysis
+from src.filters.checkpoint import ScreenCheckpoint
+from src.services.screen_job import ScreenJob
 from src.ui.stock_table import render_stock_table
 from src.filters.filter_factory import FilterFactory
 
+# 后台筛选进行中时页面的刷新间隔（秒）
+JOB_REFRESH_SECONDS = 1.0
+
 def render_main_content():
     """渲染主要内容区域"""
     tab1, tab2 = st.tabs(["高级筛选", "筛选结果"])
@@ -12,6 +17,12 @@ def render_main_content():
     
     with tab2:
         render_filter_results()
+    
+    # 后台筛选进行中时，页面其余部分渲染完之后定时刷新进度
+    job = st.session_state.get('screen_job')
+    if job is not None and job.running:
+        time.sleep(JOB_REFRESH_SECONDS)
+        st.rerun()
 
 def render_advanced_filter():
     """渲染高级筛选界面"""
@@ -19,42 +30,100 @@ def render_advanced_filter():
     
     # K线形态选择
     pattern_options = ['所有', 'V型底', 'W底', '启明之星', '圆弧底', '头肩底', '平底', '旭日东升', '看涨吞没', '红三兵', '锤头线']
-    pattern = st.radio(
+    st.radio(
         "K线形态",
         options=pattern_options,
         index=0,
+        key="advanced_pattern",
         help="选择要筛选的K线形态"
     )
     
     # 价格预测
-    price_prediction = st.radio(
+    st.radio(
         "价格预测",
         options=['所有', '涨停', '资金持续流入'],
         index=0,
+        key="advanced_price_prediction",
         help="选择价格预测类型"
     )
     
-    if st.button("应用高级筛选"):
-        # 获取当前筛选结果
-        filtered_stocks = st.session_state.get('filtered_stocks', None)
-        if filtered_stocks is not None:
-            # 应用K线形态筛选
-            if pattern != '所有':
-                kline_filter = FilterFactory.create_filter(pattern)
-                if kline_filter:
-                    filtered_stocks = kline_filter.filter(filtered_stocks)
-            
-            # 应用价格预测筛选
-            if price_prediction != '所有':
-                price_filter = FilterFactory.create_filter(price_prediction)
-                if price_filter:
-                    filtered_stocks = price_filter.filter(filtered_stocks)
-            
-            # 更新筛选结果
-            st.session_state['filtered_stocks'] = filtered_stocks
-            st.success(f"高级筛选完成，找到 {len(filtered_stocks)} 只股票")
-        else:
-            st.warning("请先进行基础筛选")
+    job = st.session_state.get('screen_job')
+    st.button("应用高级筛选", disabled=job is not None and job.running, on_click=start_screen_job)
+    
+    # 按钮回调中产生的提示
+    message = st.session_state.pop('screen_job_message', None)
+    if message:
+        st.warning(message)
+    
+    if job is not None:
+        render_screen_job(job)
+
+def start_screen_job():
+    """按钮回调：用当前筛选结果和所选条件启动后台筛选，每次点击只执行一次"""
+    pattern = st.session_state['advanced_pattern']
+    price_prediction = st.session_state['advanced_price_prediction']
+    # 获取当前筛选结果
+    filtered_stocks = st.session_state.get('filtered_stocks', None)
+    if filtered_stocks is None:
+        st.session_state['screen_job_message'] = "请先进行基础筛选"
+        return
+    
+    filters = []
+    # K线形态筛选
+    if pattern != '所有':
+        kline_filter = FilterFactory.create_filter(pattern)
+        if kline_filter:
+            filters.append(kline_filter)
+    
+    # 价格预测筛选
+    if price_prediction != '所有':
+        price_filter = FilterFactory.create_filter(price_prediction)
+        if price_filter:
+            filters.append(price_filter)
+    
+    if not filters:
+        st.session_state['screen_job_message'] = "请选择K线形态或价格预测"
+        return
+    
+    # 相同条件和候选股票在同一天重新启动时从上次取消的位置继续
+    checkpoint = ScreenCheckpoint.for_screen({
+        'kline_pattern': pattern,
+        'price_prediction': price_prediction,
+        'candidates': sorted(filtered_stocks.get('ts_code', []))
+    })
+    # 在后台线程中执行，页面不被阻塞，可以随时取消
+    st.session_state['screen_job'] = ScreenJob(filtered_stocks, filters, checkpoint=checkpoint).start()
+    st.session_state['screen_job_applied'] = False
+
+def render_screen_job(job: ScreenJob):
+    """显示后台筛选的进度和已找到的结果"""
+    progress = job.processed / job.total if job.total else 1.0
+    if job.running:
+        eta = f"，预计剩余 {job.eta:.0f} 秒" if job.eta is not None else ""
+        st.progress(progress, text=f"已处理 {job.processed}/{job.total} 只股票，"
+                                   f"找到 {job.match_count} 只，已用时 {job.elapsed:.0f} 秒{eta}")
+        st.button("取消筛选", on_click=job.cancel)
+    elif job.status == ScreenJob.DONE:
+        # 完成后把结果作为新的筛选结果（每个任务只替换一次）
+        if not st.session_state.get('screen_job_applied'):
+            st.session_state['filtered_stocks'] = job.matches()
+            st.session_state['screen_job_applied'] = True
+        st.success(f"高级筛选完成，找到 {job.match_count} 只股票，耗时 {job.elapsed:.1f} 秒")
+        if job.outcome.incomplete:
+            st.warning(job.error)
+    elif job.status == ScreenJob.CANCELLED:
+        st.info(f"筛选已取消，处理了 {job.processed}/{job.total} 只股票，找到 {job.match_count} 只")
+        if job.match_count and not st.session_state.get('screen_job_applied'):
+            if st.button("使用已找到的结果"):
+                st.session_state['filtered_stocks'] = job.matches()
+                st.session_state['screen_job_applied'] = True
+    else:
+        st.error(f"高级筛选失败: {job.error}")
+    
+    if job.match_count:
+        matches = job.matches()
+        st.dataframe(matches[[col for col in ['ts_code', 'name', 'industry', 'market'] if col in matches.columns]],
+                     use_container_width=True)
 
 def render_filter_results():
     """渲染筛选结果tab"""
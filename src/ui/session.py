@@ -1,14 +1,6 @@
 import streamlit as st
-import tushare as ts
-from src.api.config import get_settings
 import logging
 
-# 获取配置
-settings = get_settings()
-
-# 初始化Tushare API
-ts_api = ts.pro_api(settings.TUSHARE_TOKEN)
-
 # 设置日志级别
 logging.basicConfig(level=logging.INFO)
 
@@ -30,4 +22,4 @@ def init_session_state():
         st.session_state.kline_pattern = None
         
     if 'price_prediction' not in st.session_state:
-        st.session_state.price_prediction = None 
\ No newline at end of file
+        st.session_state.price_prediction = None 
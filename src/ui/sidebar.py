@@ -1,6 +1,6 @@
 import streamlit as st
-from src.services.stock_service import get_market_types, get_industries, get_index_components, filter_stocks
-from src.utils.config import init_session_state
+from src.ui import cache
+from src.ui.session import init_session_state
 
 def render_sidebar():
     """渲染侧边栏"""
@@ -11,7 +11,7 @@ def render_sidebar():
     
     # 市场类型筛选
     st.sidebar.subheader("市场类型")
-    market_types = get_market_types()
+    market_types = cache.market_types()
     selected_market_types = st.sidebar.multiselect(
         "选择市场类型",
         options=market_types,
@@ -21,7 +21,7 @@ def render_sidebar():
     
     # 行业分类筛选
     st.sidebar.subheader("行业分类")
-    industries = get_industries()
+    industries = cache.industries()
     selected_industries = st.sidebar.multiselect(
         "选择行业",
         options=industries,
@@ -31,7 +31,7 @@ def render_sidebar():
     
     # 指数成分股筛选
     st.sidebar.subheader("指数成分股")
-    index_components = get_index_components()
+    index_components = cache.index_components()
     selected_indices = st.sidebar.multiselect(
         "选择指数",
         options=[name for _, name in index_components],
@@ -46,16 +46,11 @@ def render_sidebar():
     ]
     
     # 应用筛选按钮
+    # 基础筛选只得到候选股票列表，形态筛选在“高级筛选”中进行
     if st.sidebar.button("应用筛选"):
-        filtered_stocks = filter_stocks(
-            market_types=selected_market_types,
-            industries=selected_industries,
-            index_components=selected_index_codes,
-            kline_pattern=st.session_state.get('kline_pattern'),
-            price_prediction=st.session_state.get('price_prediction')
-        )
+        filtered_stocks = cache.candidates(selected_market_types, selected_industries, selected_index_codes)
         
-        if filtered_stocks is not None:
+        if not filtered_stocks.empty:
             st.session_state['filtered_stocks'] = filtered_stocks
             st.sidebar.success(f"找到 {len(filtered_stocks)} 只股票")
         else:
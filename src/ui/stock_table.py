@@ -1,28 +1,33 @@
 import streamlit as st
 import pandas as pd
-import asyncio
-from src.services.stock_service import get_stock_basic_info, get_deepseek_analysis
+from src.ui import cache
 from typing import Optional
 
+# 详情中显示的行情与指标
+DETAIL_FIELDS = [('price', '最新价'), ('change', '涨跌幅(%)'), ('volume', '成交量(手)'), ('amount', '成交额(千元)'),
+                 ('pe', '市盈率'), ('pb', '市净率'), ('total_mv', '总市值')]
+
 def render_stock_table(stocks_df: Optional[pd.DataFrame]):
     """渲染股票表格"""
     if stocks_df is None or len(stocks_df) == 0:
         st.info("请先进行筛选")
         return
         
-    # 显示股票表格
+    # 显示股票表格（高级筛选的结果带有形态强度评分）
+    columns = ['ts_code', 'name', 'industry', 'market'] + (['score'] if 'score' in stocks_df.columns else [])
     st.dataframe(
-        stocks_df[['ts_code', 'name', 'industry', 'market']].rename(columns={
+        stocks_df[columns].rename(columns={
             'ts_code': '股票代码',
             'name': '股票名称',
             'industry': '所属行业',
-            'market': '市场类型'
+            'market': '市场类型',
+            'score': '强度评分'
         }),
         use_container_width=True
     )
     
-    # 创建股票选择下拉框
-    stock_options = [f"{row['ts_code']} - {row['name']}" for _, row in stocks_df.iterrows()]
+    # 创建股票选择下拉框（按列拼接，不逐行遍历）
+    stock_options = (stocks_df['ts_code'] + ' - ' + stocks_df['name'].astype(str)).tolist()
     selected_stock = st.selectbox(
         "选择股票查看详情",
         options=stock_options,
@@ -34,12 +39,13 @@ def render_stock_table(stocks_df: Optional[pd.DataFrame]):
         stock_code = selected_stock.split(' - ')[0]
         stock_info = stocks_df[stocks_df['ts_code'] == stock_code].iloc[0]
         
-        # 创建两个标签页
-        tab1, tab2 = st.tabs(["基础信息", "DeepSeek分析"])
+        # 只渲染选中的面板，未打开的面板不获取数据
+        view = st.radio("查看", ["基础信息", "DeepSeek分析"], horizontal=True,
+                        key="detail_view", label_visibility="collapsed")
         
-        with tab1:
+        if view == "基础信息":
             st.subheader("基础信息")
-            # 显示基本信息
+            # 显示基本信息（来自筛选结果，不需要网络请求）
             info_cols = st.columns(2)
             with info_cols[0]:
                 st.write(f"**股票代码：** {stock_info['ts_code']}")
@@ -47,38 +53,31 @@ def render_stock_table(stocks_df: Optional[pd.DataFrame]):
                 st.write(f"**所属行业：** {stock_info['industry']}")
             with info_cols[1]:
                 st.write(f"**市场类型：** {stock_info['market']}")
-                st.write(f"**地区：** {stock_info['area']}")
-                st.write(f"**上市日期：** {stock_info['list_date']}")
-            
-            info = get_stock_basic_info(stock_code)
-            # 显示实时行情
-            if '实时行情' in info:
-                st.subheader("实时行情")
-                st.write(pd.DataFrame([info['实时行情']]))
+                st.write(f"**地区：** {stock_info.get('area', '')}")
+                st.write(f"**上市日期：** {stock_info.get('list_date', '')}")
             
-            # 显示财务指标
-            if '财务指标' in info:
-                st.subheader("财务指标")
-                st.write(pd.DataFrame([info['财务指标']]))
-    
-        with tab2:
+            # 行情与指标需要调用数据接口，展开后才获取
+            if st.toggle("显示最新行情与指标", key=f"detail_{stock_code}"):
+                info = cache.stock_info(stock_code)
+                if info:
+                    st.subheader("最新行情与指标")
+                    st.write(pd.DataFrame([{label: info.get(field) for field, label in DETAIL_FIELDS}]))
+        else:
             st.subheader("DeepSeek分析")
             
-            # 添加立即分析按钮
-            if st.button("立即分析", key=f"analyze_{stock_code}"):
+            # 本次会话中已经分析过的股票直接显示
+            analysis = cache.cached_analysis(stock_code)
+            if analysis is None and st.button("立即分析", key=f"analyze_{stock_code}"):
                 with st.spinner("正在进行深度分析..."):
                     try:
-                        # 调用异步分析函数
-                        analysis = asyncio.run(get_deepseek_analysis(stock_code))
-                        
-                        if analysis.get("error"):
-                            st.error(f"分析失败: {analysis['error']}")
-                        else:
-                            # 使用 markdown 显示分析结果
-                            st.markdown(analysis["content"])
-                            
+                        analysis = cache.stock_analysis(stock_code)
                     except Exception as e:
                         st.error(f"分析过程中发生错误: {str(e)}")
+            
+            if analysis is None:
+                st.info("点击立即分析按钮获取 DeepSeek 的专业分析结果")
+            elif analysis.get("error"):
+                st.error(f"分析失败: {analysis['error']}")
             else:
-                st.info("点击立即分析按钮获取 DeepSeek 的专业分析结果") 
-   
\ No newline at end of file
+                # 使用 markdown 显示分析结果
+                st.markdown(analysis["content"])
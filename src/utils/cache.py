@@ -0,0 +1,285 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Optional
+from urllib.parse import urlparse
+import hashlib
+import io
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import pandas as pd
+from src.api.config import get_settings
+from src.utils.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# 序列化格式标记：DataFrame 保存为 parquet，其余对象保存为 JSON
+_PARQUET = b'P'
+_JSON = b'J'
+
+def dumps(value: Any) -> bytes:
+    """把缓存值序列化为字节"""
+    if isinstance(value, pd.DataFrame):
+        buffer = io.BytesIO()
+        value.to_parquet(buffer, compression='zstd')
+        return _PARQUET + buffer.getvalue()
+    return _JSON + json.dumps(value, ensure_ascii=False, default=str).encode('utf-8')
+
+def loads(data: bytes) -> Any:
+    """反序列化 dumps 的结果"""
+    tag, body = data[:1], data[1:]
+    if tag == _PARQUET:
+        return pd.read_parquet(io.BytesIO(body))
+    if tag == _JSON:
+        return json.loads(body.decode('utf-8'))
+    raise ValueError(f"未知的缓存数据格式: {tag!r}")
+
+class CacheBackend(ABC):
+    """缓存后端
+
+    子类只需实现按字节读写；get/set 负责生成键、序列化和统计命中率，
+    并吞掉后端错误（缓存不可用时按未命中处理，不影响业务）。
+    """
+
+    name = 'base'
+
+    @abstractmethod
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def set_bytes(self, key: str, value: bytes, ttl: Optional[float] = None):
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        pass
+
+    @staticmethod
+    def make_key(namespace: str, key: Any) -> str:
+        """由命名空间和参数生成缓存键，参数可以是任意可 JSON 序列化的对象"""
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True, ensure_ascii=False, default=str)
+                              .encode('utf-8')).hexdigest()
+        return f"ssf:{namespace}:{digest}"
+
+    def get(self, namespace: str, key: Any) -> Optional[Any]:
+        """读取缓存，未命中或读取失败时返回 None"""
+        try:
+            data = self.get_bytes(self.make_key(namespace, key))
+            value = loads(data) if data is not None else None
+        except Exception as e:
+            logger.warning(f"读取缓存 {namespace} 失败: {str(e)}")
+            value = None
+        CACHE_REQUESTS.labels(namespace, 'hit' if value is not None else 'miss').inc()
+        return value
+
+    def set(self, namespace: str, key: Any, value: Any, ttl: Optional[float] = None):
+        """写入缓存，ttl 为秒数，为空时不过期"""
+        try:
+            self.set_bytes(self.make_key(namespace, key), dumps(value), ttl)
+        except Exception as e:
+            logger.warning(f"写入缓存 {namespace} 失败: {str(e)}")
+
+class MemoryCache(CacheBackend):
+    """进程内缓存，超过 max_entries 时淘汰最久未使用的条目"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set_bytes(self, key: str, value: bytes, ttl: Optional[float] = None):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl if ttl else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+class SqliteCache(CacheBackend):
+    """SQLite 文件缓存，同一台机器上的多个工作进程共享"""
+
+    name = 'sqlite'
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS cache '
+                         '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)')
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个线程一个连接；WAL 模式下读写互不阻塞"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        row = self._connection().execute(
+            'SELECT value FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+            (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set_bytes(self, key: str, value: bytes, ttl: Optional[float] = None):
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                         (key, value, now + ttl if ttl else None))
+            # 顺带清理已过期的条目
+            conn.execute('DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?', (now,))
+
+    def delete(self, key: str):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+class RedisCache(CacheBackend):
+    """Redis 协议（RESP）缓存，适用于 Redis 及兼容的服务，多台主机共享
+
+    只用到 AUTH、SELECT、GET、SET EX 和 DEL 命令，直接通过 socket 实现，不依赖额外的客户端库。
+    URL 格式：redis://[:password@]host[:port][/db]
+    """
+
+    name = 'redis'
+
+    def __init__(self, url: str, timeout: float = 2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+        # 连接失败后的一段时间内不再尝试，避免服务不可用时每次读写都等待超时
+        self._retry_after = 0.0
+
+    def _connect(self):
+        if time.monotonic() < self._retry_after:
+            raise ConnectionError("Redis 暂时不可用")
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except OSError:
+            self._retry_after = time.monotonic() + 30
+            raise
+        self._local.sock = sock
+        self._local.reader = sock.makefile('rb')
+        try:
+            if self.password:
+                self._execute('AUTH', self.password)
+            if self.db:
+                self._execute('SELECT', str(self.db))
+        except Exception:
+            # 认证或选库失败时不保留半初始化的连接，下次读写重新连接
+            self._close()
+            raise
+
+    def _close(self):
+        for name in ('reader', 'sock'):
+            resource = getattr(self._local, name, None)
+            if resource is not None:
+                try:
+                    resource.close()
+                except OSError:
+                    pass
+            setattr(self._local, name, None)
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        return b''.join(parts)
+
+    def _read_reply(self):
+        line = self._local.reader.readline()
+        if not line:
+            raise ConnectionError("Redis 连接已关闭")
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body.decode('utf-8')
+        if kind == b'-':
+            raise RuntimeError(f"Redis 错误: {body.decode('utf-8')}")
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            length = int(body)
+            if length < 0:
+                return None
+            data = self._local.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            count = int(body)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise ConnectionError(f"无法解析的 Redis 响应: {line!r}")
+
+    def _execute(self, *args):
+        self._local.sock.sendall(self._encode(args))
+        return self._read_reply()
+
+    def command(self, *args):
+        """执行一条命令，连接断开时重连一次"""
+        for attempt in range(2):
+            if getattr(self._local, 'sock', None) is None:
+                self._connect()
+            try:
+                return self._execute(*args)
+            except (OSError, ConnectionError):
+                self._close()
+                if attempt:
+                    raise
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        return self.command('GET', key)
+
+    def set_bytes(self, key: str, value: bytes, ttl: Optional[float] = None):
+        if ttl:
+            self.command('SET', key, value, 'EX', max(1, int(ttl)))
+        else:
+            self.command('SET', key, value)
+
+    def delete(self, key: str):
+        self.command('DEL', key)
+
+def create_cache(settings) -> CacheBackend:
+    """按配置创建缓存后端"""
+    backend = settings.CACHE_BACKEND
+    if backend == 'memory':
+        return MemoryCache()
+    if backend == 'sqlite':
+        return SqliteCache(settings.CACHE_URL or 'data/cache.sqlite')
+    if backend == 'redis':
+        return RedisCache(settings.CACHE_URL or 'redis://127.0.0.1:6379/0')
+    raise ValueError(f"未知的缓存后端类型: {backend}")
+
+@lru_cache()
+def get_cache() -> CacheBackend:
+    """获取按配置创建的缓存后端单例"""
+    return create_cache(get_settings())
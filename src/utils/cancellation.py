@@ -0,0 +1,90 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+import threading
+import time
+
+# 取消原因
+DEADLINE = 'deadline'
+DISCONNECTED = 'disconnected'
+
+class Cancelled(BaseException):
+    """请求已取消（客户端断开或超过截止时间）
+
+    与 KeyboardInterrupt 一样继承 BaseException：筛选器里大量 except Exception 的容错代码
+    不会把它当作单只股票的错误吞掉，而是一直传到请求入口。
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+class CancelToken:
+    """协作式取消令牌
+
+    由请求入口创建，在工作线程中通过 scope 设为当前令牌；筛选循环和上游调用处调用 check，
+    令牌被取消或超过截止时间后抛出 Cancelled。提供与 threading.Event 相同的 is_set，
+    可以直接作为 ScreenPlanner.iter_matches 的 stop 参数。
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+
+    def cancel(self, reason: str = DISCONNECTED):
+        if self.reason is None:
+            self.reason = reason
+        self._event.set()
+
+    @property
+    def remaining(self) -> Optional[float]:
+        """距离截止时间的秒数，没有截止时间时为 None"""
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def is_set(self) -> bool:
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel(DEADLINE)
+        return self._event.is_set()
+
+    def check(self):
+        if self.is_set():
+            raise Cancelled(self.reason)
+
+    def sleep(self, seconds: float):
+        """可被取消打断的等待"""
+        remaining = self.remaining
+        if remaining is not None:
+            # 截止时间先到时只等到截止时间，随后的 check 抛出 Cancelled
+            seconds = min(seconds, max(remaining, 0))
+        self._event.wait(seconds)
+        self.check()
+
+_current: ContextVar[Optional[CancelToken]] = ContextVar('cancel_token', default=None)
+
+@contextmanager
+def scope(token: CancelToken):
+    """在代码块内把 token 设为当前令牌"""
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+def current() -> Optional[CancelToken]:
+    """当前令牌，不在请求中（如后台任务、命令行）时为 None"""
+    return _current.get()
+
+def check():
+    """当前令牌已取消时抛出 Cancelled，没有令牌时什么也不做"""
+    token = _current.get()
+    if token is not None:
+        token.check()
+
+def sleep(seconds: float):
+    """等待指定秒数，当前请求被取消时提前抛出 Cancelled"""
+    token = _current.get()
+    if token is None:
+        time.sleep(seconds)
+    else:
+        token.sleep(seconds)
@@ -0,0 +1,119 @@
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+
+# 单只股票的耗时一般在毫秒到秒级，整体筛选可达数十分钟
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+REQUEST_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 180, 600, 1800)
+
+REQUEST_LATENCY = Histogram(
+    'ssf_http_request_duration_seconds',
+    'HTTP 请求耗时（按路由）',
+    ['method', 'route', 'status'],
+    buckets=REQUEST_BUCKETS
+)
+
+SCREEN_STAGE_SECONDS = Histogram(
+    'ssf_screen_stage_seconds',
+    'filter_stocks 各阶段耗时',
+    ['stage'],
+    buckets=REQUEST_BUCKETS
+)
+
+FILTER_STAGE_SECONDS = Histogram(
+    'ssf_filter_stage_seconds',
+    '筛选器处理单只股票时数据获取（fetch）与计算（compute）的耗时',
+    ['filter', 'stage'],
+    buckets=STAGE_BUCKETS
+)
+
+STOCKS_PROCESSED = Counter(
+    'ssf_stocks_processed_total',
+    '筛选器处理的股票数量',
+    ['filter', 'result']
+)
+
+UPSTREAM_CALLS = Counter(
+    'ssf_upstream_calls_total',
+    '上游数据接口调用次数',
+    ['provider', 'endpoint', 'status']
+)
+
+UPSTREAM_LATENCY = Histogram(
+    'ssf_upstream_call_seconds',
+    '上游数据接口调用耗时',
+    ['provider', 'endpoint'],
+    buckets=STAGE_BUCKETS
+)
+
+CACHE_REQUESTS = Counter(
+    'ssf_cache_requests_total',
+    '缓存命中与未命中次数',
+    ['cache', 'result']
+)
+
+RATE_LIMIT_WAIT_SECONDS = Counter(
+    'ssf_rate_limit_wait_seconds_total',
+    '因上游限流而等待的总秒数',
+    ['endpoint']
+)
+
+UPSTREAM_RETRIES = Counter(
+    'ssf_upstream_retries_total',
+    '上游接口调用的重试次数（quota 为调用超限，transient 为网络错误）',
+    ['endpoint', 'reason']
+)
+
+UPSTREAM_RATE = Gauge(
+    'ssf_upstream_rate_per_minute',
+    '上游接口当前的每分钟调用速率',
+    ['endpoint'],
+    multiprocess_mode='max'
+)
+
+ADMISSION_REJECTED = Counter(
+    'ssf_admission_rejected_total',
+    '因并发上限被拒绝的重请求数',
+    ['route', 'status']
+)
+
+REQUESTS_CANCELLED = Counter(
+    'ssf_requests_cancelled_total',
+    '中途停止的重请求数（客户端断开或超过截止时间）',
+    ['route', 'reason']
+)
+
+@contextmanager
+def observe_seconds(histogram: Histogram, *labels):
+    """记录代码块耗时到指定的直方图"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(*labels).observe(time.perf_counter() - start)
+
+def render_metrics() -> tuple:
+    """生成 Prometheus 文本格式的指标
+
+    多进程部署（如多个 uvicorn worker）时设置 PROMETHEUS_MULTIPROC_DIR，
+    汇总所有进程写入的指标。
+
+    Returns:
+        (内容, Content-Type)
+    """
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,113 @@
+import argparse
+import cProfile
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# cProfile 同一时间只能在一个线程上挂一个分析器，并发请求时只分析其中一个
+_profile_lock = threading.Lock()
+
+def new_request_id() -> str:
+    """生成请求ID"""
+    return uuid.uuid4().hex[:16]
+
+class ProfileSession:
+    """一次性能分析会话的结果"""
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.elapsed: Optional[float] = None
+        self.path: Optional[str] = None
+
+def _write_profile(profiler: cProfile.Profile, session: ProfileSession, output_dir: str):
+    """写出 pstats 文件和按累计耗时排序的文本摘要"""
+    os.makedirs(output_dir, exist_ok=True)
+    base = os.path.join(output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{session.request_id}")
+    profiler.dump_stats(f"{base}.prof")
+
+    summary = io.StringIO()
+    stats = pstats.Stats(profiler, stream=summary)
+    stats.sort_stats('cumulative').print_stats(40)
+    with open(f"{base}.txt", 'w', encoding='utf-8') as f:
+        f.write(f"request_id: {session.request_id}\nelapsed: {session.elapsed:.3f}s\n\n")
+        f.write(summary.getvalue())
+
+    session.path = f"{base}.prof"
+    logger.info(f"请求 {session.request_id} 耗时 {session.elapsed:.1f}秒，性能分析已保存到 {session.path}")
+
+@contextmanager
+def profile_request(request_id: str, output_dir: str, force: bool = False,
+                    slow_threshold: float = 0):
+    """对代码块做确定性性能分析（cProfile）
+
+    Args:
+        request_id: 请求ID，用于命名分析文件
+        output_dir: 分析文件保存目录
+        force: 是否无论耗时都保存分析结果（请求头或配置显式开启）
+        slow_threshold: 耗时超过该秒数时自动保存，0 表示不启用
+
+    分析文件为 pstats 格式（.prof），可以用 snakeviz 查看，或用 flameprof 生成火焰图；
+    同名的 .txt 文件是按累计耗时排序的前 40 个函数。
+    """
+    session = ProfileSession(request_id)
+    if not force and slow_threshold <= 0:
+        yield session
+        return
+
+    if not _profile_lock.acquire(blocking=False):
+        logger.debug(f"已有请求正在进行性能分析，跳过 {request_id}")
+        yield session
+        return
+
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield session
+    finally:
+        profiler.disable()
+        _profile_lock.release()
+        session.elapsed = time.perf_counter() - start
+        if force or session.elapsed >= slow_threshold:
+            try:
+                _write_profile(profiler, session, output_dir)
+            except Exception as e:
+                logger.error(f"保存性能分析结果失败: {str(e)}")
+
+def main():
+    """命令行：对一次筛选做性能分析"""
+    from src.api.config import get_settings
+    from src.services.stock_service import filter_stocks
+
+    parser = argparse.ArgumentParser(description="对一次股票筛选做性能分析")
+    parser.add_argument('--market-types', nargs='*', default=None, help="市场类型，如 主板 创业板")
+    parser.add_argument('--industries', nargs='*', default=None, help="行业")
+    parser.add_argument('--index-components', nargs='*', default=None, help="指数代码，如 000300.SH")
+    parser.add_argument('--kline-pattern', default=None, help="K线形态，如 锤头线")
+    parser.add_argument('--price-prediction', default=None, help="价格预测，如 涨停")
+    parser.add_argument('--output-dir', default=None, help="分析文件保存目录")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    request_id = new_request_id()
+    with profile_request(request_id, args.output_dir or settings.PROFILE_DIR, force=True) as session:
+        result = filter_stocks(
+            market_types=args.market_types,
+            industries=args.industries,
+            index_components=args.index_components,
+            kline_pattern=args.kline_pattern,
+            price_prediction=args.price_prediction
+        )
+    print(f"筛选结果: {result.get('total', 0)} 只股票，耗时 {session.elapsed:.1f}秒")
+    print(f"性能分析文件: {session.path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""启动耗时基准
+
+uvicorn 每个工作进程启动、--reload 每次重启都要重新导入 src.api.main，
+导入越慢，扩容和开发时的等待就越长。这里在全新的子进程中多次导入指定模块，
+报告导入耗时，并检查不应在启动时加载的重型依赖（Streamlit、scipy、statsmodels、numba、
+talib、openai、tushare）是否被导入。超出预算或加载了重型依赖时以非零状态退出，可以放进 CI：
+    python -m src.utils.startup --budget 1.5
+    python -m src.utils.startup --top 15   # 列出累计耗时最多的模块
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+# 启动时不应加载的模块，只在用到对应功能时才导入
+HEAVY_MODULES = ('streamlit', 'scipy', 'statsmodels', 'numba', 'talib', 'openai', 'tushare')
+
+_PROBE = """
+import importlib, json, sys, time
+start = time.perf_counter()
+importlib.import_module({module!r})
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'loaded': [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+def _run(args: List[str]) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='0')
+    return subprocess.run([sys.executable] + args, capture_output=True, text=True, env=env,
+                          cwd=os.getcwd())
+
+def measure(module: str) -> Tuple[float, float, List[str]]:
+    """在新进程中导入模块一次
+
+    Returns:
+        (导入耗时, 包含解释器启动的进程总耗时, 已加载的重型模块)
+    """
+    start = time.perf_counter()
+    result = _run(['-c', _PROBE.format(module=module, heavy=HEAVY_MODULES)])
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr}")
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    return data['seconds'], wall, data['loaded']
+
+def top_imports(module: str, count: int) -> List[Tuple[float, str]]:
+    """用 -X importtime 找出累计耗时最多的模块（秒, 模块名）"""
+    result = _run(['-X', 'importtime', '-c', f"import {module}"])
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative) / 1e6, name.rstrip()))
+    rows.sort(reverse=True)
+    return rows[:count]
+
+def main():
+    parser = argparse.ArgumentParser(description="测量模块在新进程中的导入耗时")
+    parser.add_argument('--module', default='src.api.main', help="要导入的模块")
+    parser.add_argument('--runs', type=int, default=5, help="重复次数（第一次可能包含写字节码缓存）")
+    parser.add_argument('--budget', type=float, default=0, help="导入耗时中位数的上限（秒），0 表示不检查")
+    parser.add_argument('--top', type=int, default=0, help="列出累计耗时最多的前 N 个模块")
+    args = parser.parse_args()
+
+    samples, walls, loaded = [], [], set()
+    for _ in range(args.runs):
+        seconds, wall, heavy = measure(args.module)
+        samples.append(seconds)
+        walls.append(wall)
+        loaded.update(heavy)
+    median = statistics.median(samples)
+    print(f"{args.module}: 导入耗时中位数 {median:.3f}秒（最快 {min(samples):.3f}秒），"
+          f"进程总耗时中位数 {statistics.median(walls):.3f}秒，共 {args.runs} 次")
+
+    if args.top:
+        for seconds, name in top_imports(args.module, args.top):
+            print(f"  {seconds:7.3f}秒  {name}")
+
+    failed = False
+    if loaded:
+        print(f"启动时加载了重型依赖: {', '.join(sorted(loaded))}")
+        failed = True
+    if args.budget and median > args.budget:
+        print(f"导入耗时超出预算 {args.budget:.3f}秒")
+        failed = True
+    raise SystemExit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
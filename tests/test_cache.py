@@ -0,0 +1,131 @@
+"""缓存后端的读写往返测试
+
+memory、sqlite 直接测试；redis 默认使用进程内的 RESP 桩服务（只实现缓存用到的命令），
+设置 TEST_REDIS_URL（如 redis://127.0.0.1:6379/15）时改为连接真实的 Redis 兼容服务：
+    python -m pytest tests/test_cache.py
+"""
+import os
+import socketserver
+import threading
+import time
+import pandas as pd
+import pytest
+from src.utils.cache import MemoryCache, RedisCache, SqliteCache
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    """按 RESP 协议处理 AUTH、SELECT、GET、SET [EX]、DEL"""
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        server = self.server
+        authenticated = server.password is None
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            name = args[0].decode().upper()
+            if name == 'AUTH':
+                authenticated = args[1].decode() == server.password
+                self.wfile.write(b'+OK\r\n' if authenticated else b'-WRONGPASS invalid password\r\n')
+            elif not authenticated:
+                self.wfile.write(b'-NOAUTH Authentication required.\r\n')
+            elif name == 'SELECT':
+                self.wfile.write(b'+OK\r\n')
+            elif name == 'SET':
+                expires_at = time.time() + int(args[4]) if len(args) > 4 else None
+                server.data[args[1]] = (args[2], expires_at)
+                self.wfile.write(b'+OK\r\n')
+            elif name == 'GET':
+                value, expires_at = server.data.get(args[1], (None, None))
+                if value is None or (expires_at is not None and expires_at <= time.time()):
+                    self.wfile.write(b'$-1\r\n')
+                else:
+                    self.wfile.write(b'$%d\r\n%s\r\n' % (len(value), value))
+            elif name == 'DEL':
+                self.wfile.write(b':%d\r\n' % int(server.data.pop(args[1], None) is not None))
+            else:
+                self.wfile.write(b'-ERR unknown command\r\n')
+
+class _RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, password=None):
+        super().__init__(('127.0.0.1', 0), _RespHandler)
+        self.password = password
+        self.data = {}
+
+@pytest.fixture
+def resp_server():
+    """启动桩服务的工厂，测试结束时关闭"""
+    servers = []
+
+    def start(password=None):
+        server = _RespServer(password)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def cache(request, tmp_path, resp_server):
+    if request.param == 'memory':
+        return MemoryCache()
+    if request.param == 'sqlite':
+        return SqliteCache(str(tmp_path / 'cache.sqlite'))
+    url = os.getenv('TEST_REDIS_URL')
+    if not url:
+        url = f"redis://127.0.0.1:{resp_server().server_address[1]}/1"
+    return RedisCache(url)
+
+def test_dataframe_round_trip(cache):
+    df = pd.DataFrame({'ts_code': ['000001.SZ', '600000.SH'], 'close': [10.5, 7.25],
+                       'vol': [1200, 3400]})
+    cache.set('kline', {'ts_code': '000001.SZ'}, df)
+    pd.testing.assert_frame_equal(cache.get('kline', {'ts_code': '000001.SZ'}), df)
+
+def test_json_round_trip(cache):
+    value = {'stocks': [{'ts_code': '000001.SZ', 'name': '平安银行', 'score': 81.5}], 'total': 1}
+    cache.set('filter', ['V型底', 20], value)
+    assert cache.get('filter', ['V型底', 20]) == value
+    assert cache.get('filter', ['V型底', 30]) is None
+
+def test_delete(cache):
+    cache.set('analysis', 'key', {'text': '分析'})
+    cache.delete(cache.make_key('analysis', 'key'))
+    assert cache.get('analysis', 'key') is None
+
+def test_ttl_expires(cache):
+    # Redis 的过期时间以秒为单位，最短 1 秒
+    cache.set('filter', 'short', [1, 2, 3], ttl=1)
+    cache.set('filter', 'forever', [4, 5])
+    assert cache.get('filter', 'short') == [1, 2, 3]
+    time.sleep(1.2)
+    assert cache.get('filter', 'short') is None
+    assert cache.get('filter', 'forever') == [4, 5]
+
+def test_redis_auth_failure_drops_connection(resp_server):
+    server = resp_server(password='secret')
+    port = server.server_address[1]
+    cache = RedisCache(f"redis://:wrong@127.0.0.1:{port}/0")
+    with pytest.raises(RuntimeError):
+        cache.command('GET', 'key')
+    # 半初始化的连接不保留，读写失败按未命中处理
+    assert cache._local.sock is None
+    assert cache.get('filter', 'key') is None
+
+    cache.password = 'secret'
+    cache.set('filter', 'key', {'ok': True})
+    assert cache.get('filter', 'key') == {'ok': True}